@@ -0,0 +1,393 @@
+import asyncio
+import contextlib
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+import pandas as pd
+import sqlglot
+from sqlglot import exp
+
+from clients import get_aws_client, opened_connections, timed_aws_client
+from query_cache import normalize_sql
+from settings import (
+    GLUE_DATABASE, S3_OUTPUT_LOCATION,
+    ATHENA_POLL_INITIAL_SECONDS, ATHENA_POLL_MAX_SECONDS, ATHENA_QUERY_TIMEOUT_SECONDS,
+    ATHENA_RESULTS_READER, ATHENA_WORKGROUP, ATHENA_RESULT_REUSE_MINUTES, ATHENA_SCAN_BUDGET_BYTES,
+    ATHENA_SELECT_STAR_LIMIT, QUERY_CACHE_DIR,
+)
+
+ATHENA_POLL_MULTIPLIER = 1.5
+ATHENA_RESULTS_CHUNK_ROWS = 50_000
+
+# Athena column types mapped to pandas dtypes; anything not listed stays a string.
+_INTEGER_TYPES = {'tinyint', 'smallint', 'integer', 'int', 'bigint'}
+_FLOAT_TYPES = {'float', 'real', 'double', 'decimal'}
+_DATETIME_TYPES = {'date', 'timestamp', 'timestamp with time zone'}
+
+# Latency breakdown of the most recent Athena queries, newest last.
+latency_log = deque(maxlen=100)
+
+# Athena 'Statistics' fields (milliseconds) reported in the latency breakdown.
+_ATHENA_STATISTICS = {
+    'queue_ms': 'QueryQueueTimeInMillis',
+    'planning_ms': 'QueryPlanningTimeInMillis',
+    'engine_ms': 'EngineExecutionTimeInMillis',
+    'service_processing_ms': 'ServiceProcessingTimeInMillis',
+    'athena_total_ms': 'TotalExecutionTimeInMillis',
+}
+
+
+class ExecutionIndex:
+    """
+    Local index of normalized SQL -> QueryExecutionId of its last successful run, so an
+    identical query re-reads that result from S3 instead of being executed again.
+    Entries older than `max_age_minutes` are ignored (the data may have changed).
+    """
+
+    def __init__(self, path=os.path.join(QUERY_CACHE_DIR, 'athena_executions.sqlite3'),
+                 max_age_minutes=ATHENA_RESULT_REUSE_MINUTES):
+        self.path = path
+        self.max_age = max_age_minutes * 60
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS executions (
+                    sql_key TEXT PRIMARY KEY, sql TEXT NOT NULL, query_execution_id TEXT NOT NULL,
+                    created_at REAL NOT NULL)
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # Short-lived connections, as in QueryCache: safe from any session or pipeline thread.
+        con = sqlite3.connect(self.path, timeout=10)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    @staticmethod
+    def _key(query):
+        return hashlib.sha256(normalize_sql(query).encode('utf-8')).hexdigest()
+
+    def lookup(self, query):
+        """QueryExecutionId of a recent successful run of an equivalent query, or None."""
+        with self._connect() as con:
+            row = con.execute(
+                "SELECT query_execution_id FROM executions WHERE sql_key = ? AND created_at > ?",
+                (self._key(query), time.time() - self.max_age),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, query, query_execution_id):
+        now = time.time()
+        with self._connect() as con:
+            con.execute("INSERT OR REPLACE INTO executions VALUES (?, ?, ?, ?)",
+                        (self._key(query), normalize_sql(query), query_execution_id, now))
+            con.execute("DELETE FROM executions WHERE created_at <= ?", (now - self.max_age,))
+
+
+@lru_cache(maxsize=None)
+def get_execution_index():
+    return ExecutionIndex()
+
+
+def prepare_query(query, select_star_limit=ATHENA_SELECT_STAR_LIMIT):
+    """
+    Return (query, read_only, limited). Only read-only queries (SELECT, WITH, UNION) are
+    reused. A plain `SELECT *` without aggregation, GROUP BY or LIMIT would read every column
+    of every row, so it gets a LIMIT: a runaway generated query can't scan the whole table.
+    """
+    try:
+        parsed = sqlglot.parse_one(query, read='athena')
+    except sqlglot.errors.SqlglotError:
+        return query, False, False
+    if not isinstance(parsed, exp.Query):
+        return query, False, False
+    if (select_star_limit and isinstance(parsed, exp.Select) and parsed.is_star and not parsed.args.get('limit')
+            and not parsed.args.get('group') and not parsed.find(exp.AggFunc)):
+        return parsed.limit(select_star_limit).sql(dialect='athena'), True, True
+    return query, True, False
+
+
+def start_parameters(query, reuse):
+    """Arguments of start_query_execution; `reuse` lets Athena return a recent identical result."""
+    parameters = {
+        'QueryString': query,
+        'QueryExecutionContext': {'Database': GLUE_DATABASE},
+        'ResultConfiguration': {'OutputLocation': S3_OUTPUT_LOCATION},
+        'WorkGroup': ATHENA_WORKGROUP,
+    }
+    if reuse:
+        parameters['ResultReuseConfiguration'] = {'ResultReuseByAgeConfiguration': {
+            'Enabled': True, 'MaxAgeInMinutes': ATHENA_RESULT_REUSE_MINUTES,
+        }}
+    return parameters
+
+
+def scan_budget_error(execution, budget=ATHENA_SCAN_BUDGET_BYTES):
+    """Error message if the query has already scanned more than the budget, else None."""
+    scanned = execution.get('Statistics', {}).get('DataScannedInBytes', 0)
+    if budget and scanned > budget:
+        return (f"The query scanned {scanned / 1024 ** 3:.2f} GB, over the {budget / 1024 ** 3:.2f} GB "
+                f"budget, and was cancelled.")
+    return None
+
+
+def read_previous_result(athena_client, query, stats):
+    """
+    Result of a recent successful run of the same query (local ExecutionIndex), read again
+    from S3 without scanning; None if there is none or it can no longer be read.
+    """
+    query_execution_id = get_execution_index().lookup(query)
+    if query_execution_id is None:
+        return None
+    try:
+        execution = athena_client.get_query_execution(QueryExecutionId=query_execution_id)['QueryExecution']
+        if execution['Status']['State'] != 'SUCCEEDED':
+            return None
+        df = read_athena_results(athena_client, execution)
+    except Exception as e:
+        print(f"⚠️ Could not re-read the result of {query_execution_id}: {e}")
+        return None
+    stats['reused_execution_id'] = query_execution_id
+    stats['rows'] = len(df)
+    return df
+
+
+def poll_intervals(initial=ATHENA_POLL_INITIAL_SECONDS, maximum=ATHENA_POLL_MAX_SECONDS,
+                   multiplier=ATHENA_POLL_MULTIPLIER):
+    """Yield exponentially growing sleep intervals, capped at `maximum` seconds."""
+    interval = initial
+    while True:
+        yield interval
+        interval = min(interval * multiplier, maximum)
+
+
+async def wait_for_query_async(athena_client, query_execution_id, timeout=ATHENA_QUERY_TIMEOUT_SECONDS, stats=None):
+    """
+    Poll a query with exponential backoff until it leaves the QUEUED/RUNNING states.
+    Cancels the query with stop_query_execution once the deadline passes or the data it
+    has scanned goes over ATHENA_SCAN_BUDGET_BYTES, and when the waiting task is cancelled
+    (a new question or a stage timeout). The status calls run in worker threads and the
+    backoff uses asyncio.sleep, so no thread is held while the query runs.
+    Returns a tuple (QueryExecution, Error).
+    """
+    stats = {} if stats is None else stats
+    deadline = time.monotonic() + timeout
+    polls = 0
+    try:
+        for interval in poll_intervals():
+            execution = (await asyncio.to_thread(
+                athena_client.get_query_execution, QueryExecutionId=query_execution_id))['QueryExecution']
+            polls += 1
+            if execution['Status']['State'] not in ('QUEUED', 'RUNNING'):
+                break
+
+            remaining = deadline - time.monotonic()
+            over_budget = scan_budget_error(execution)
+            if remaining <= 0 or over_budget:
+                await asyncio.to_thread(athena_client.stop_query_execution, QueryExecutionId=query_execution_id)
+                stats['polls'] = polls
+                return execution, over_budget or f"The query exceeded the {timeout}s deadline and was cancelled."
+            await asyncio.sleep(min(interval, remaining))
+    except asyncio.CancelledError:
+        # Off the shared loop, and a failed stop must not replace the cancellation.
+        with contextlib.suppress(Exception):
+            await asyncio.to_thread(athena_client.stop_query_execution, QueryExecutionId=query_execution_id)
+        stats['polls'] = polls
+        raise
+    return execution, _query_outcome(execution, polls, stats)
+
+
+def wait_for_query(athena_client, query_execution_id, timeout=ATHENA_QUERY_TIMEOUT_SECONDS, stats=None):
+    """Blocking wait_for_query_async, for callers outside the asyncio pipeline."""
+    return asyncio.run(wait_for_query_async(athena_client, query_execution_id, timeout, stats))
+
+
+def _query_outcome(execution, polls, stats):
+    """Record the Athena statistics of a finished query and return its error, if any."""
+    state = execution['Status']['State']
+    stats['polls'] = polls
+    statistics = execution.get('Statistics', {})
+    for key, field in _ATHENA_STATISTICS.items():
+        if field in statistics:
+            stats[key] = statistics[field]
+    if 'DataScannedInBytes' in statistics:
+        stats['data_scanned_bytes'] = statistics['DataScannedInBytes']
+    if 'ResultReuseInformation' in statistics:
+        stats['athena_reused_result'] = statistics['ResultReuseInformation']['ReusedPreviousResult']
+
+    if state == 'FAILED':
+        return f"Athena query failed: {execution['Status'].get('StateChangeReason')}"
+    elif state == 'CANCELLED':
+        return "The query was cancelled."
+    return None
+
+
+def _column_types(column_info):
+    """Return {column name: Athena type} from the ResultSetMetadata column list."""
+    return {col['Name']: col['Type'].lower() for col in column_info}
+
+
+def _coerce_types(df, column_types):
+    """Convert a chunk of Athena result columns to the dtypes declared in the metadata."""
+    for name, athena_type in column_types.items():
+        if athena_type in _INTEGER_TYPES:
+            df[name] = pd.to_numeric(df[name], errors='coerce').astype('Int64')
+        elif athena_type in _FLOAT_TYPES:
+            df[name] = pd.to_numeric(df[name], errors='coerce').astype('float64')
+        elif athena_type in _DATETIME_TYPES:
+            df[name] = pd.to_datetime(df[name], errors='coerce')
+        elif athena_type == 'boolean':
+            df[name] = df[name].map({'true': True, 'false': False}).astype('boolean')
+        else:
+            df[name] = df[name].astype('string')
+    return df
+
+
+def _split_s3_uri(uri):
+    bucket, _, key = uri.removeprefix('s3://').partition('/')
+    return bucket, key
+
+
+def read_results_from_s3(athena_client, execution):
+    """
+    Read the full result set from the CSV object Athena writes to the output location,
+    in a single download streamed into the DataFrame in bounded chunks.
+    """
+    metadata = athena_client.get_query_results(
+        QueryExecutionId=execution['QueryExecutionId'], MaxResults=1
+    )['ResultSet']['ResultSetMetadata']
+    column_types = _column_types(metadata['ColumnInfo'])
+
+    bucket, key = _split_s3_uri(execution['ResultConfiguration']['OutputLocation'])
+    body = get_aws_client('s3').get_object(Bucket=bucket, Key=key)['Body']
+    # Numeric columns are parsed by the CSV reader directly; the rest is converted per chunk.
+    dtypes = {
+        name: 'Int64' if athena_type in _INTEGER_TYPES else 'float64' if athena_type in _FLOAT_TYPES else 'string'
+        for name, athena_type in column_types.items()
+    }
+    chunks = [
+        _coerce_types(chunk, column_types)
+        for chunk in pd.read_csv(body, dtype=dtypes, keep_default_na=False, na_values=[''],
+                                 chunksize=ATHENA_RESULTS_CHUNK_ROWS)
+    ]
+    if not chunks:
+        return pd.DataFrame(columns=list(column_types))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_results_paginated(athena_client, query_execution_id):
+    """
+    Read the full result set through get_query_results, following NextToken
+    until the last page (each page holds at most 1000 rows).
+    """
+    paginator = athena_client.get_paginator('get_query_results')
+    column_types = None
+    chunks = []
+    for page in paginator.paginate(QueryExecutionId=query_execution_id,
+                                   PaginationConfig={'PageSize': 1000}):
+        rows = page['ResultSet']['Rows']
+        if column_types is None:
+            column_types = _column_types(page['ResultSet']['ResultSetMetadata']['ColumnInfo'])
+            rows = rows[1:]  # The first row of the first page repeats the header.
+        if rows:
+            data = [[item.get('VarCharValue') for item in row['Data']] for row in rows]
+            chunks.append(_coerce_types(pd.DataFrame(data, columns=list(column_types)), column_types))
+    if not chunks:
+        return pd.DataFrame(columns=list(column_types or []))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_athena_results(athena_client, execution, reader=ATHENA_RESULTS_READER):
+    """Read every row of a finished query, typed according to ResultSetMetadata."""
+    output_location = execution.get('ResultConfiguration', {}).get('OutputLocation', '')
+    # Only SELECT-like statements write a CSV; DDL and EXPLAIN write plain text.
+    if reader == 'csv' and output_location.endswith('.csv'):
+        return read_results_from_s3(athena_client, execution)
+    return read_results_paginated(athena_client, execution['QueryExecutionId'])
+
+
+async def execute_athena_query_async(query, stats=None):
+    """
+    Execute a query on Athena and return a tuple (DataFrame, Error).
+    When a `stats` dict is given it is filled with the latency breakdown of the query
+    (client-side submit/wait/results times plus Athena's own queue and execution times),
+    the time spent obtaining the shared clients and the new connections the query had to open.
+    Read-only queries are answered from a recent identical run when possible (local index,
+    then Athena's result reuse) and are cancelled if they scan more than the budget.
+    Blocking boto3 calls run in worker threads, so the asyncio pipeline never waits on them.
+    """
+    stats = {} if stats is None else stats
+    stats['backend'] = 'athena'
+    start = time.perf_counter()
+    athena_client = timed_aws_client('athena', stats)
+    s3_client = timed_aws_client('s3', stats)
+    connections = opened_connections(athena_client) + opened_connections(s3_client)
+    try:
+        query, read_only, stats['select_star_limited'] = prepare_query(query)
+        reuse = bool(ATHENA_RESULT_REUSE_MINUTES) and read_only
+        df = await asyncio.to_thread(read_previous_result, athena_client, query, stats) if reuse else None
+        if df is not None:
+            stats['results_ms'] = (time.perf_counter() - start) * 1000
+            return df, None
+
+        response = await asyncio.to_thread(athena_client.start_query_execution, **start_parameters(query, reuse))
+        query_execution_id = response['QueryExecutionId']
+        stats['query_execution_id'] = query_execution_id
+        submitted = time.perf_counter()
+        stats['submit_ms'] = (submitted - start) * 1000
+
+        execution, error = await wait_for_query_async(athena_client, query_execution_id, stats=stats)
+        finished = time.perf_counter()
+        stats['wait_ms'] = (finished - submitted) * 1000
+        if error:
+            return None, error
+        if reuse:
+            await asyncio.to_thread(get_execution_index().put, query, query_execution_id)
+
+        df = await asyncio.to_thread(read_athena_results, athena_client, execution)
+        stats['results_ms'] = (time.perf_counter() - finished) * 1000
+        stats['rows'] = len(df)
+        return df, None
+
+    except Exception as e:
+        return None, f"An error occurred while communicating with Athena: {e}"
+    finally:
+        # 0 on warm requests: the TCP/TLS connections of earlier questions are reused.
+        stats['new_connections'] = opened_connections(athena_client) + opened_connections(s3_client) - connections
+        stats['total_ms'] = (time.perf_counter() - start) * 1000
+        latency_log.append(dict(stats))
+
+
+def execute_athena_query(query, stats=None):
+    """Blocking execute_athena_query_async, for scripts and the synchronous backends."""
+    return asyncio.run(execute_athena_query_async(query, stats))
+
+
+def apply_workgroup_scan_limit(workgroup=ATHENA_WORKGROUP, budget=ATHENA_SCAN_BUDGET_BYTES):
+    """
+    Set the scan budget as the workgroup's BytesScannedCutoffPerQuery, so Athena itself
+    cancels runaway queries (its minimum is 10 MB); a budget of 0 removes the cutoff.
+    """
+    if budget:
+        updates = {'BytesScannedCutoffPerQuery': max(budget, 10 * 1024 ** 2)}
+    else:
+        updates = {'RemoveBytesScannedCutoffPerQuery': True}
+    get_aws_client('athena').update_work_group(WorkGroup=workgroup, ConfigurationUpdates=updates)
+    print(f"✅ Workgroup '{workgroup}': {updates}")
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    # Pass --workgroup-limit to apply athena_scan_budget_bytes to the workgroup.
+    if '--workgroup-limit' in sys.argv:
+        apply_workgroup_scan_limit()
@@ -0,0 +1,64 @@
+import sys
+import time
+
+import numpy as np
+
+from clients import aws_config, get_aws_client, get_openai_client, opened_connections
+from settings import AWS_REGION, GLUE_DATABASE
+
+NOME_DO_BUCKET = "chatbot-analise-dados"
+
+# One cheap read-only call per service.
+CHAMADAS = {
+    'athena': lambda cliente: cliente.get_database(CatalogName='AwsDataCatalog', DatabaseName=GLUE_DATABASE),
+    's3': lambda cliente: cliente.head_bucket(Bucket=NOME_DO_BUCKET),
+}
+
+
+def cliente_novo(servico):
+    """What every question used to do: a new client (credentials, endpoint, connection) per call."""
+    import boto3
+
+    return boto3.client(servico, region_name=AWS_REGION)
+
+
+def medir(obter_cliente, chamada, repeticoes):
+    """Time `repeticoes` calls, each with the client returned by `obter_cliente`, and count new connections."""
+    tempos, conexoes = [], 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        cliente = obter_cliente()
+        antes = opened_connections(cliente)
+        chamada(cliente)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        conexoes += opened_connections(cliente) - antes
+    return tempos, conexoes
+
+
+def imprimir(nome, tempos, conexoes):
+    print(f"{nome:<28} {tempos[0]:>10.1f} {np.percentile(tempos[1:], 50):>9.1f} "
+          f"{np.percentile(tempos[1:], 95):>9.1f} {conexoes:>10}")
+
+
+def rodar_benchmark(repeticoes=20):
+    print(f"\n📊 {repeticoes} chamadas por cliente (pool de {aws_config().max_pool_connections} conexões, "
+          f"retentativas '{aws_config().retries['mode']}')")
+    print(f"{'cliente':<28} {'1ª (ms)':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'conexões':>10}")
+    for servico, chamada in CHAMADAS.items():
+        imprimir(f"{servico} novo por chamada", *medir(lambda: cliente_novo(servico), chamada, repeticoes))
+        imprimir(f"{servico} compartilhado", *medir(lambda: get_aws_client(servico), chamada, repeticoes))
+
+    # The OpenAI client keeps its connections in an httpx pool: the first call pays for TLS, the rest reuse it.
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        get_openai_client().models.retrieve('gpt-4')
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    print(f"{'openai compartilhado':<28} {tempos[0]:>10.1f} {np.percentile(tempos[1:], 50):>9.1f} "
+          f"{np.percentile(tempos[1:], 95):>9.1f} {'-':>10}")
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    # Optional argument: calls per client (default 20).
+    rodar_benchmark(repeticoes=int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,76 @@
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmark_ingestion import pico_rss_mb
+
+ARQUIVO_AVALIACAO = 'router_eval_set.json'
+DIRETORIO_CHROMA = './chroma_db_rag'
+BACKENDS = ['torch', 'onnx']
+
+
+def _medir_backend(backend, perguntas, repeticoes):
+    """Loads one backend in a fresh process and times query embeddings. Runs in a worker."""
+    inicio = time.perf_counter()
+    from embedding_cache import load_backend
+
+    modelo = load_backend(backend)
+    carga_ms = (time.perf_counter() - inicio) * 1000
+    modelo.embed_query("aquecimento")
+
+    tempos, vetores = [], []
+    for _ in range(repeticoes):
+        for pergunta in perguntas:
+            inicio = time.perf_counter()
+            vetor = modelo.embed_query(pergunta)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            if len(vetores) < len(perguntas):
+                vetores.append(vetor)
+    return {'carga_ms': carga_ms, 'tempos': tempos, 'vetores': vetores, 'pico_rss_mb': pico_rss_mb()}
+
+
+def medir(backend, perguntas, repeticoes):
+    # Fresh interpreter per backend, so import time and peak RSS are not shared.
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+        return executor.submit(_medir_backend, backend, perguntas, repeticoes).result()
+
+
+def top_k(colecao, vetores, k=3):
+    return [set(ids) for ids in colecao.query(query_embeddings=vetores, n_results=k, include=[])['ids']]
+
+
+def rodar_benchmark(repeticoes=5, k=3):
+    with open(ARQUIVO_AVALIACAO, 'r', encoding='utf-8') as f:
+        perguntas = [exemplo['pergunta'] for exemplo in json.load(f) if exemplo['ferramenta'] == 'DOCUMENTO']
+
+    resultados = {backend: medir(backend, perguntas, repeticoes) for backend in BACKENDS}
+
+    print(f"\n📊 Embedding de {len(perguntas)} perguntas x {repeticoes}")
+    print(f"{'backend':<8} {'import+carga (ms)':>18} {'p50 (ms)':>9} {'p95 (ms)':>9} {'pico RSS (MB)':>14}")
+    for backend, resultado in resultados.items():
+        print(f"{backend:<8} {resultado['carga_ms']:>18.0f} {np.percentile(resultado['tempos'], 50):>9.2f} "
+              f"{np.percentile(resultado['tempos'], 95):>9.2f} {resultado['pico_rss_mb']:>14.0f}")
+
+    referencia, quantizado = (np.array(resultados[backend]['vetores']) for backend in BACKENDS)
+    cossenos = (referencia * quantizado).sum(axis=1)
+    print(f"\n📐 Cosseno torch x onnx: mínimo {cossenos.min():.4f}, médio {cossenos.mean():.4f}")
+
+    # Retrieval over the existing index (built with torch): the torch top-k is the reference.
+    from langchain_community.vectorstores import Chroma
+
+    colecao = Chroma(persist_directory=DIRETORIO_CHROMA)._collection
+    esperados = top_k(colecao, referencia.tolist(), k)
+    obtidos = top_k(colecao, quantizado.tolist(), k)
+    recall = np.mean([len(e & o) / len(e) for e, o in zip(esperados, obtidos) if e])
+    print(f"🎯 recall@{k} do onnx em relação ao torch no chroma_db_rag: {recall:.1%}")
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    # Optional argument: repetitions per question (default 5).
+    rodar_benchmark(repeticoes=int(sys.argv[1]) if len(sys.argv) > 1 else 5)
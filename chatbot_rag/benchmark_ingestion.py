@@ -0,0 +1,126 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import pre_data
+
+
+def ingestao_em_memoria(arquivo, diretorio):
+    """Previous path: read the whole file (every column, inferred types), then clean and write."""
+    df = pd.read_csv(arquivo, compression='gzip', sep=',')
+    linhas = len(df)
+    df = pre_data.limpar_dados(df)
+    pre_data.escrever_parquet_particionado([df], diretorio, pre_data.colunas_particao)
+    return linhas
+
+
+def ingestao_em_chunks(arquivo, diretorio):
+    """Streaming path used by pre_data.py."""
+    stats = {}
+    pre_data.escrever_parquet_particionado(pre_data.ler_csv_em_chunks(arquivo, stats=stats),
+                                           diretorio, pre_data.colunas_particao)
+    return stats['linhas_lidas']
+
+
+def _executar(nome, arquivo):
+    """Runs one ingestion path and returns (rows, seconds, peak RSS in MB) of this process."""
+    diretorio = tempfile.mkdtemp(prefix='bench_ingestao_')
+    try:
+        inicio = time.perf_counter()
+        linhas = {'memoria': ingestao_em_memoria, 'chunks': ingestao_em_chunks}[nome](arquivo, diretorio)
+        duracao = time.perf_counter() - inicio
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+    return linhas, duracao, pico_rss_mb()
+
+
+def pico_rss_mb():
+    # VmHWM restarts at exec, unlike ru_maxrss, which keeps the parent's peak.
+    with open('/proc/self/status') as f:
+        for linha in f:
+            if linha.startswith('VmHWM:'):
+                return int(linha.split()[1]) / 1024
+    return float('nan')
+
+
+def medir(nome, arquivo):
+    # Fresh interpreter per run, so peak RSS isn't inherited from earlier runs.
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+        return executor.submit(_executar, nome, arquivo).result()
+
+
+def medir_paralelo(arquivos, processos):
+    """Ingests all files with `processos` workers and returns (rows, wall-clock seconds)."""
+    diretorio = tempfile.mkdtemp(prefix='bench_ingestao_')
+    try:
+        inicio = time.perf_counter()
+        entradas = pre_data.processar_em_paralelo(arquivos, diretorio, pre_data.colunas_particao, processos)
+        duracao = time.perf_counter() - inicio
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+    return sum(entrada['linhas_lidas'] for entrada in entradas), duracao
+
+
+def gerar_arquivo_sintetico(caminho, linhas, seed=0):
+    """Writes a GZ file with the columns of train.gz (plus an extra unused one) and random values."""
+    rng = np.random.default_rng(seed)
+    datas = pd.date_range('2017-01-01', '2017-12-31', freq='D', tz='UTC').astype(str).to_numpy()
+    pd.DataFrame({
+        'REF_DATE': rng.choice(datas, linhas),
+        'TARGET': rng.integers(0, 2, linhas),
+        'VAR2': rng.choice(['M', 'F'], linhas),
+        'IDADE': rng.uniform(18, 90, linhas).round(3),
+        'VAR4': rng.choice(['S', ''], linhas, p=[0.01, 0.99]),
+        'VAR5': rng.choice(['SP', 'RJ', 'MG', 'BA', 'RS', 'PR', 'PE', 'CE', 'GO', 'AM'], linhas),
+        'VAR8': rng.choice(list('ABCDE'), linhas),
+        'VAR9': rng.uniform(0, 1, linhas),
+        'ID': np.arange(linhas),
+    }).to_csv(caminho, index=False, compression='gzip')
+
+
+def rodar_benchmark(arquivos):
+    print(f"{'arquivo':<32} {'caminho':<8} {'linhas':>10} {'tempo (s)':>10} {'linhas/s':>12} {'pico RSS (MB)':>14}")
+    for arquivo in arquivos:
+        for nome in ['memoria', 'chunks']:
+            linhas, duracao, pico_mb = medir(nome, arquivo)
+            print(f"{os.path.basename(arquivo):<32} {nome:<8} {linhas:>10} {duracao:>10.2f} "
+                  f"{linhas / duracao:>12,.0f} {pico_mb:>14.0f}")
+
+
+def rodar_benchmark_paralelo(arquivos):
+    print(f"{len(arquivos)} files, {os.cpu_count()} cores")
+    print(f"{'processos':>10} {'linhas':>10} {'tempo (s)':>10} {'linhas/s':>12}")
+    for processos in sorted({1, os.cpu_count() or 1}):
+        linhas, duracao = medir_paralelo(arquivos, processos)
+        print(f"{processos:>10} {linhas:>10} {duracao:>10.2f} {linhas / duracao:>12,.0f}")
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares in-memory and chunked ingestion of train.gz.")
+    parser.add_argument('--arquivo', default=pre_data.arquivo_gz_local)
+    parser.add_argument('--sintetico', type=int, nargs='*', metavar='LINHAS',
+                        help="benchmark synthetic files of these sizes instead of --arquivo")
+    parser.add_argument('--paralelo', action='store_true',
+                        help="time multi-file ingestion with 1 worker vs one per core instead")
+    args = parser.parse_args()
+    executar = rodar_benchmark_paralelo if args.paralelo else rodar_benchmark
+
+    if args.sintetico:
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivos = []
+            for i, linhas in enumerate(args.sintetico):
+                caminho = os.path.join(pasta, f'sintetico_{i}_{linhas}.gz')
+                gerar_arquivo_sintetico(caminho, linhas, seed=i)
+                arquivos.append(caminho)
+            executar(arquivos)
+    else:
+        executar([args.arquivo])
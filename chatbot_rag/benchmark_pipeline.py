@@ -0,0 +1,163 @@
+import argparse
+import random
+import threading
+import time
+import uuid
+
+import numpy as np
+
+import athena_query
+from pipeline import Orchestrator, answer_question
+
+PERGUNTA = "Qual a taxa de inadimplência por UF?"
+SQL_FALSO = 'SELECT uf, AVG(CAST(inadimplente AS DOUBLE)) AS taxa FROM "dataset" GROUP BY uf'
+UFS = ['SP', 'RJ', 'MG', 'RS', 'PR', 'BA']
+
+
+def latencia(mediana, escala):
+    """Log-normal latency around `mediana` seconds (long tail, like the real services)."""
+    return random.lognormvariate(np.log(mediana * escala), 0.4)
+
+
+class AthenaFalso:
+    """
+    Athena stand-in with the boto3 client methods the pipeline calls. Every call blocks for
+    one HTTP round trip; each query runs for a random duration and can be stopped.
+    """
+
+    def __init__(self, duracao, escala, rtt=0.02):
+        self.duracao, self.escala, self.rtt = duracao, escala, rtt
+        self.fim, self.canceladas = {}, set()
+
+    def _ida_e_volta(self):
+        time.sleep(self.rtt * random.uniform(0.5, 1.5))
+
+    def start_query_execution(self, QueryString, **kwargs):
+        self._ida_e_volta()
+        query_execution_id = str(uuid.uuid4())
+        self.fim[query_execution_id] = time.monotonic() + latencia(self.duracao, self.escala)
+        return {'QueryExecutionId': query_execution_id}
+
+    def get_query_execution(self, QueryExecutionId):
+        self._ida_e_volta()
+        if QueryExecutionId in self.canceladas:
+            estado = 'CANCELLED'
+        else:
+            estado = 'SUCCEEDED' if time.monotonic() >= self.fim[QueryExecutionId] else 'RUNNING'
+        return {'QueryExecution': {
+            'QueryExecutionId': QueryExecutionId, 'Status': {'State': estado}, 'Statistics': {},
+            'ResultConfiguration': {'OutputLocation': f's3://falso/{QueryExecutionId}.txt'},
+        }}
+
+    def stop_query_execution(self, QueryExecutionId):
+        self.canceladas.add(QueryExecutionId)
+
+    def get_paginator(self, operacao):
+        return self
+
+    def paginate(self, **kwargs):
+        self._ida_e_volta()
+        cabecalho = {'Data': [{'VarCharValue': 'uf'}, {'VarCharValue': 'taxa'}]}
+        linhas = [{'Data': [{'VarCharValue': uf}, {'VarCharValue': str(random.random())}]} for uf in UFS]
+        yield {'ResultSet': {
+            'ResultSetMetadata': {'ColumnInfo': [{'Name': 'uf', 'Type': 'varchar'}, {'Name': 'taxa', 'Type': 'double'}]},
+            'Rows': [cabecalho] + linhas,
+        }}
+
+
+class RoteadorFalso:
+    def route(self, question, stats=None):
+        stats['stage'] = 'rules'
+        return "SQL"
+
+
+def gerar_sql_falso(pergunta, escala=1.0):
+    """OpenAI stand-in for the SQL generation: one blocking call."""
+    time.sleep(latencia(0.8, escala))
+    return SQL_FALSO
+
+
+def resumo_falso(escala=1.0, tokens=20):
+    """OpenAI stand-in for the streamed summary: time to first token, then a token every ~20 ms."""
+    time.sleep(latencia(0.5, escala))
+    for i in range(tokens):
+        yield f"palavra{i} "
+        time.sleep(0.02 * escala)
+
+
+def rodar_sessoes(orquestrador, sessoes, perguntas_por_sessao, escala):
+    """Each session is a thread (like a Streamlit script run) asking its questions in sequence."""
+    recursos = {'query_cache': None, 'question_router': RoteadorFalso()}
+    latencias, erros = [], []
+    trava = threading.Lock()
+
+    def sessao():
+        for _ in range(perguntas_por_sessao):
+            inicio = time.perf_counter()
+            resultado = orquestrador.submit(answer_question(
+                orquestrador, PERGUNTA, recursos, lambda pergunta: gerar_sql_falso(pergunta, escala),
+                backend='athena', templates=False,
+            )).result()
+            if not resultado['error']:
+                ''.join(orquestrador.stream('summary', lambda: resumo_falso(escala), stats={}))
+            with trava:
+                latencias.append(time.perf_counter() - inicio)
+                if resultado['error']:
+                    erros.append(resultado['error'])
+
+    # Peak number of threads added to the process while the sessions run (minus the sessions and the monitor).
+    base = threading.active_count()
+    pico, ativo = [base], [True]
+
+    def monitorar():
+        while ativo[0]:
+            pico[0] = max(pico[0], threading.active_count())
+            time.sleep(0.05)
+
+    monitor = threading.Thread(target=monitorar, daemon=True)
+    monitor.start()
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=sessao) for _ in range(sessoes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+    ativo[0] = False
+    monitor.join()
+    return {
+        'vazao': len(latencias) / duracao,
+        'p50_s': float(np.percentile(latencias, 50)),
+        'p95_s': float(np.percentile(latencias, 95)),
+        'erros': len(erros),
+        'pico_threads': pico[0] - base - sessoes - 1,
+    }
+
+
+def rodar_benchmark(niveis, perguntas_por_sessao, escala, athena, openai, duracao_athena):
+    # Every Athena call of the pipeline goes to the stand-in instead of boto3.
+    athena_falso = AthenaFalso(duracao_athena, escala)
+    athena_query.timed_aws_client = lambda servico, stats: athena_falso
+
+    print(f"\n📊 Pipeline com Athena e OpenAI simulados: {perguntas_por_sessao} perguntas por sessão, "
+          f"limites athena={athena} openai={openai}")
+    print(f"{'sessões':>8} {'perguntas/s':>12} {'p50 (s)':>9} {'p95 (s)':>9} {'erros':>6} {'threads do pipeline':>20}")
+    for sessoes in niveis:
+        orquestrador = Orchestrator(athena_concurrency=athena, openai_concurrency=openai)
+        r = rodar_sessoes(orquestrador, sessoes, perguntas_por_sessao, escala)
+        print(f"{sessoes:>8} {r['vazao']:>12.2f} {r['p50_s']:>9.2f} {r['p95_s']:>9.2f} {r['erros']:>6} {r['pico_threads']:>20}")
+        orquestrador.loop.call_soon_threadsafe(orquestrador.loop.stop)
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do pipeline assíncrono com Athena e OpenAI simulados.")
+    parser.add_argument('--sessoes', type=int, nargs='+', default=[1, 5, 10, 20, 40],
+                        help="Números de sessões simultâneas a medir.")
+    parser.add_argument('--perguntas', type=int, default=3, help="Perguntas feitas por sessão.")
+    parser.add_argument('--escala', type=float, default=1.0, help="Multiplica as latências simuladas.")
+    parser.add_argument('--duracao-athena', type=float, default=2.0, help="Duração mediana das consultas (s).")
+    parser.add_argument('--athena', type=int, default=5, help="Consultas simultâneas no Athena.")
+    parser.add_argument('--openai', type=int, default=8, help="Chamadas simultâneas à OpenAI.")
+    args = parser.parse_args()
+    rodar_benchmark(args.sessoes, args.perguntas, args.escala, args.athena, args.openai, args.duracao_athena)
@@ -0,0 +1,61 @@
+import statistics
+import sys
+import time
+
+from athena_query import execute_athena_query
+from query_backends import execute_duckdb_query, rollup_available
+from rollups import rewrite_to_rollup
+
+# Typical aggregate questions asked in the chat, written as the SQL generate_sql_with_llm produces.
+CONSULTAS_BENCHMARK = {
+    "taxa de inadimplência por uf":
+        'SELECT uf, AVG(CAST(inadimplente AS DOUBLE)) AS taxa_inadimplencia FROM "dataset" GROUP BY uf ORDER BY taxa_inadimplencia DESC',
+    "idade média por classe social":
+        'SELECT classe_social, AVG(idade) AS idade_media FROM "dataset" GROUP BY classe_social ORDER BY classe_social',
+    "quantidade de clientes por sexo":
+        'SELECT sexo, COUNT(*) AS total_clientes FROM "dataset" GROUP BY sexo',
+    "taxa de inadimplência por mês":
+        "SELECT date_trunc('month', data_referencia) AS mes, AVG(CAST(inadimplente AS DOUBLE)) AS taxa_inadimplencia "
+        'FROM "dataset" GROUP BY 1 ORDER BY 1',
+    "idade média dos clientes de MG":
+        "SELECT AVG(idade) AS idade_media FROM \"dataset\" WHERE uf = 'MG'",
+}
+
+
+def medir(executar, consulta, repeticoes):
+    """Run a query several times and return the latencies in milliseconds (or the error)."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        df, error = executar(consulta)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        if error:
+            return None, error
+    return tempos, None
+
+
+def rodar_benchmark(repeticoes=5, incluir_athena=True):
+    backends = {'duckdb': execute_duckdb_query}
+    if incluir_athena:
+        backends['athena'] = execute_athena_query
+
+    print(f"{'pergunta':<35} {'backend':<15} {'p50 (ms)':>10} {'min (ms)':>10}")
+    for pergunta, consulta in CONSULTAS_BENCHMARK.items():
+        consulta_rollup = rewrite_to_rollup(consulta)
+        for nome, executar in backends.items():
+            variantes = {nome: consulta}
+            if consulta_rollup and rollup_available(nome):
+                variantes[f"{nome}+rollup"] = consulta_rollup
+            for rotulo, sql in variantes.items():
+                # Athena is billed per scan, so a single run per question is enough.
+                tempos, error = medir(executar, sql, repeticoes if nome == 'duckdb' else 1)
+                if error:
+                    print(f"{pergunta:<35} {rotulo:<15} ❌ {error}")
+                    continue
+                print(f"{pergunta:<35} {rotulo:<15} {statistics.median(tempos):>10.1f} {min(tempos):>10.1f}")
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    # Pass --local to skip Athena (no AWS credentials or to avoid scan costs).
+    rodar_benchmark(incluir_athena='--local' not in sys.argv)
@@ -0,0 +1,79 @@
+import json
+import sys
+import time
+
+import numpy as np
+
+from hybrid_retrieval import BM25Index, HybridRetriever, load_reranker
+from query_cache import normalize_question
+
+ARQUIVO_AVALIACAO = 'rag_eval_set.json'
+DIRETORIO_CHROMA = './chroma_db_rag'
+PROFUNDIDADE = 10
+
+
+def relevante(texto, trechos):
+    """A chunk is relevant when it contains one of the labelled passages (normalized text)."""
+    texto = normalize_question(texto)
+    return any(trecho in texto for trecho in trechos)
+
+
+def avaliar(recuperar, exemplos, ks=(1, 3, 5)):
+    """Run every labelled question and collect recall@k, MRR and latency."""
+    acertos, reciprocos, tempos = {k: 0 for k in ks}, [], []
+    for exemplo in exemplos:
+        inicio = time.perf_counter()
+        textos = recuperar(exemplo['pergunta'])
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        posicao = next((i for i, texto in enumerate(textos, start=1) if relevante(texto, exemplo['trechos'])), None)
+        reciprocos.append(1 / posicao if posicao else 0.0)
+        for k in ks:
+            acertos[k] += bool(posicao and posicao <= k)
+    return {
+        **{f'recall@{k}': acertos[k] / len(exemplos) for k in ks},
+        'mrr': float(np.mean(reciprocos)),
+        'p50_ms': float(np.percentile(tempos, 50)),
+        'p95_ms': float(np.percentile(tempos, 95)),
+    }
+
+
+def rodar_benchmark(com_rerank=False):
+    from langchain_community.vectorstores import Chroma
+    from embedding_cache import build_embeddings
+
+    with open(ARQUIVO_AVALIACAO, 'r', encoding='utf-8') as f:
+        exemplos = json.load(f)
+
+    vector_store = Chroma(persist_directory=DIRETORIO_CHROMA, embedding_function=build_embeddings())
+    bm25 = BM25Index.load() or BM25Index.from_vector_store(vector_store)
+
+    def so_bm25(pergunta):
+        return [bm25.texts[posicao] for posicao, _ in bm25.search(pergunta, PROFUNDIDADE)]
+
+    recuperadores = {
+        'vetorial': HybridRetriever(vector_store, mode='vector', k=PROFUNDIDADE),
+        'bm25': None,
+        'híbrido (RRF)': HybridRetriever(vector_store, bm25=bm25, mode='hybrid', k=PROFUNDIDADE),
+    }
+    if com_rerank:
+        recuperadores['híbrido + rerank'] = HybridRetriever(vector_store, bm25=bm25, mode='hybrid',
+                                                            k=PROFUNDIDADE, reranker=load_reranker())
+
+    print(f"\n📊 Recuperação em {len(exemplos)} perguntas rotuladas da política de crédito")
+    print(f"{'modo':<18} {'recall@1':>9} {'recall@3':>9} {'recall@5':>9} {'MRR':>6} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for nome, recuperador in recuperadores.items():
+        if recuperador is None:
+            recuperar = so_bm25
+        else:
+            def recuperar(pergunta, recuperador=recuperador):
+                return [doc.page_content for doc in recuperador.get_relevant_documents(pergunta)]
+        recuperar(exemplos[0]['pergunta'])  # warm up
+        r = avaliar(recuperar, exemplos)
+        print(f"{nome:<18} {r['recall@1']:>9.1%} {r['recall@3']:>9.1%} {r['recall@5']:>9.1%} "
+              f"{r['mrr']:>6.3f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f}")
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    # Pass --rerank to also measure the cross-encoder stage (downloads the model on first use).
+    rodar_benchmark(com_rerank='--rerank' in sys.argv)
@@ -0,0 +1,61 @@
+import json
+import sys
+import time
+
+import numpy as np
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from router import QuestionRouter, decide_tool
+
+ARQUIVO_AVALIACAO = 'router_eval_set.json'
+
+
+def avaliar(roteador, exemplos):
+    """Route every labelled question and collect accuracy, the deciding stage and latency."""
+    acertos, estagios, tempos = 0, {}, []
+    for exemplo in exemplos:
+        stats = {}
+        ferramenta = roteador.route(exemplo['pergunta'], stats=stats)
+        tempos.append(stats['route_ms'])
+        estagios[stats['stage']] = estagios.get(stats['stage'], 0) + 1
+        if ferramenta is None:
+            # Low-confidence question: the app would ask the LLM router.
+            estagios['sem decisão'] = estagios.get('sem decisão', 0) + 1
+        elif ferramenta == exemplo['ferramenta']:
+            acertos += 1
+        else:
+            print(f"   ✗ {exemplo['pergunta']!r}: esperado {exemplo['ferramenta']}, obtido {ferramenta} ({stats['stage']})")
+    return acertos / len(exemplos), estagios, tempos
+
+
+def rodar_benchmark(usar_llm=False):
+    with open(ARQUIVO_AVALIACAO, 'r', encoding='utf-8') as f:
+        exemplos = json.load(f)
+
+    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    fallback = None
+    if usar_llm:
+        fallback = decide_tool
+
+    roteador = QuestionRouter(embeddings=embeddings, fallback=fallback)
+    acuracia, estagios, tempos = avaliar(roteador, exemplos)
+    print(f"\n📊 Roteador local em {len(exemplos)} perguntas")
+    print(f"   Acurácia: {acuracia:.1%}")
+    print(f"   Decididas por estágio: {estagios}")
+    print(f"   Latência p50: {np.percentile(tempos, 50):.2f} ms | p95: {np.percentile(tempos, 95):.2f} ms")
+
+    if usar_llm:
+        tempos_llm, acertos_llm = [], 0
+        for exemplo in exemplos:
+            inicio = time.perf_counter()
+            acertos_llm += fallback(exemplo['pergunta']) == exemplo['ferramenta']
+            tempos_llm.append((time.perf_counter() - inicio) * 1000)
+        print("\n📊 Roteador LLM (decide_tool)")
+        print(f"   Acurácia: {acertos_llm / len(exemplos):.1%}")
+        print(f"   Latência p50: {np.percentile(tempos_llm, 50):.0f} ms | p95: {np.percentile(tempos_llm, 95):.0f} ms")
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    # Pass --llm to also measure decide_tool (needs the OpenAI key in config.json).
+    rodar_benchmark(usar_llm='--llm' in sys.argv)
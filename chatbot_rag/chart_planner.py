@@ -0,0 +1,163 @@
+import json
+import re
+
+import pandas as pd
+
+from query_cache import normalize_question
+
+CHART_KINDS = ('bar', 'line', 'pie', 'scatter', 'histogram')
+
+# Chart type asked for explicitly in the (normalized) question.
+KIND_KEYWORDS = [
+    ('pie', r'\b(?:pizza|torta|rosca|participacao|proporcao|fatia)'),
+    ('line', r'\b(?:linhas?|evolucao|tendencia|ao longo|historico|serie temporal)\b'),
+    ('bar', r'\b(?:barras?|colunas?|ranking|compar)'),
+    ('scatter', r'\b(?:dispersao|correlacao|scatter)\b'),
+    ('histogram', r'\b(?:histograma|distribuicao)\b'),
+]
+
+# Column names of the dataset and of the SQL templates that hold time values.
+TIME_COLUMNS = {'data_referencia', 'mes', 'ano', 'data', 'periodo', 'ano_referencia', 'mes_referencia'}
+
+# Integer columns of the dataset that are flags (dimensions), not measures.
+CATEGORICAL_COLUMNS = {'inadimplente', 'flag_obito'}
+
+# Most categories a pie slice list or a color legend can show legibly.
+MAX_COLOR_CATEGORIES = 12
+
+
+def _requested_kind(question):
+    normalized = normalize_question(question)
+    return next((kind for kind, pattern in KIND_KEYWORDS if re.search(pattern, normalized)), None)
+
+
+def _column_roles(df):
+    """Split the columns into time, numeric (measures) and categorical (dimensions)."""
+    time, numeric, categorical = [], [], []
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series) or column in TIME_COLUMNS:
+            time.append(column)
+        elif (pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+              and column not in CATEGORICAL_COLUMNS):
+            numeric.append(column)
+        else:
+            categorical.append(column)
+    return time, numeric, categorical
+
+
+def _measure(question, numeric):
+    """The numeric column named in the question ("total por uf" -> total), else the first one."""
+    words = set(normalize_question(question).split())
+    return max(numeric, key=lambda column: len(words & set(column.split('_'))))
+
+
+def _with_period(df):
+    """`df` with separate numeric ano and mes columns combined into a 'periodo' date."""
+    return df.assign(periodo=pd.to_datetime(dict(year=df['ano'], month=df['mes'], day=1), errors='coerce'))
+
+
+def _time_axis(df, time):
+    """
+    The x column for the time columns: ano + mes become 'periodo' (plotting by ano alone
+    stacks the months on one x), other combinations are left to the LLM (None).
+    """
+    if len(time) == 1:
+        return time[0]
+    if set(time) == {'ano', 'mes'} and pd.api.types.is_numeric_dtype(df['mes']):
+        if _with_period(df)['periodo'].notna().all():
+            return 'periodo'
+    return None
+
+
+def _title(y, x):
+    return f"{y.replace('_', ' ').capitalize()} por {x.replace('_', ' ')}"
+
+
+def plan_chart(question, df):
+    """
+    Choose the chart for a query result from its column types and cardinality and the chart
+    type named in the question: time + measure -> line, category + measure -> bar (pie when
+    asked for and small), two categories + measure -> grouped bar, measures only -> scatter
+    or histogram. The measure is the numeric column named in the question. Returns a spec
+    {'kind', 'x', 'y', 'color', 'title', 'rule'} or None when no rule fits.
+    """
+    if df.empty:
+        return None
+    requested = _requested_kind(question)
+    time, numeric, categorical = _column_roles(df)
+    small = [column for column in categorical if df[column].nunique() <= MAX_COLOR_CATEGORIES]
+
+    y = _measure(question, numeric) if numeric else None
+
+    if time and numeric:
+        x = _time_axis(df, time)
+        color = small[0] if small else None
+        data = _with_period(df) if x == 'periodo' else df
+        # Several points per x (and color) would draw a zigzag: the LLM picks another chart.
+        if x is None or data.duplicated([x] + ([color] if color else [])).any():
+            return None
+        kind = 'bar' if requested == 'bar' else 'line'
+        return {'kind': kind, 'x': x, 'y': y, 'color': color, 'title': _title(y, x), 'rule': 'tempo + medida'}
+
+    if len(categorical) == 1 and numeric:
+        x = categorical[0]
+        if requested == 'pie' and df[x].nunique() <= MAX_COLOR_CATEGORIES:
+            return {'kind': 'pie', 'x': x, 'y': y, 'color': None, 'title': _title(y, x), 'rule': 'categoria + medida'}
+        return {'kind': 'bar', 'x': x, 'y': y, 'color': None, 'title': _title(y, x), 'rule': 'categoria + medida'}
+
+    if len(categorical) == 2 and numeric and small:
+        color = min(small, key=lambda column: df[column].nunique())
+        x = next(column for column in categorical if column != color)
+        return {'kind': 'bar', 'x': x, 'y': y, 'color': color,
+                'title': _title(y, x), 'rule': 'duas categorias + medida'}
+
+    if not categorical and not time and numeric:
+        if len(numeric) >= 2 and requested != 'histogram':
+            return {'kind': 'scatter', 'x': numeric[0], 'y': numeric[1], 'color': None,
+                    'title': f"{numeric[1]} x {numeric[0]}", 'rule': 'duas medidas'}
+        if len(df) > 1:
+            return {'kind': 'histogram', 'x': numeric[0], 'y': None, 'color': None,
+                    'title': f"Distribuição de {numeric[0].replace('_', ' ')}", 'rule': 'uma medida'}
+    return None
+
+
+def parse_chart_spec(text, df):
+    """
+    Chart spec from a JSON answer of the LLM ({"kind", "x", "y", "color", "title"}), or None
+    when it is not valid for `df`: only known chart kinds and existing columns are accepted.
+    """
+    match = re.search(r'\{.*\}', text or '', re.DOTALL)
+    if not match:
+        return None
+    try:
+        answer = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    kind = answer.get('kind')
+    spec = {'kind': kind, 'title': str(answer.get('title') or ''), 'rule': 'LLM'}
+    for field in ('x', 'y', 'color'):
+        spec[field] = answer.get(field) or None
+        if spec[field] is not None and spec[field] not in df.columns:
+            return None
+    if kind not in CHART_KINDS or spec['x'] is None or (spec['y'] is None and kind != 'histogram'):
+        return None
+    return spec
+
+
+def build_figure(spec, df):
+    """Plotly Express figure for a chart spec."""
+    import plotly.express as px
+
+    if spec['x'] == 'periodo' and 'periodo' not in df.columns:
+        df = _with_period(df)
+    if spec['kind'] == 'pie':
+        return px.pie(df, names=spec['x'], values=spec['y'], title=spec['title'])
+    if spec['kind'] == 'histogram':
+        return px.histogram(df, x=spec['x'], color=spec['color'], title=spec['title'])
+    if spec['kind'] == 'line':
+        data = df.sort_values(spec['x'])
+        return px.line(data, x=spec['x'], y=spec['y'], color=spec['color'], markers=True, title=spec['title'])
+    if spec['kind'] == 'scatter':
+        return px.scatter(df, x=spec['x'], y=spec['y'], color=spec['color'], title=spec['title'])
+    return px.bar(df, x=spec['x'], y=spec['y'], color=spec['color'], barmode='group', title=spec['title'])
@@ -1,71 +1,101 @@
+import startup_profile
 import streamlit as st
 import pandas as pd
-import boto3
-import openai 
+import contextlib
 import time
-import json
-import plotly.express as px
-from langchain_community.document_loaders import S3FileLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-
-
-# --- CONFIGURATION ---
-try:
-    with open('config.json', 'r') as f:
-        config = json.load(f)
-    OPENAI_API_KEY = config.get('openai_api_key')
-    if not OPENAI_API_KEY:
-        raise ValueError("The 'openai_api_key' key was not found in config.json")
-except FileNotFoundError:
-    raise FileNotFoundError("The configuration file 'config.json' was not found. Please create the file.")
-
-
-GLUE_DATABASE = "chatbot_db"
-GLUE_TABLE = "dataset"
-S3_OUTPUT_LOCATION = "s3://chatbot-analise-dados/athena_results/" 
-openai.api_key = OPENAI_API_KEY 
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from settings import GLUE_TABLE, QUERY_BACKEND, QUERY_CACHE_ENABLED
+from clients import get_openai_client, warm_up_clients
+from llm_streaming import stream_chat_completion
+from pipeline import Orchestrator, StageTimeout, answer_question
+from context_budget import dataframe_context, documents_context, log_prompt_tokens
+from chart_planner import build_figure, parse_chart_spec, plan_chart
+
+# Heavy modules (langchain/torch, Chroma, duckdb, boto3, plotly) are imported where they are
+# used or by the warmup thread, so the first page renders without waiting for them.
+
+def load_resources():
+    """Load the embedding model, the Vector Store, the query cache and the router."""
+    from langchain_community.vectorstores import Chroma
+    from embedding_cache import build_embeddings
+    from hybrid_retrieval import build_retriever
+    from query_cache import QueryCache
+    from router import QuestionRouter, decide_tool
 
-@st.cache_resource
-def load_vector_store():
     print("Loading embedding model and Vector Store...")
-    model_name = "sentence-transformers/all-MiniLM-L6-v2"
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    # Same (cached) embedding function as send_documents_s3.py, so repeated questions skip the model.
+    embeddings = build_embeddings()
     vector_store = Chroma(persist_directory="./chroma_db_rag", embedding_function=embeddings)
+    # One uncached forward pass and one search, so the first question doesn't pay for lazy initialization.
+    vector = getattr(embeddings, 'embeddings', embeddings).embed_query("aquecimento")
+    vector_store.similarity_search_by_vector(vector, k=1)
     print("✅ Vector Store loaded.")
-    return vector_store
 
-vector_store = load_vector_store()
+    resources = {
+        'vector_store': vector_store,
+        # BM25 + vector search fused by RRF (optionally re-ranked) for answer_with_rag.
+        'retriever': build_retriever(vector_store),
+        # Reuses the embedding model of the Vector Store for the nearest-neighbour question lookup.
+        'query_cache': QueryCache(embeddings=embeddings) if QUERY_CACHE_ENABLED else None,
+        # Keyword rules + nearest centroid over the Vector Store embeddings; the LLM only decides low-confidence questions.
+        'question_router': QuestionRouter(embeddings=embeddings, fallback=decide_tool),
+    }
+    # Imported here too, so the first SQL question doesn't wait for duckdb, sqlglot and boto3.
+    import query_backends, rollups, sql_templates  # noqa: F401
+    # Shared Athena/S3/OpenAI clients: credentials and endpoints resolved before the first question.
+    warm_up_clients()
+    startup_profile.mark("models_ready")
+    return resources
 
-def decide_tool(question):
-    """Use the LLM to decide whether the question is for SQL or for documents."""
-    prompt = f"""
-    Sua tarefa é classificar a pergunta do usuário e decidir qual ferramenta usar.
-    As ferramentas disponíveis são:
-    1. 'SQL': Para perguntas sobre dados quantitativos, agregações, médias, contagens, taxas de inadimplência, etc., que podem ser respondidas com uma consulta SQL.
-    2. 'DOCUMENTO': Para perguntas sobre políticas, regras, definições, explicações ou informações qualitativas que provavelmente estão em um documento de texto.
-
-    Exemplos:
-    - Pergunta: "qual a taxa de inadimplência por uf?" -> Ferramenta: SQL
-    - Pergunta: "quais são os critérios para aprovação de crédito?" -> Ferramenta: DOCUMENTO
-    - Pergunta: "qual a idade média dos clientes de MG?" -> Ferramenta: SQL
-    - Pergunta: "explique a política de renegociação de dívida." -> Ferramenta: DOCUMENTO
-
-    Analise a seguinte pergunta e retorne APENAS a palavra 'SQL' ou 'DOCUMENTO'.
-    Pergunta do usuário: "{question}"
-    Ferramenta:
+@st.cache_resource
+def start_warmup():
+    # Shared by every session: one background thread loads the resources while the UI renders.
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup").submit(load_resources)
+
+@st.cache_resource
+def get_orchestrator():
+    # One asyncio loop and one set of Athena/OpenAI concurrency limits for every session.
+    return Orchestrator()
+
+def track_stage(future):
+    """Remember a running pipeline future of this session, so a new question can cancel it."""
+    st.session_state.setdefault('running_stages', []).append(future)
+    return future
+
+def cancel_running_stages():
+    for future in st.session_state.pop('running_stages', []):
+        future.cancel()
+
+def wait_for_stage(future, status):
+    """
+    Wait for a pipeline future from the script thread. The elapsed time written to `status`
+    also lets Streamlit stop this run when the user submits a new question; the stage is
+    then cancelled instead of running on for nobody.
     """
-    response = openai.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": prompt}], temperature=0, max_tokens=5)
-    return response.choices[0].message.content.strip()
-
-def answer_with_rag(question, vector_store):
-    """Run the RAG flow to answer a question."""
-    # 1. Retrieve relevant documents
-    retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-    relevant_docs = retriever.get_relevant_documents(question)
+    track_stage(future)
+    start = time.perf_counter()
+    try:
+        while True:
+            try:
+                return future.result(timeout=0.25)
+            except FuturesTimeout:
+                status.caption(f"⏳ {time.perf_counter() - start:.0f} s")
+    finally:
+        status.empty()
+        if not future.done():
+            future.cancel()
+
+def answer_with_rag(question, retriever, stream=False, stats=None):
+    """
+    Run the RAG flow to answer a question.
+    With stream=True, return a generator of answer tokens instead of the full text.
+    """
+    # 1. Retrieve relevant documents (hybrid BM25 + vector search, see hybrid_retrieval.py)
+    relevant_docs = retriever.get_relevant_documents(question, stats=stats)
     
-    context = "\n\n---\n\n".join([doc.page_content for doc in relevant_docs])
+    # Chunk overlap removed and, above the token budget, only the sentences closest to the question
+    context = documents_context(question, relevant_docs)
 
     # 2. Generate answer using the context
     prompt = f"""
@@ -81,83 +111,87 @@ def answer_with_rag(question, vector_store):
 
     **Resposta:**
     """
-    response = openai.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": prompt}], temperature=0.3)
+    log_prompt_tokens("rag_answer", prompt, stats)
+    if stream:
+        return stream_chat_completion("rag_answer", stats, model="gpt-4", messages=[{"role": "user", "content": prompt}], temperature=0.3)
+    response = get_openai_client().chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": prompt}], temperature=0.3)
     return response.choices[0].message.content
 
-def generate_summary_with_llm(question, df):
-    """Generate a natural language summary from a DataFrame."""
+def generate_summary_with_llm(question, df, df_string=None, stream=False, stats=None):
+    """
+    Generate a natural language summary from a DataFrame.
+    With stream=True, return a generator of summary tokens instead of the full text.
+    """
     if df.empty:
         return "Não há dados para resumir."
         
-    df_string = df.to_csv(index=False)
+    if df_string is None:
+        df_string = dataframe_context(df)
     
     prompt = f"""
     Você é um analista de dados sênior.
     A pergunta original do usuário foi: "{question}"
-    Os dados resultantes da consulta SQL são os seguintes (em formato CSV):
+    Os dados resultantes da consulta SQL são os seguintes (em CSV ou, se forem grandes, resumidos com agregados e uma amostra de linhas):
     ---
     {df_string}
     ---
     Com base nesses dados e na pergunta original, escreva um resumo conciso (2-3 frases) explicando o resultado para o usuário em português.
     Seja direto e foque nos insights principais.
     """
-    response = openai.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": prompt}], temperature=0.5, max_tokens=200)
+    log_prompt_tokens("sql_summary", prompt, stats)
+    if stream:
+        return stream_chat_completion("sql_summary", stats, model="gpt-4", messages=[{"role": "user", "content": prompt}], temperature=0.5, max_tokens=200)
+    response = get_openai_client().chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": prompt}], temperature=0.5, max_tokens=200)
     return response.choices[0].message.content
 
-def generate_plot_code_with_llm(question, df):
+def generate_chart_spec_with_llm(question, df, df_string=None):
     """
-    Generate Python code with Plotly to create a chart, stripping extra text and formatting.
+    Ask the LLM for a chart spec (kind, x, y, color, title) when no planner rule fits the
+    result. Returns a spec validated against the DataFrame columns, or None.
     """
     if df.empty:
         return None
         
-    df_string = df.to_csv(index=False)
+    if df_string is None:
+        df_string = dataframe_context(df)
     
     prompt = f"""
-    Você é um especialista em visualização de dados usando Plotly em Python.
+    Você é um especialista em visualização de dados.
     A pergunta original do usuário foi: "{question}".
-    Os dados para plotar estão no DataFrame abaixo (em formato CSV), que será carregado em uma variável chamada `df`.
+    Os dados para plotar estão abaixo (em CSV ou, se forem grandes, resumidos com esquema, agregados e uma amostra de linhas). As colunas disponíveis são: {', '.join(map(str, df.columns))}.
     ---
     {df_string}
     ---
-    Com base na pergunta e nos dados, gere APENAS o código Python para criar uma figura com Plotly Express.
-    - O código deve começar com 'import plotly.express as px'.
-    - Use a variável `df` que já contém os dados.
-    - Atribua a figura final a uma variável chamada `fig`.
-    - Não inclua explicações, textos extras ou blocos de código. APENAS O CÓDIGO.
-    - Exemplo: `import plotly.express as px\nfig = px.bar(df, x='uf', y='taxa_inadimplencia', title='Taxa de Inadimplência por UF')`
+    Com base na pergunta e nos dados, escolha o gráfico e responda APENAS com um objeto JSON, sem explicações:
+    {{"kind": "bar" | "line" | "pie" | "scatter" | "histogram", "x": "<coluna>", "y": "<coluna ou null>", "color": "<coluna ou null>", "title": "<título em português>"}}
+    - Em "pie", "x" são as fatias e "y" os valores; em "histogram", "y" é null.
+    - Exemplo: {{"kind": "bar", "x": "uf", "y": "taxa_inadimplencia", "color": null, "title": "Taxa de Inadimplência por UF"}}
     """
+    log_prompt_tokens("chart_spec", prompt)
     try:
-        response = openai.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4", 
             messages=[{"role": "user", "content": prompt}], 
             temperature=0, 
-            max_tokens=300
+            max_tokens=150
         )
-        
-        raw_text = response.choices[0].message.content
-
-        # Clean up potential markdown code fences
-        if "```python" in raw_text:
-            python_code = raw_text.split("```python")[1].split("```")[0].strip()
-        elif "'''python" in raw_text:
-            python_code = raw_text.split("'''python")[1].split("'''")[0].strip()
-        elif "```" in raw_text:
-            parts = raw_text.split("```")
-            python_code = parts[1] if len(parts) > 1 else parts[0]
-        else:
-            python_code = raw_text.strip()
-            
-        return python_code
+        return parse_chart_spec(response.choices[0].message.content, df)
 
     except Exception as e:
-        print(f"❌ Error from LLM when generating plot code: {e}")
+        print(f"❌ Error from LLM when generating the chart spec: {e}")
         return None
 
-def generate_sql_with_llm(question):
+def generate_sql_with_llm(question, previous_sql=None, error=None):
     """
     Convert the user question into an SQL query for AWS Athena, removing markdown formatting.
+    `previous_sql` and `error` ask for a corrected query after a rejected attempt.
     """
+    correction = f"""
+    **Sua tentativa anterior foi rejeitada:**
+    {previous_sql}
+    **Erro:** {error}
+    Corrija a query usando apenas a tabela e as colunas do esquema acima.
+    """ if error else ""
     prompt = f"""
     Você é um assistente especialista em SQL que escreve queries para o AWS Athena.
     Sua tarefa é converter a pergunta do usuário em uma única query SQL.
@@ -174,11 +208,13 @@ def generate_sql_with_llm(question):
     1. Gere APENAS a query SQL. Sem explicações.
     2. Para "taxa de inadimplência", use AVG(CAST(inadimplente AS DOUBLE)).
     3. Use aspas duplas ("") para se referir à tabela: FROM "{GLUE_TABLE}".
+    {correction}
     **Pergunta do Usuário:** "{question}"
     **Sua query SQL:**
     """
+    log_prompt_tokens("sql_generation", prompt)
     try:
-        response = openai.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4", 
             messages=[{"role": "user", "content": prompt}], 
             temperature=0, 
@@ -205,49 +241,52 @@ def generate_sql_with_llm(question):
         print(f"❌ Error from LLM: {e}")
         return None
 
-def execute_athena_query(query):
+def render_chart(spec, df):
+    """Show the figure built from a chart spec (no generated code is executed)."""
+    if not spec:
+        st.warning("Não foi possível montar um gráfico para este resultado.")
+        return
+    fig = build_figure(spec, df)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def render_llm_chart(future, df, slot):
+    """Draw the chart spec of a GPT-4 chart stage into `slot`, waiting for it if still running."""
+    with slot, st.spinner("Gerando visualização..."):
+        try:
+            render_chart(wait_for_stage(future, st.empty()), df)
+        except StageTimeout as e:
+            st.warning(f"Gráfico não gerado: {e}")
+
+
+def drawing_ready_chart(tokens, pending, df, slot):
     """
-    Execute a query on Athena and return a tuple (DataFrame, Error).
+    Pass the summary tokens through to st.write_stream and draw the pending GPT-4 chart
+    (popped from `pending`) as soon as its future is done, instead of after the last token.
     """
-    athena_client = boto3.client('athena', region_name='sa-east-1')
-    try:
-        response = athena_client.start_query_execution(
-            QueryString=query,
-            QueryExecutionContext={'Database': GLUE_DATABASE},
-            ResultConfiguration={'OutputLocation': S3_OUTPUT_LOCATION}
-        )
-        query_execution_id = response['QueryExecutionId']
-        state = 'RUNNING'
-        while state in ['RUNNING', 'QUEUED']:
-            time.sleep(1)
-            result_status = athena_client.get_query_execution(QueryExecutionId=query_execution_id)
-            state = result_status['QueryExecution']['Status']['State']
-            
-            if state == 'FAILED':
-                error_message = result_status['QueryExecution']['Status']['StateChangeReason']
-                return None, f"Athena query failed: {error_message}"
-            elif state == 'CANCELLED':
-                return None, "The query was cancelled."
-
-        results_response = athena_client.get_query_results(QueryExecutionId=query_execution_id)
-        rows = results_response['ResultSet']['Rows']
-        
-        if not rows or len(rows) < 2:
-            return pd.DataFrame(), None 
-        
-        header = [col['VarCharValue'] for col in rows[0]['Data']]
-        data = [[item.get('VarCharValue') for item in row['Data']] for row in rows[1:]]
-        
-        return pd.DataFrame(data, columns=header), None 
-
-    except Exception as e:
-        return None, f"An error occurred while communicating with Athena: {e}"
+    with contextlib.closing(tokens):
+        for token in tokens:
+            if pending and pending[0].done():
+                render_llm_chart(pending.pop(), df, slot)
+            yield token
 
 
 # --- STREAMLIT INTERFACE ---
 
 st.set_page_config(page_title="Chatbot de Análise de Dados", layout="wide")
 st.title("🤖 Chatbot de Análise de Dados com AWS Athena")
+st.caption(f"Backend de consulta: **{QUERY_BACKEND}**")
+startup_profile.mark("first_paint")
+
+warmup = start_warmup()
+if warmup.done() and warmup.exception() is not None:
+    # A failed load is not kept in the cache: retry it on this run.
+    print(f"❌ Loading the resources failed, retrying: {warmup.exception()}")
+    start_warmup.clear()
+    warmup = start_warmup()
+orchestrator = get_orchestrator()
+if not warmup.done():
+    st.caption("⏳ Carregando o modelo de embeddings e a base vetorial em segundo plano...")
 
 # Initialize chat history in session
 if "messages" not in st.session_state:
@@ -263,58 +302,140 @@ for message in st.session_state.messages:
 
 # Capture new user question
 if prompt := st.chat_input("Faça sua pergunta sobre os dados ou documentos..."):
+    # A new question cancels whatever the previous one still had running (Athena query, LLM calls).
+    cancel_running_stages()
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
         with st.spinner("Analisando sua pergunta..."):
-            chosen_tool = decide_tool(prompt)
-            st.info(f"Ferramenta escolhida: **{chosen_tool}**")
+            # Blocks only if the warmup is still running.
+            try:
+                resources = warmup.result()
+            except Exception as e:
+                start_warmup.clear()
+                st.error(f"Não foi possível carregar os recursos: {e}. Envie a pergunta novamente para tentar de novo.")
+                st.stop()
+            query_cache = resources['query_cache']
+
+        with st.spinner("Consultando os dados..."):
+            result = wait_for_stage(orchestrator.submit(
+                answer_question(orchestrator, prompt, resources, generate_sql_with_llm)
+            ), st.empty())
+        chosen_tool = result.get('tool')
+        if chosen_tool:
+            st.info(f"Ferramenta escolhida: **{chosen_tool}** ({result['route_stage']})")
 
         if chosen_tool == "SQL":
-            with st.spinner("Gerando SQL e consultando o Athena..."):
-                sql_query = generate_sql_with_llm(prompt)
-                st.markdown(f"**SQL Gerado:**\n```sql\n{sql_query}\n```")
-                df_result, error = execute_athena_query(sql_query)
-
+            if result.get('preflight_error'):
+                st.caption(f"SQL rejeitada na validação e gerada novamente: {result['preflight_error']}")
+            if result.get('sql'):
+                st.markdown(f"**SQL Gerado ({result['sql_source']}):**\n```sql\n{result['sql']}\n```")
+            if result.get('rollup_sql'):
+                st.caption(f"Respondida pelo rollup: `{result['rollup_sql']}`")
+            with st.expander("⏱️ Latência da consulta"):
+                st.json({k: round(v, 1) if isinstance(v, float) else v
+                         for k, v in {**result['stats'], **result.get('query_stats', {})}.items()})
+
+            error, df_result = result['error'], result.get('df')
             if error:
                 st.error(f"Ocorreu um erro: {error}")
             elif not df_result.empty:
                 st.success("Consulta SQL concluída!")
 
-                summary = generate_summary_with_llm(prompt, df_result)
-                st.markdown(summary)
-                st.session_state.messages.append({"role": "assistant", "content": summary})
-
                 chart_keywords = ['gráfico', 'visualização', 'plot', 'desenhe', 'mostre um gráfico']
-                if any(keyword in prompt.lower() for keyword in chart_keywords):
-                    with st.spinner("Gerando visualização..."):
-                        chart_code = generate_plot_code_with_llm(prompt, df_result)
-                        
-                        if chart_code:
-                            st.markdown(f"**Código do Gráfico Gerado:**\n```python\n{chart_code}\n```")
-                            try:
-                                namespace = {'df': df_result, 'px': px, 'fig': None}
-                                exec(chart_code, namespace)
-                                fig = namespace.get('fig')
-                                if fig:
-                                    st.plotly_chart(fig, use_container_width=True)
-                                else:
-                                    st.warning("O código do gráfico foi gerado, mas não criou um objeto 'fig'.")
-                            except Exception as e:
-                                st.error(f"Erro ao executar o código do gráfico: {e}")
+                wants_chart = any(keyword in prompt.lower() for keyword in chart_keywords)
+                summary = result.get('summary')
+                new_summary = summary is None
+
+                # The chart is planned from the result's column types and the question; GPT-4
+                # is only asked for a chart spec when no rule fits, in the background while the
+                # summary streams in. The data is serialized once (within the token budget).
+                summary_slot = st.container()
+                chart_slot = st.container()
+                start = time.perf_counter()
+                chart_spec = plan_chart(prompt, df_result) if wants_chart else None
+                plan_ms = (time.perf_counter() - start) * 1000
+                ask_chart = wants_chart and chart_spec is None
+                df_string = dataframe_context(df_result) if summary is None or ask_chart else None
+                chart_future = track_stage(orchestrator.submit(orchestrator.stage(
+                    'chart', generate_chart_spec_with_llm, prompt, df_result, df_string, stats={}, limit='openai'
+                ))) if ask_chart else None
+
+                # Summary and chart run in parallel and each is drawn as soon as it is ready: a
+                # rule chart right away, a GPT-4 chart between summary tokens once its stage is done.
+                if chart_spec:
+                    with chart_slot:
+                        render_chart(chart_spec, df_result)
+                        st.caption(f"⏱️ Gráfico {chart_spec['kind']} escolhido pela regra \"{chart_spec['rule']}\" em {plan_ms:.1f} ms")
+                pending_chart = [chart_future] if chart_future else []
+
+                if summary is None:
+                    llm_stats = {}
+                    summary = summary_slot.write_stream(drawing_ready_chart(orchestrator.stream(
+                        'summary', lambda: generate_summary_with_llm(prompt, df_result, df_string, stream=True, stats=llm_stats),
+                        stats=llm_stats,
+                    ), pending_chart, df_result, chart_slot))
+                    summary_slot.caption(f"⏱️ Primeiro token em {llm_stats.get('ttft_ms', 0):.0f} ms · resposta completa em {llm_stats.get('total_ms', 0):.0f} ms · {llm_stats.get('prompt_tokens', 0)} tokens no prompt")
+                    if llm_stats.get('timed_out'):
+                        # A cut-off summary is shown but never cached.
+                        summary_slot.warning(f"Resumo incompleto: {llm_stats['timed_out']}")
+                        new_summary = False
                 else:
+                    summary_slot.markdown(summary)
+
+                if pending_chart:
+                    render_llm_chart(pending_chart.pop(), df_result, chart_slot)
+
+                st.session_state.messages.append({"role": "assistant", "content": summary})
+                if query_cache:
+                    # SQL reused from a similar question is not stored under this one.
+                    if result['sql_source'] != "cache":
+                        query_cache.put_question(prompt, result['sql'])
+                    if new_summary:
+                        query_cache.put_summary(prompt, result['sql'], summary)
+
+                if not wants_chart:
                     st.dataframe(df_result)
                     st.session_state.messages.append({"role": "assistant", "content": df_result})
             else:
                 st.warning("A consulta SQL não retornou resultados.")
         
         elif chosen_tool == "DOCUMENTO":
-            with st.spinner("Buscando nos documentos e gerando resposta..."):
-                rag_answer = answer_with_rag(prompt, vector_store)
-                st.markdown(rag_answer)
-                st.session_state.messages.append({"role": "assistant", "content": rag_answer})
+            llm_stats = {}
+            rag_answer = st.write_stream(orchestrator.stream(
+                'rag', lambda: answer_with_rag(prompt, resources['retriever'], stream=True, stats=llm_stats),
+                stats=llm_stats,
+            ))
+            st.caption(f"⏱️ Busca em {llm_stats.get('retrieval_ms', 0):.0f} ms · primeiro token em {llm_stats.get('ttft_ms', 0):.0f} ms · resposta completa em {llm_stats.get('total_ms', 0):.0f} ms · {llm_stats.get('prompt_tokens', 0)} tokens no prompt")
+            if llm_stats.get('timed_out'):
+                st.warning(f"Resposta incompleta: {llm_stats['timed_out']}")
+            st.session_state.messages.append({"role": "assistant", "content": rag_answer})
         
+        elif result['error']:
+            st.error(f"Ocorreu um erro: {result['error']}")
         else:
             st.error("Não consegui decidir qual ferramenta usar. Por favor, reformule a pergunta.")
+        startup_profile.mark("first_answer")
+
+# Rendered last so the counters include the question just answered.
+ready = warmup.done() and warmup.exception() is None
+query_cache = warmup.result()['query_cache'] if ready else None
+if query_cache:
+    with st.sidebar:
+        st.subheader("🗄️ Cache de consultas")
+        for level, label in [('question', 'Pergunta → SQL'), ('semantic', 'Pergunta similar → SQL'), ('result', 'SQL → Resultado')]:
+            counts = query_cache.stats[level]
+            st.metric(label, f"{counts['hits']} acertos", f"{counts['misses']} falhas", delta_color="off")
+
+embedding_cache = warmup.result()['vector_store'].embeddings if ready else None
+if hasattr(embedding_cache, 'hit_rate'):
+    with st.sidebar:
+        st.subheader("🧠 Cache de embeddings")
+        st.metric("Taxa de acerto", f"{embedding_cache.hit_rate:.0%}",
+                  f"{embedding_cache.stats['hits']} acertos · {embedding_cache.stats['misses']} falhas", delta_color="off")
+
+with st.sidebar.expander("🚀 Inicialização"):
+    # Milliseconds since the process started; `python startup_profile.py` adds import times.
+    st.json(startup_profile.events)
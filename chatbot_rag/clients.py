@@ -0,0 +1,92 @@
+import threading
+import time
+from functools import lru_cache
+
+import openai
+
+from settings import (
+    OPENAI_API_KEY, AWS_REGION, AWS_MAX_POOL_CONNECTIONS, AWS_RETRY_MODE, AWS_MAX_ATTEMPTS,
+    AWS_CONNECT_TIMEOUT_SECONDS, AWS_READ_TIMEOUT_SECONDS,
+    OPENAI_MAX_CONNECTIONS, OPENAI_MAX_RETRIES, OPENAI_TIMEOUT_SECONDS,
+)
+
+# Clients live for the whole process (module globals survive Streamlit reruns), so credentials,
+# endpoints and TLS connections are set up once and reused by every question and session.
+
+# boto3 sessions are not thread-safe; clients created from them are.
+_session_lock = threading.Lock()
+
+
+# boto3 is imported on first use, so the app's first paint doesn't wait for it.
+@lru_cache(maxsize=None)
+def get_aws_session():
+    import boto3
+
+    return boto3.session.Session(region_name=AWS_REGION)
+
+
+@lru_cache(maxsize=None)
+def aws_config():
+    from botocore.config import Config
+
+    return Config(
+        region_name=AWS_REGION,
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=AWS_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=AWS_READ_TIMEOUT_SECONDS,
+        # 'adaptive' retries throttling errors with backoff and also rate-limits the client side.
+        retries={'mode': AWS_RETRY_MODE, 'max_attempts': AWS_MAX_ATTEMPTS},
+    )
+
+
+@lru_cache(maxsize=None)
+def get_aws_client(service):
+    """Shared boto3 client for `service` ('athena', 's3', ...), with the pooled aws_config()."""
+    with _session_lock:
+        return get_aws_session().client(service, config=aws_config())
+
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    """Shared OpenAI client with a keep-alive connection pool and retries."""
+    import httpx
+
+    return openai.OpenAI(
+        api_key=OPENAI_API_KEY,
+        max_retries=OPENAI_MAX_RETRIES,
+        timeout=OPENAI_TIMEOUT_SECONDS,
+        http_client=openai.DefaultHttpxClient(limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+        )),
+    )
+
+
+def timed_aws_client(service, stats):
+    """
+    The shared client for `service`, recording in `stats` how long it took to obtain it
+    (session, credentials and endpoint on the first call, ~0 afterwards).
+    """
+    start = time.perf_counter()
+    client = get_aws_client(service)
+    stats[f'{service}_client_ms'] = stats.get(f'{service}_client_ms', 0.0) + (time.perf_counter() - start) * 1000
+    return client
+
+
+def opened_connections(client):
+    """Total connections the client's urllib3 pools have opened so far (0 if not inspectable)."""
+    http_session = getattr(getattr(client, '_endpoint', None), 'http_session', None)
+    managers = [getattr(http_session, '_manager', None), *getattr(http_session, '_proxy_managers', {}).values()]
+    total = 0
+    for manager in filter(None, managers):
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            total += getattr(pool, 'num_connections', 0) if pool is not None else 0
+    return total
+
+
+def warm_up_clients(services=('athena', 's3')):
+    """Create the shared clients ahead of the first question (credential and endpoint resolution)."""
+    for service in services:
+        get_aws_client(service)
+    get_openai_client()
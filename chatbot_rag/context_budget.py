@@ -0,0 +1,151 @@
+import re
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from settings import RAG_CONTEXT_TOKENS, DATAFRAME_CONTEXT_TOKENS
+
+try:
+    import tiktoken
+except ImportError:  # Falls back to the ~4 characters per token rule of thumb.
+    tiktoken = None
+
+# Prompt tokens of the most recent LLM calls, newest last.
+token_log = deque(maxlen=100)
+
+# Longest overlap looked for between consecutive chunks (the splitter uses 150 characters).
+MAX_OVERLAP_CHARS = 200
+MIN_OVERLAP_CHARS = 20
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+|\n{2,}|\n(?=[A-ZÁÉÍÓÚÂÊÔÃÕÇ0-9•\-])')
+
+
+def count_tokens(text, model='gpt-4'):
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding('cl100k_base')
+    return len(encoding.encode(text))
+
+
+def log_prompt_tokens(label, prompt, stats=None, model='gpt-4'):
+    """Count the tokens of a prompt, record them under `label` and in `stats['prompt_tokens']`."""
+    tokens = count_tokens(prompt, model)
+    if stats is not None:
+        stats['prompt_tokens'] = tokens
+    token_log.append({'label': label, 'prompt_tokens': tokens})
+    print(f"🧮 {label}: {tokens} prompt tokens")
+    return tokens
+
+
+# --- DataFrames ---
+
+def _rows_csv(df):
+    return df.to_csv(index=False).strip()
+
+
+def _sample_positions(n_rows, n_sample):
+    """First rows (results are often ordered) plus evenly spaced rows from the rest."""
+    n_head = min(n_sample // 2, n_rows)
+    rest = n_sample - n_head
+    spread = np.linspace(n_head, n_rows - 1, num=rest).round().astype(int) if rest > 0 and n_rows > n_head else []
+    return sorted(set(range(n_head)) | set(int(position) for position in spread))
+
+
+def _aggregates(df):
+    """Per-column summary: numeric min/max/mean/sum, date range, top values of the others."""
+    lines = []
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            lines.append(f"- {column}: min={series.min():.6g}, max={series.max():.6g}, "
+                         f"média={series.mean():.6g}, soma={series.sum():.6g}, nulos={series.isna().sum()}")
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            lines.append(f"- {column}: de {series.min()} a {series.max()}, nulos={series.isna().sum()}")
+        else:
+            top = series.astype('string').value_counts(dropna=True).head(5)
+            values = ', '.join(f"{value} ({count})" for value, count in top.items())
+            lines.append(f"- {column}: {series.nunique(dropna=True)} valores distintos; mais frequentes: {values}")
+    return '\n'.join(lines)
+
+
+def dataframe_context(df, budget=DATAFRAME_CONTEXT_TOKENS):
+    """
+    The DataFrame as prompt text within `budget` tokens: the full CSV when it fits,
+    otherwise schema, dtypes, row count, per-column aggregates and as many sampled rows
+    as the remaining budget allows.
+    """
+    full = _rows_csv(df)
+    if count_tokens(full) <= budget:
+        return full
+
+    header = (
+        f"Resultado com {len(df)} linhas e {len(df.columns)} colunas (amostra abaixo, não é o resultado completo).\n"
+        f"Colunas e tipos: " + ', '.join(f"{column} ({dtype})" for column, dtype in df.dtypes.astype(str).items()) +
+        f"\nResumo por coluna (calculado sobre todas as linhas):\n{_aggregates(df)}\n"
+        f"Linhas de amostra (CSV):\n"
+    )
+    remaining = budget - count_tokens(header)
+    # Cost of a row estimated from the average row, then trimmed if the estimate was low.
+    per_row = max(count_tokens(full) / max(len(df), 1), 1)
+    n_sample = max(int(remaining / per_row), 1)
+    while True:
+        sample = _rows_csv(df.iloc[_sample_positions(len(df), n_sample)])
+        if n_sample == 1 or count_tokens(sample) <= remaining:
+            return header + sample
+        n_sample = max(int(n_sample * 0.8), 1)
+
+
+# --- Documents ---
+
+def _strip_overlap(previous, text):
+    """Drop the start of `text` that repeats the end of `previous` (the splitter's chunk overlap)."""
+    tail = previous[-MAX_OVERLAP_CHARS:]
+    for size in range(min(len(tail), len(text)), MIN_OVERLAP_CHARS - 1, -1):
+        if text.startswith(tail[-size:]):
+            return text[size:]
+    return text
+
+
+def _sentences(text):
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def documents_context(question, documents, budget=RAG_CONTEXT_TOKENS):
+    """
+    Context text for the RAG prompt within `budget` tokens. Overlapping text between
+    chunks is removed; if the result is still too long, only the sentences sharing the
+    most words with the question are kept, in their original order.
+    """
+    from hybrid_retrieval import tokenize
+
+    passages, kept = [], []
+    for document in documents:
+        text = document.page_content
+        for previous in kept:
+            text = _strip_overlap(previous, text)
+        if text.strip() and text.strip() not in '\n'.join(kept):
+            kept.append(document.page_content)
+            passages.append(text.strip())
+    context = "\n\n---\n\n".join(passages)
+    if count_tokens(context) <= budget:
+        return context
+
+    terms = set(tokenize(question))
+    sentences = [(p, i, sentence) for p, passage in enumerate(passages) for i, sentence in enumerate(_sentences(passage))]
+    ranked = sorted(sentences, key=lambda item: -len(terms & set(tokenize(item[2]))))
+    chosen, used = set(), 0
+    for p, i, sentence in ranked:
+        cost = count_tokens(sentence) + 1
+        if used + cost > budget:
+            continue
+        chosen.add((p, i))
+        used += cost
+    by_passage = {}
+    for p, i, sentence in sentences:
+        if (p, i) in chosen:
+            by_passage.setdefault(p, []).append(sentence)
+    return "\n\n---\n\n".join(' '.join(parts) for _, parts in sorted(by_passage.items()))
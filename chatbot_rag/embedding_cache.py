@@ -0,0 +1,135 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from settings import EMBEDDING_BACKEND, EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# SQLite limits the number of bound parameters per statement.
+_LOOKUP_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Persistent cache in front of an embedding model, keyed by model name plus a hash of
+    the text: cached texts skip the transformer forward pass entirely. Documents and
+    queries are kept apart, since some models embed them differently. Least-recently-used
+    vectors are evicted once the cache holds more than `max_entries`.
+    """
+
+    def __init__(self, embeddings, model_name, path=EMBEDDING_CACHE_PATH,
+                 max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call, like QueryCache, so Streamlit threads can share it.
+        con = sqlite3.connect(self.path, timeout=10)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    @property
+    def hit_rate(self):
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def _key(self, kind, text):
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode('utf-8')).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        now = time.time()
+        with self._connect() as con:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start:start + _LOOKUP_BATCH]
+                placeholders = ', '.join('?' * len(batch))
+                for key, vector in con.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch):
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+                con.execute(f"UPDATE embeddings SET last_access = ? WHERE key IN ({placeholders})", [now, *batch])
+        return found
+
+    def _store(self, vectors):
+        now = time.time()
+        with self._connect() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in vectors.items()],
+            )
+            excess = con.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if excess > 0:
+                con.execute("""
+                    DELETE FROM embeddings WHERE key IN (
+                        SELECT key FROM embeddings ORDER BY last_access LIMIT ?)
+                """, (excess,))
+
+    def _embed(self, kind, texts, compute):
+        keys = [self._key(kind, text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        with self._lock:
+            self.stats['hits'] += len(texts) - sum(key in missing for key in keys)
+            self.stats['misses'] += sum(key in missing for key in keys)
+        if missing:
+            computed = dict(zip(missing, compute(list(missing.values()))))
+            self._store(computed)
+            found.update(computed)
+        return [list(found[key]) for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed('document', texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed('query', [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+
+def load_backend(backend=EMBEDDING_BACKEND, model_name=EMBEDDING_MODEL, **kwargs):
+    """
+    The bare embedding model: 'torch' (sentence-transformers through HuggingFaceEmbeddings)
+    or 'onnx' (int8-quantized ONNX Runtime, see onnx_embeddings.py).
+    """
+    if backend == 'onnx':
+        from onnx_embeddings import OnnxEmbeddings
+
+        return OnnxEmbeddings(model_name, batch_size=kwargs.get('encode_kwargs', {}).get('batch_size', 64))
+    if backend == 'torch':
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=model_name, **kwargs)
+    raise ValueError(f"Unknown embedding backend '{backend}'. Use 'torch' or 'onnx'.")
+
+
+def build_embeddings(model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND, **kwargs):
+    """
+    The embedding function used for both indexing and querying, behind the persistent
+    cache unless it is disabled in config.json.
+    """
+    embeddings = load_backend(backend, model_name, **kwargs)
+    if not EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    # The quantized model's vectors are close to, not equal to, the torch ones: cache them apart.
+    return CachedEmbeddings(embeddings, model_name if backend == 'torch' else f"{model_name}@{backend}-int8")
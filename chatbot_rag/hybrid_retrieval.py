@@ -0,0 +1,167 @@
+import json
+import math
+import os
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from query_cache import normalize_question
+from settings import (
+    BM25_INDEX_PATH, RETRIEVAL_MODE, RETRIEVAL_K, RETRIEVAL_CANDIDATES,
+    RERANK_ENABLED, RERANK_MODEL, RERANK_CANDIDATES, RERANK_BUDGET_MS,
+)
+
+# Function words that only add noise to the BM25 scores.
+STOPWORDS = set("""
+    a o as os um uma uns umas de do da dos das em no na nos nas por pelo pela pelos pelas
+    para com sem sobre entre e ou que qual quais quem como quando onde se ser sao e foi ha
+    ao aos me meu minha seu sua isso este esta esse essa deve pode qualquer
+""".split())
+
+# Standard constant of reciprocal rank fusion: 1 / (RRF_K + rank).
+RRF_K = 60
+
+
+def tokenize(text):
+    """Normalized (lowercase, no accents/punctuation) words without stopwords; numbers are kept."""
+    return [token for token in normalize_question(text).split() if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-process Okapi BM25 over the indexed chunks, with an inverted index of
+    term -> (chunk position, term frequency). Built at indexing time and saved as JSON.
+    """
+
+    def __init__(self, ids, texts, metadatas, k1=1.5, b=0.75):
+        self.ids, self.texts, self.metadatas = ids, texts, metadatas
+        self.k1, self.b = k1, b
+        postings = {}
+        self.doc_len = np.zeros(len(texts), dtype=np.float32)
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.doc_len[position] = len(tokens)
+            for token in set(tokens):
+                postings.setdefault(token, []).append((position, tokens.count(token)))
+        self.avgdl = float(self.doc_len.mean()) if len(texts) else 0.0
+        self.postings = {
+            term: (np.array([p for p, _ in entries], dtype=np.int64), np.array([tf for _, tf in entries], dtype=np.float32))
+            for term, entries in postings.items()
+        }
+
+    @classmethod
+    def from_vector_store(cls, vector_store):
+        indexed = vector_store.get(include=["documents", "metadatas"])
+        return cls(indexed["ids"], indexed["documents"], [metadata or {} for metadata in indexed["metadatas"]])
+
+    def save(self, path=BM25_INDEX_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'ids': self.ids, 'texts': self.texts, 'metadatas': self.metadatas}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path=BM25_INDEX_PATH):
+        """Load a saved index, or return None if indexing hasn't produced one yet."""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['ids'], data['texts'], data['metadatas'])
+
+    def search(self, query, k):
+        """Return up to k (position, score) pairs, best first."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            positions, tf = self.postings[term]
+            idf = math.log(1 + (len(self.ids) - len(positions) + 0.5) / (len(positions) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[positions] / self.avgdl)
+            scores[positions] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = np.argsort(-scores)[:k]
+        return [(int(position), float(scores[position])) for position in best if scores[position] > 0]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked lists of IDs: each ID scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever:
+    """
+    Chroma vector search fused with BM25 by reciprocal rank fusion, optionally re-ranked by
+    a CPU cross-encoder within a latency budget. Falls back to vector search alone when
+    there is no BM25 index or the mode is 'vector'.
+    """
+
+    def __init__(self, vector_store, bm25=None, mode=RETRIEVAL_MODE, k=RETRIEVAL_K,
+                 candidates=RETRIEVAL_CANDIDATES, reranker=None, rerank_candidates=RERANK_CANDIDATES,
+                 rerank_budget_ms=RERANK_BUDGET_MS):
+        self.vector_store = vector_store
+        self.bm25 = bm25 if mode == 'hybrid' else None
+        self.k = k
+        self.candidates = candidates
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.rerank_budget_ms = rerank_budget_ms
+
+    def _vector_search(self, question):
+        result = self.vector_store._collection.query(
+            query_embeddings=[self.vector_store.embeddings.embed_query(question)],
+            n_results=self.candidates, include=["documents", "metadatas"])
+        return {id_: (text, metadata or {}) for id_, text, metadata
+                in zip(result["ids"][0], result["documents"][0], result["metadatas"][0])}
+
+    def _rerank(self, question, ranked, chunks, stats):
+        """
+        Score the top candidates with the cross-encoder in small batches until the budget
+        runs out; scored candidates are reordered, the rest keep their fused order.
+        """
+        start = time.perf_counter()
+        pending, scored = ranked[:self.rerank_candidates], {}
+        while pending and (time.perf_counter() - start) * 1000 < self.rerank_budget_ms:
+            batch, pending = pending[:4], pending[4:]
+            scores = self.reranker.predict([(question, chunks[id_][0]) for id_ in batch])
+            scored.update(zip(batch, scores))
+        stats['rerank_ms'] = (time.perf_counter() - start) * 1000
+        stats['reranked'] = len(scored)
+        return sorted(scored, key=scored.get, reverse=True) + [id_ for id_ in ranked if id_ not in scored]
+
+    def get_relevant_documents(self, question, stats=None):
+        stats = stats if stats is not None else {}
+        start = time.perf_counter()
+        chunks = self._vector_search(question)
+        rankings = [list(chunks)]
+        stats['vector_ms'] = (time.perf_counter() - start) * 1000
+
+        if self.bm25 is not None:
+            bm25_start = time.perf_counter()
+            hits = self.bm25.search(question, self.candidates)
+            for position, _ in hits:
+                chunks.setdefault(self.bm25.ids[position], (self.bm25.texts[position], self.bm25.metadatas[position]))
+            rankings.append([self.bm25.ids[position] for position, _ in hits])
+            stats['bm25_ms'] = (time.perf_counter() - bm25_start) * 1000
+
+        ranked = reciprocal_rank_fusion(rankings)
+        if self.reranker is not None:
+            ranked = self._rerank(question, ranked, chunks, stats)
+        stats['retrieval_ms'] = (time.perf_counter() - start) * 1000
+        return [Document(page_content=chunks[id_][0], metadata={**chunks[id_][1], 'id': id_}) for id_ in ranked[:self.k]]
+
+
+def load_reranker(model_name=RERANK_MODEL):
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(model_name, device='cpu')
+
+
+def build_retriever(vector_store, **kwargs):
+    """The retriever used by answer_with_rag, configured from config.json."""
+    reranker = load_reranker() if RERANK_ENABLED else None
+    return HybridRetriever(vector_store, bm25=BM25Index.load(), reranker=reranker, **kwargs)
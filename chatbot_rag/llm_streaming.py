@@ -0,0 +1,31 @@
+import time
+from collections import deque
+
+from clients import get_openai_client
+
+# Time to first token and total time of the most recent streamed completions, newest last.
+latency_log = deque(maxlen=100)
+
+
+def stream_chat_completion(label, stats=None, **kwargs):
+    """
+    Yield the text deltas of a streamed chat completion (for st.write_stream).
+    `stats` is filled with the time to first token and the total time, in milliseconds,
+    and the measurement is also logged under `label`.
+    """
+    stats = {} if stats is None else stats
+    stats['label'] = label
+    start = time.perf_counter()
+    response = get_openai_client().chat.completions.create(stream=True, **kwargs)
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if 'ttft_ms' not in stats:
+                stats['ttft_ms'] = (time.perf_counter() - start) * 1000
+            yield delta
+    stats['total_ms'] = (time.perf_counter() - start) * 1000
+    latency_log.append(dict(stats))
+    print(f"⏱️ {label}: first token in {stats.get('ttft_ms', stats['total_ms']):.0f} ms, "
+          f"complete in {stats['total_ms']:.0f} ms")
@@ -0,0 +1,84 @@
+import os
+import shutil
+import sys
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from settings import EMBEDDING_ONNX_DIR
+
+# Same limit sentence-transformers uses for all-MiniLM-L6-v2.
+MAX_SEQ_LENGTH = 256
+MODEL_FILE = 'model_int8.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+
+
+def export_quantized_model(model_name, directory=EMBEDDING_ONNX_DIR):
+    """
+    Download the ONNX export of the model published on the Hugging Face Hub and quantize
+    its weights to int8 (dynamic quantization: activations stay float, no calibration set).
+    Needs onnx and huggingface_hub, but not torch.
+    """
+    from huggingface_hub import hf_hub_download
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(directory, exist_ok=True)
+    shutil.copy(hf_hub_download(model_name, TOKENIZER_FILE), os.path.join(directory, TOKENIZER_FILE))
+    quantize_dynamic(hf_hub_download(model_name, 'onnx/model.onnx'), os.path.join(directory, MODEL_FILE),
+                     weight_type=QuantType.QInt8)
+    print(f"✅ Quantized model saved to '{directory}'.")
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    all-MiniLM-L6-v2 through ONNX Runtime with int8 weights: same tokenizer, mean pooling
+    and L2 normalization as the sentence-transformers pipeline, without importing torch.
+    """
+
+    def __init__(self, model_name, directory=EMBEDDING_ONNX_DIR, batch_size=64, threads=0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        if not os.path.exists(os.path.join(directory, MODEL_FILE)):
+            export_quantized_model(model_name, directory)
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads  # 0 lets ONNX Runtime use every core
+        self.session = ort.InferenceSession(os.path.join(directory, MODEL_FILE), options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _encode(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + self.batch_size])
+            mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {
+                'input_ids': np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                'attention_mask': mask,
+                'token_type_ids': np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+            weights = mask[..., None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+    def embed_documents(self, texts):
+        return self._encode(list(texts))
+
+    def embed_query(self, text):
+        return self._encode([text])[0]
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    # Pre-builds the quantized model, e.g. while building the app image.
+    from embedding_cache import EMBEDDING_MODEL
+    export_quantized_model(sys.argv[1] if len(sys.argv) > 1 else EMBEDDING_MODEL)
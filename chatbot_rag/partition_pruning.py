@@ -0,0 +1,134 @@
+from datetime import datetime, timezone
+
+import sqlglot
+from sqlglot import exp
+
+from settings import GLUE_TABLE
+
+# Hive partition columns written by pre_data.py, derived from data_referencia.
+COLUNA_ANO = 'ano_referencia'
+COLUNA_MES = 'mes_referencia'
+
+# Comparison seen from the column's side when the literal is on the left (2017 < x == x > 2017).
+_FLIPPED = {exp.GT: exp.LT, exp.GTE: exp.LTE, exp.LT: exp.GT, exp.LTE: exp.GTE, exp.EQ: exp.EQ}
+
+
+def _literal_datetime(node):
+    while isinstance(node, exp.Cast):
+        node = node.this
+    if isinstance(node, exp.Literal) and node.is_string:
+        try:
+            value = datetime.fromisoformat(node.this)
+        except ValueError:
+            return None
+        # Partitions are UTC months: '2017-01-01 00:00:00+03:00' still belongs to December 2016.
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    return None
+
+
+def _literal_int(node):
+    if isinstance(node, exp.Literal) and not node.is_string:
+        return int(node.this)
+    return None
+
+
+def _is_data_referencia(node):
+    return isinstance(node, exp.Column) and node.name == 'data_referencia'
+
+
+def _month_bounds(conjuncts):
+    """
+    Collect the (year, month) range implied by conditions on data_referencia.
+    Returns (lower, upper, only_month) where each bound is a (year, month) tuple or None.
+    """
+    lower, upper, only_month = None, None, None
+
+    def raise_lower(bound):
+        nonlocal lower
+        lower = bound if lower is None else max(lower, bound)
+
+    def cut_upper(bound):
+        nonlocal upper
+        upper = bound if upper is None else min(upper, bound)
+
+    for condition in conjuncts:
+        if isinstance(condition, exp.Between) and _is_data_referencia(condition.this):
+            low, high = _literal_datetime(condition.args['low']), _literal_datetime(condition.args['high'])
+            if low and high:
+                raise_lower((low.year, low.month))
+                cut_upper((high.year, high.month))
+            continue
+        if type(condition) not in _FLIPPED:
+            continue
+        left, right, kind = condition.this, condition.expression, type(condition)
+        if not isinstance(left, (exp.Column, exp.Year, exp.Month, exp.TimestampTrunc, exp.DateTrunc)):
+            left, right, kind = right, left, _FLIPPED[kind]
+
+        if _is_data_referencia(left) or (
+                isinstance(left, (exp.TimestampTrunc, exp.DateTrunc)) and _is_data_referencia(left.this)
+                and left.text('unit').upper() == 'MONTH'):
+            value = _literal_datetime(right)
+            if value is None:
+                continue
+            month = (value.year, value.month)
+            month_start = (value.day, value.hour, value.minute, value.second, value.microsecond) == (1, 0, 0, 0, 0)
+            if kind in (exp.GT, exp.GTE, exp.EQ):
+                raise_lower(month)
+            if kind == exp.LT and month_start:
+                # Strictly before the first instant of a month ends in the previous month.
+                cut_upper((value.year - (value.month == 1), (value.month - 2) % 12 + 1))
+            elif kind in (exp.LT, exp.LTE, exp.EQ):
+                cut_upper(month)
+        elif isinstance(left, exp.Year) and _is_data_referencia(left.this) and _literal_int(right):
+            year = _literal_int(right)
+            if kind in (exp.GT, exp.GTE, exp.EQ):
+                raise_lower((year + (kind == exp.GT), 1))
+            if kind in (exp.LT, exp.LTE, exp.EQ):
+                cut_upper((year - (kind == exp.LT), 12))
+        elif isinstance(left, exp.Month) and _is_data_referencia(left.this) and kind == exp.EQ:
+            only_month = _literal_int(right)
+    return lower, upper, only_month
+
+
+def add_partition_predicates(sql, table=GLUE_TABLE):
+    """
+    Add predicates on ano_referencia/mes_referencia implied by the date filters of the
+    query, so Athena (and DuckDB) only read the partitions that can match.
+    Returns the SQL unchanged when there is nothing to push down.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read='athena')
+    except sqlglot.errors.SqlglotError:
+        return sql
+    if not isinstance(tree, exp.Select) or not tree.args.get('where'):
+        return sql
+    tables = list(tree.find_all(exp.Table))
+    if len(tables) != 1 or tables[0].name != table:
+        return sql
+    if any(column.name in (COLUNA_ANO, COLUNA_MES) for column in tree.find_all(exp.Column)):
+        return sql
+
+    condition = tree.args['where'].this
+    conjuncts = list(condition.flatten()) if isinstance(condition, exp.And) else [condition]
+    lower, upper, only_month = _month_bounds(conjuncts)
+
+    predicates = []
+    if lower and upper and lower[0] == upper[0]:
+        predicates.append(f"{COLUNA_ANO} = {lower[0]}")
+        if lower[1] == upper[1]:
+            predicates.append(f"{COLUNA_MES} = {lower[1]}")
+        elif (lower[1], upper[1]) != (1, 12):
+            predicates.append(f"{COLUNA_MES} BETWEEN {lower[1]} AND {upper[1]}")
+    else:
+        if lower:
+            predicates.append(f"{COLUNA_ANO} >= {lower[0]}")
+        if upper:
+            predicates.append(f"{COLUNA_ANO} <= {upper[0]}")
+    if only_month and not any(p.startswith(COLUNA_MES) for p in predicates):
+        predicates.append(f"{COLUNA_MES} = {only_month}")
+    if not predicates:
+        return sql
+
+    return tree.where(' AND '.join(predicates), append=True).sql(dialect='athena')
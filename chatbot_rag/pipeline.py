@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import (
+    QUERY_BACKEND, SQL_TEMPLATES_ENABLED,
+    PIPELINE_ATHENA_CONCURRENCY, PIPELINE_OPENAI_CONCURRENCY, PIPELINE_WORKER_THREADS, PIPELINE_STAGE_TIMEOUTS,
+)
+
+
+class StageTimeout(Exception):
+    """A pipeline stage took longer than its timeout and was cancelled."""
+
+
+class Orchestrator:
+    """
+    Runs the question pipeline on one asyncio loop in a background thread, shared by every
+    Streamlit session. Blocking calls (OpenAI, boto3 requests, DuckDB, local models) run in a
+    bounded pool of worker threads under per-stage timeouts; Athena queries are polled with
+    asyncio.sleep, so a slow query holds no thread. Global semaphores cap the concurrent
+    Athena queries and OpenAI calls across all sessions.
+    """
+
+    def __init__(self, athena_concurrency=PIPELINE_ATHENA_CONCURRENCY, openai_concurrency=PIPELINE_OPENAI_CONCURRENCY,
+                 worker_threads=PIPELINE_WORKER_THREADS, timeouts=None):
+        self.timeouts = {**PIPELINE_STAGE_TIMEOUTS, **(timeouts or {})}
+        self.limits = {'athena': asyncio.Semaphore(athena_concurrency), 'openai': asyncio.Semaphore(openai_concurrency)}
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=worker_threads, thread_name_prefix="pipeline"))
+        threading.Thread(target=self.loop.run_forever, name="pipeline-loop", daemon=True).start()
+
+    def submit(self, coroutine):
+        """Schedule `coroutine` on the pipeline loop; cancelling the returned Future cancels it."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def run(self, name, awaitable, stats, limit=None):
+        """
+        Await `awaitable` as stage `name`: after a slot of the `limit` semaphore ('athena' or
+        'openai') is free, and within the stage timeout. Queue and stage times go to `stats`.
+        """
+        start = time.perf_counter()
+        try:
+            async with self.limits[limit] if limit else contextlib.nullcontext():
+                stats[f'{name}_queue_ms'] = (time.perf_counter() - start) * 1000
+                return await asyncio.wait_for(awaitable, self.timeouts[name])
+        except asyncio.TimeoutError:
+            raise StageTimeout(f"Stage '{name}' exceeded its {self.timeouts[name]}s timeout.") from None
+        finally:
+            # Not started if cancelled while queued; close it to avoid the "never awaited" warning.
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            stats[f'{name}_ms'] = (time.perf_counter() - start) * 1000
+
+    async def stage(self, name, func, *args, stats, limit=None, **kwargs):
+        """Run the blocking `func(*args, **kwargs)` in a worker thread as stage `name`."""
+        return await self.run(name, asyncio.to_thread(func, *args, **kwargs), stats, limit)
+
+    def stream(self, name, make_tokens, stats, limit='openai'):
+        """
+        Iterate, from the caller's thread, the blocking token generator returned by
+        `make_tokens()` (e.g. a streamed completion), run as stage `name` on the pipeline.
+        Meant for st.write_stream: a timeout ends the tokens early and stores its message in
+        `stats['timed_out']` (never in the text, which callers may cache), and closing the
+        iterator (the script run was stopped by a new question) cancels the stage.
+        """
+        tokens = queue.Queue()
+        done = object()
+
+        async def produce():
+            iterator = await asyncio.to_thread(make_tokens)
+            while (token := await asyncio.to_thread(next, iterator, done)) is not done:
+                tokens.put(token)
+
+        async def staged():
+            try:
+                await self.run(name, produce(), stats, limit)
+            finally:
+                tokens.put(done)
+
+        future = self.submit(staged())
+        try:
+            while (token := tokens.get()) is not done:
+                yield token
+            future.result()
+        except StageTimeout as e:
+            stats['timed_out'] = str(e)
+        finally:
+            future.cancel()
+
+
+async def answer_question(orchestrator, question, resources, generate_sql, backend=QUERY_BACKEND,
+                          templates=SQL_TEMPLATES_ENABLED):
+    """
+    Route the question and, for SQL questions, produce the query and its result: query cache,
+    then template or LLM SQL checked by the SQL pre-flight (a rejected LLM query is generated
+    once more with the error), then rollup or the query backend. Returns a dict with 'tool',
+    'route_stage', 'cached', 'sql', 'sql_source', 'rollup_sql', 'df', 'summary' (stored with
+    a cached result), 'error', 'query_stats', 'rejected_sql'/'preflight_error' and the stage
+    times in 'stats'; fields of stages that did not run are missing.
+    Documents questions only get their 'tool': the caller streams the answer.
+    """
+    from query_backends import run_query_async, rollup_available
+    from rollups import rewrite_to_rollup
+    from sql_preflight import preflight
+    from sql_templates import question_to_sql
+
+    query_cache = resources['query_cache']
+    result = {'stats': {}, 'error': None}
+    stats = result['stats']
+
+    def route():
+        # Only SQL questions are cached, so a hit already answers the routing question.
+        cached = query_cache.lookup_question(question) if query_cache else None
+        route_stats = {'stage': 'cache'}
+        tool = "SQL" if cached else resources['question_router'].route(question, stats=route_stats)
+        return cached, tool, route_stats['stage']
+
+    try:
+        result['cached'], result['tool'], result['route_stage'] = await orchestrator.stage('route', route, stats=stats)
+        if result['tool'] != "SQL":
+            return result
+
+        cached = result['cached']
+        if cached:
+            sql, source = cached['sql'], "cache"
+        else:
+            # Common aggregate shapes compile deterministically; GPT-4 only handles the rest.
+            sql, source = (question_to_sql(question) if templates else None), "template"
+            if not sql:
+                sql = await orchestrator.stage('sql', generate_sql, question, stats=stats, limit='openai')
+                source = "LLM"
+        result['sql'], result['sql_source'] = sql, source
+        if not sql:
+            result['error'] = "Could not generate an SQL query for the question."
+            return result
+
+        start = time.perf_counter()
+        checked, error = preflight(sql)
+        stats['preflight_us'] = (time.perf_counter() - start) * 1e6
+        if error and source == "LLM":
+            print(f"⚠️ Generated SQL rejected before execution: {error}")
+            result['rejected_sql'], result['preflight_error'] = sql, error
+            sql = await orchestrator.stage('sql_retry', generate_sql, question, sql, error, stats=stats, limit='openai')
+            checked, error = preflight(sql) if sql else (None, "Could not generate an SQL query for the question.")
+            result['sql'] = sql
+        if error:
+            result['error'] = error
+            return result
+        sql = result['sql'] = checked
+
+        query_stats = result['query_stats'] = {}
+        df = await asyncio.to_thread(query_cache.get_result, sql) if query_cache else None
+        if df is not None:
+            query_stats['backend'] = 'cache'
+            result['df'] = df
+            result['summary'] = await asyncio.to_thread(query_cache.get_summary, question, sql)
+            return result
+
+        # Dashboard-style aggregates are answered from the pre-aggregated rollup.
+        rollup_sql = result['rollup_sql'] = rewrite_to_rollup(sql) if rollup_available(backend) else None
+
+        async def query():
+            error = None
+            if rollup_sql:
+                df, error = await run_query_async(rollup_sql, backend, stats=query_stats,
+                                                  athena_limit=orchestrator.limits['athena'])
+            if not rollup_sql or error:
+                df, error = await run_query_async(sql, backend, stats=query_stats,
+                                                  athena_limit=orchestrator.limits['athena'])
+            return df, error
+
+        result['df'], result['error'] = await orchestrator.run('query', query(), stats)
+        if query_cache and not result['error']:
+            await asyncio.to_thread(query_cache.put_result, sql, result['df'])
+    except StageTimeout as e:
+        result['error'] = str(e)
+    return result
@@ -1,10 +1,22 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import boto3
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 
 
 # --- SETTINGS ---
 
 # 1. Local input file
-arquivo_gz_local = 'train.gz' 
+arquivo_gz_local = 'train.gz'
 
 # 2. ORIGINAL columns to select from the file
 colunas_desejadas = [
@@ -17,6 +29,20 @@ colunas_desejadas = [
     'VAR8'
 ]
 
+# Types used when reading the CSV, so pandas doesn't have to infer them chunk by chunk
+tipos_leitura = {
+    'REF_DATE': 'string',
+    'TARGET': 'Int64',
+    'VAR2': 'string',
+    'IDADE': 'float64',
+    'VAR4': 'string',
+    'VAR5': 'string',
+    'VAR8': 'string',
+}
+
+# Rows per chunk: peak memory depends on this, not on the size of the input file
+linhas_por_chunk = 250_000
+
 # 3. Mapping for renaming columns (From: To)
 mapa_renomear_colunas = {
     'REF_DATE': 'data_referencia',
@@ -28,47 +54,427 @@ mapa_renomear_colunas = {
     'VAR8': 'classe_social'
 }
 
+# 4. Parquet output: Hive-style partitions by year/month of data_referencia (and optionally uf)
+diretorio_saida = 'dataset'
+arquivo_manifesto = '_manifest.json'
+colunas_particao = ['ano_referencia', 'mes_referencia']
+colunas_categoricas = ['sexo', 'flag_obito', 'uf', 'classe_social']
+linhas_por_row_group = 128 * 1024
+
+# 5. Destination in S3 / Glue
+NOME_DO_BUCKET = "chatbot-analise-dados"
+PREFIXO_S3 = "dados_credito/"
+# Same values as settings.py, which is not imported here: it requires config.json with an
+# OpenAI key, and the ingestion has to run offline.
+AWS_REGION = "sa-east-1"
+GLUE_DATABASE = "chatbot_db"
+GLUE_TABLE = "dataset"
+
+# Glue types of the columns
+tipos_glue = {
+    'data_referencia': 'timestamp',
+    'inadimplente': 'bigint',
+    'sexo': 'string',
+    'idade': 'double',
+    'flag_obito': 'string',
+    'uf': 'string',
+    'classe_social': 'string',
+}
+tipos_glue_particao = {
+    'ano_referencia': 'int',
+    'mes_referencia': 'int',
+    'uf': 'string',
+}
+
+# Arrow schema of the output, fixed so every chunk is written with the same types
+esquema_parquet = pa.schema([
+    ('data_referencia', pa.timestamp('ns', tz='UTC')),
+    ('inadimplente', pa.int64()),
+    ('sexo', pa.string()),
+    ('idade', pa.float64()),
+    ('flag_obito', pa.string()),
+    ('uf', pa.string()),
+    ('classe_social', pa.string()),
+    ('ano_referencia', pa.int32()),
+    ('mes_referencia', pa.int32()),
+])
 
-def preparar_e_enviar():
+
+def limpar_dados(df):
     """
-    Reads the GZ file, selects, renames, cleans, converts, and prepares for upload to S3.
+    Selects, renames and cleans the raw columns, and adds the partition columns.
     """
-    print(f"📖 Reading local file: {arquivo_gz_local}...")
-    try:
-        df = pd.read_csv(arquivo_gz_local, compression='gzip', sep=',')
-        print("✅ File successfully read.")
-    except FileNotFoundError:
-        print(f"❌ ERROR: File '{arquivo_gz_local}' not found. Please check the path.")
-        return
-
     # Step 1: Select only the columns defined as important
-    print(f"🔪 Selecting original columns: {colunas_desejadas}...")
     # Ensure that all desired columns exist before selecting
     colunas_existentes = [col for col in colunas_desejadas if col in df.columns]
     df = df[colunas_existentes]
 
     # Step 2: Rename columns to more friendly names
-    print("✨ Renaming columns...")
-    df.rename(columns=mapa_renomear_colunas, inplace=True)
-    print("New column names:", list(df.columns))
+    df = df.rename(columns=mapa_renomear_colunas)
+    # Columns missing from this input are written as nulls, so every file shares the schema
+    for coluna in mapa_renomear_colunas.values():
+        if coluna not in df.columns:
+            df[coluna] = None
 
     # Step 3: Cleaning and transformation on the already renamed column
-    print("🔄 Converting 'data_referencia' to datetime format...")
-    # Use the new column name 'data_referencia'
-    df['data_referencia'] = pd.to_datetime(df['data_referencia'], errors='coerce')
-    
+    df['data_referencia'] = pd.to_datetime(df['data_referencia'], errors='coerce', utc=True)
     # Drop rows where date conversion failed
-    df.dropna(subset=['data_referencia'], inplace=True)
-    print("✅ Data cleaned and transformed.")
-    
-    # Step 4: Convert the cleaned DataFrame to Parquet format
-    arquivo_parquet_local = 'temp_dataset.parquet'
-    print(f"📄 Converting to Parquet: '{arquivo_parquet_local}'...")
-    df.to_parquet(arquivo_parquet_local, index=False)
-    
-    print("✅ Conversion completed.")
+    df = df.dropna(subset=['data_referencia'])
+
+    # Step 4: Partition columns derived from the reference date
+    df['ano_referencia'] = df['data_referencia'].dt.year.astype('int32')
+    df['mes_referencia'] = df['data_referencia'].dt.month.astype('int32')
+    return df
+
+
+def ler_csv_em_chunks(arquivo, tamanho_chunk=linhas_por_chunk, stats=None):
+    """
+    Reads only the desired columns of the GZ file, with explicit types, in chunks of
+    `tamanho_chunk` rows, and yields each chunk already renamed and cleaned.
+    Fills `stats` with the rows read and kept.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(linhas_lidas=0, linhas_gravadas=0)
+    # usecols fails on a missing column, so only the desired columns present in the header are read
+    cabecalho = pd.read_csv(arquivo, compression='gzip', sep=',', nrows=0).columns
+    colunas_existentes = [col for col in colunas_desejadas if col in cabecalho]
+    ausentes = [col for col in colunas_desejadas if col not in cabecalho]
+    if ausentes:
+        print(f"⚠️ {arquivo}: columns {ausentes} not found, written as nulls.")
+    leitor = pd.read_csv(
+        arquivo,
+        compression='gzip',
+        sep=',',
+        usecols=colunas_existentes,
+        dtype={col: tipos_leitura[col] for col in colunas_existentes},
+        chunksize=tamanho_chunk,
+    )
+    with leitor:
+        for chunk in leitor:
+            stats['linhas_lidas'] += len(chunk)
+            chunk = limpar_dados(chunk)
+            stats['linhas_gravadas'] += len(chunk)
+            yield chunk
+
+
+def escrever_parquet_particionado(lotes, diretorio, particoes, nome_base='part-{i}.parquet'):
+    """
+    Writes an iterable of DataFrames as Hive-partitioned Parquet: ZSTD, dictionary-encoded
+    categorical columns, and each batch sorted so row groups have tight min/max statistics.
+    Batches are appended to the open partition files as they arrive, so only the row groups
+    being filled are kept in memory. Returns the paths of the files written.
+    """
+    ordenacao = particoes + [col for col in ['uf', 'data_referencia'] if col not in particoes]
+
+    def lotes_arrow():
+        for df in lotes:
+            tabela = pa.Table.from_pandas(df.sort_values(ordenacao), schema=esquema_parquet,
+                                          preserve_index=False)
+            yield from tabela.to_batches()
+
+    escritos = []
+    formato = ds.ParquetFileFormat()
+    opcoes = formato.make_write_options(
+        compression='zstd',
+        use_dictionary=colunas_categoricas,
+        coerce_timestamps='ms',
+        allow_truncated_timestamps=True,
+    )
+    ds.write_dataset(
+        lotes_arrow(),
+        diretorio,
+        schema=esquema_parquet,
+        format=formato,
+        file_options=opcoes,
+        partitioning=ds.partitioning(esquema_parquet.empty_table().select(particoes).schema,
+                                     flavor='hive'),
+        basename_template=nome_base,
+        max_rows_per_group=linhas_por_row_group,
+        min_rows_per_group=linhas_por_row_group,
+        existing_data_behavior='overwrite_or_ignore',
+        file_visitor=lambda arquivo: escritos.append(os.path.relpath(arquivo.path, diretorio)),
+    )
+    return escritos
+
+
+def listar_entradas(entradas):
+    """
+    Expands directories (every *.gz inside) and glob patterns into a sorted list of files.
+    """
+    arquivos = set()
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            arquivos.update(glob.glob(os.path.join(entrada, '*.gz')))
+        else:
+            arquivos.update(caminho for caminho in glob.glob(entrada) if os.path.isfile(caminho))
+    return sorted(arquivos)
+
+
+def nome_base_para(arquivo):
+    """
+    File name template for one input, unique per source path, so parallel workers writing
+    into the same partitions never overwrite each other's files.
+    """
+    nome = os.path.basename(arquivo).split('.')[0]
+    sufixo = hashlib.sha1(os.path.abspath(arquivo).encode()).hexdigest()[:8]
+    return f"{nome}-{sufixo}-{{i}}.parquet"
+
+
+def processar_arquivo(arquivo, diretorio, particoes):
+    """
+    Worker: streams one GZ file into the partitioned dataset and returns its manifest entry.
+    """
+    stats = {}
+    inicio = time.perf_counter()
+    escritos = escrever_parquet_particionado(ler_csv_em_chunks(arquivo, stats=stats), diretorio,
+                                             particoes, nome_base=nome_base_para(arquivo))
+    return {
+        'arquivo': os.path.abspath(arquivo),
+        'linhas_lidas': stats['linhas_lidas'],
+        'linhas_gravadas': stats['linhas_gravadas'],
+        'segundos': round(time.perf_counter() - inicio, 3),
+        'parquet': sorted(escritos),
+    }
+
+
+def processar_em_paralelo(arquivos, diretorio, particoes, processos=None):
+    """
+    Processes the files in a process pool, one worker per file (up to `processos`),
+    all writing into the same partitioned dataset. Returns the manifest entries.
+    """
+    processos = min(processos or os.cpu_count() or 1, len(arquivos))
+    entradas = []
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        futuros = {executor.submit(processar_arquivo, arquivo, diretorio, particoes): arquivo
+                   for arquivo in arquivos}
+        for futuro in as_completed(futuros):
+            entrada = futuro.result()
+            print(f"   ✔ {futuros[futuro]}: {entrada['linhas_gravadas']} rows in {entrada['segundos']:.1f}s")
+            entradas.append(entrada)
+    return sorted(entradas, key=lambda entrada: entrada['arquivo'])
+
+
+def carregar_manifesto(diretorio):
+    """
+    Reads the manifest of a previous run, or returns None if there is none.
+    """
+    caminho = os.path.join(diretorio, arquivo_manifesto)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho) as f:
+        return json.load(f)
+
+
+def salvar_manifesto(diretorio, manifesto):
+    """
+    Records which source files produced the dataset: content hash, mtime and size of each,
+    the rows it produced and its Parquet files.
+    """
+    with open(os.path.join(diretorio, arquivo_manifesto), 'w') as f:
+        json.dump(manifesto, f, indent=2)
+
+
+def assinatura_arquivo(arquivo, anterior=None):
+    """
+    Size, mtime and SHA-256 of a source file. The hash is reused from the previous manifest
+    entry when size and mtime didn't change, so unchanged files are not read again.
+    """
+    info = os.stat(arquivo)
+    assinatura = {'tamanho': info.st_size, 'mtime': info.st_mtime}
+    if anterior and (anterior.get('tamanho'), anterior.get('mtime')) == (info.st_size, info.st_mtime):
+        assinatura['sha256'] = anterior['sha256']
+        return assinatura
+    sha256 = hashlib.sha256()
+    with open(arquivo, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(bloco)
+    assinatura['sha256'] = sha256.hexdigest()
+    return assinatura
+
+
+def particoes_dos_arquivos(caminhos):
+    """
+    Partition directories ('ano_referencia=2017/mes_referencia=6') of Parquet paths.
+    """
+    return {os.path.dirname(caminho).replace(os.sep, '/') for caminho in caminhos}
+
+
+def gerar_ddl_glue(particoes, tabela=GLUE_TABLE, bucket=NOME_DO_BUCKET, prefixo=PREFIXO_S3):
+    """
+    Generates the Athena DDL that matches the partitioned layout written by this script.
+    """
+    colunas = [f"    {col} {tipo}" for col, tipo in tipos_glue.items() if col not in particoes]
+    colunas_part = [f"    {col} {tipos_glue_particao[col]}" for col in particoes]
+    return (
+        f"CREATE EXTERNAL TABLE IF NOT EXISTS {tabela} (\n" + ",\n".join(colunas) + "\n)\n"
+        "PARTITIONED BY (\n" + ",\n".join(colunas_part) + "\n)\n"
+        "STORED AS PARQUET\n"
+        f"LOCATION 's3://{bucket}/{prefixo}'\n"
+        f"TBLPROPERTIES ('parquet.compression'='ZSTD')"
+    )
+
+
+def enviar_para_s3(diretorio, arquivos=None, remover=(), bucket=NOME_DO_BUCKET, prefixo=PREFIXO_S3):
+    """
+    Uploads the Parquet files of the partitioned directory, keeping the partition paths.
+    `arquivos` limits the upload to those relative paths (default: every Parquet file) and
+    `remover` deletes objects of outputs that were replaced.
+    """
+    s3_client = boto3.client('s3', region_name=AWS_REGION)
+    if arquivos is None:
+        arquivos = [os.path.relpath(os.path.join(raiz, arquivo), diretorio)
+                    for raiz, _, nomes in os.walk(diretorio) for arquivo in nomes if arquivo.endswith('.parquet')]
+    for caminho in remover:
+        s3_client.delete_object(Bucket=bucket, Key=prefixo + caminho.replace(os.sep, '/'))
+    for caminho in arquivos:
+        s3_client.upload_file(os.path.join(diretorio, caminho), bucket, prefixo + caminho.replace(os.sep, '/'))
+    print(f"☁️ {len(arquivos)} file(s) uploaded to s3://{bucket}/{prefixo}")
+
+
+def registrar_tabela_glue(particoes):
+    """
+    Recreates the Glue table with the partitioned layout and loads its partitions.
+    """
+    from athena_query import execute_athena_query
+
+    for consulta in [f"DROP TABLE IF EXISTS {GLUE_TABLE}", gerar_ddl_glue(particoes),
+                     f"MSCK REPAIR TABLE {GLUE_TABLE}"]:
+        _, error = execute_athena_query(consulta)
+        if error:
+            print(f"❌ ERROR while updating '{GLUE_DATABASE}.{GLUE_TABLE}': {error}")
+            return
+    print(f"📚 Glue table '{GLUE_DATABASE}.{GLUE_TABLE}' updated.")
+
+
+def gerar_ddl_particoes(novas, tabela=GLUE_TABLE, bucket=NOME_DO_BUCKET, prefixo=PREFIXO_S3):
+    """
+    ALTER TABLE ... ADD PARTITION for the given partition directories.
+    """
+    clausulas = []
+    for particao in sorted(novas):
+        valores = []
+        for par in particao.split('/'):
+            coluna, valor = par.split('=', 1)
+            valores.append(f"{coluna} = {valor}" if tipos_glue_particao[coluna] == 'int' else f"{coluna} = '{valor}'")
+        clausulas.append(f"  PARTITION ({', '.join(valores)}) LOCATION 's3://{bucket}/{prefixo}{particao}/'")
+    return f"ALTER TABLE {tabela} ADD IF NOT EXISTS\n" + "\n".join(clausulas)
+
+
+def registrar_particoes_glue(novas):
+    """
+    Tells Glue about the new partitions only, instead of recreating the table.
+    """
+    from athena_query import execute_athena_query
+
+    if not novas:
+        print("📚 No new partitions to register.")
+        return
+    _, error = execute_athena_query(gerar_ddl_particoes(novas))
+    if error:
+        print(f"❌ ERROR while adding partitions to '{GLUE_DATABASE}.{GLUE_TABLE}': {error}")
+        return
+    print(f"📚 {len(novas)} partition(s) added to '{GLUE_DATABASE}.{GLUE_TABLE}'.")
+
+
+def preparar_e_enviar(entradas=(arquivo_gz_local,), particionar_por_uf=False, enviar=False, processos=None,
+                      completo=False):
+    """
+    Reads the GZ files, selects, renames, cleans, converts, and prepares for upload to S3.
+    Only inputs that are new or changed since the last run (per the manifest) are processed,
+    unless `completo` asks for a full rebuild.
+    """
+    arquivos = listar_entradas(entradas)
+    if not arquivos:
+        print(f"❌ ERROR: No input file found in {list(entradas)}. Please check the path.")
+        return
+
+    particoes = colunas_particao + (['uf'] if particionar_por_uf else [])
+    manifesto = carregar_manifesto(diretorio_saida)
+    if completo or manifesto is None or manifesto['particoes'] != particoes:
+        print(f"🧹 Full rebuild of '{diretorio_saida}/'.")
+        # Drop the previous output so old layouts don't mix with the new one
+        shutil.rmtree(diretorio_saida, ignore_errors=True)
+        manifesto, completo = {'particoes': particoes, 'arquivos': {}}, True
+
+    pendentes, substituidos = {}, []
+    for arquivo in arquivos:
+        anterior = manifesto['arquivos'].get(os.path.abspath(arquivo))
+        assinatura = assinatura_arquivo(arquivo, anterior)
+        if anterior and anterior['sha256'] == assinatura['sha256']:
+            anterior.update(assinatura)
+            continue
+        if anterior:
+            # Changed since the last run: its previous output is replaced.
+            for caminho in anterior['parquet']:
+                if os.path.exists(os.path.join(diretorio_saida, caminho)):
+                    os.remove(os.path.join(diretorio_saida, caminho))
+            substituidos.extend(anterior['parquet'])
+        pendentes[os.path.abspath(arquivo)] = assinatura
+    print(f"🔎 {len(pendentes)} new or changed file(s), {len(arquivos) - len(pendentes)} unchanged.")
+    if not pendentes:
+        salvar_manifesto(diretorio_saida, manifesto)
+        return
+
+    # Partitions that already hold data from inputs left untouched by this run
+    existentes = particoes_dos_arquivos(caminho for arquivo, entrada in manifesto['arquivos'].items()
+                                        if arquivo not in pendentes for caminho in entrada['parquet'])
+    print(f"📖 Streaming {len(pendentes)} file(s) in chunks of {linhas_por_chunk} rows, columns: {colunas_desejadas}...")
+    print(f"📄 Writing partitioned Parquet to '{diretorio_saida}/' by {particoes}...")
+    inicio = time.perf_counter()
+    if len(pendentes) == 1:
+        entradas_manifesto = [processar_arquivo(next(iter(pendentes)), diretorio_saida, particoes)]
+    else:
+        entradas_manifesto = processar_em_paralelo(list(pendentes), diretorio_saida, particoes, processos)
+    duracao = time.perf_counter() - inicio
+    linhas_lidas = sum(entrada['linhas_lidas'] for entrada in entradas_manifesto)
+    linhas_gravadas = sum(entrada['linhas_gravadas'] for entrada in entradas_manifesto)
+    print(f"✅ Conversion completed: {linhas_lidas} rows read, {linhas_gravadas} written "
+          f"in {duracao:.1f}s ({linhas_lidas / duracao:,.0f} rows/s).")
+
+    escritos = []
+    for entrada in entradas_manifesto:
+        arquivo = entrada.pop('arquivo')
+        manifesto['arquivos'][arquivo] = {**pendentes[arquivo], **entrada}
+        escritos.extend(entrada['parquet'])
+    salvar_manifesto(diretorio_saida, manifesto)
+    print(f"🗂️ Manifest of processed files saved to '{diretorio_saida}/{arquivo_manifesto}'.")
+    novas = particoes_dos_arquivos(escritos) - existentes
+    print(f"🧩 {len(novas)} new partition(s).")
+
+    ddl = gerar_ddl_glue(particoes)
+    with open(os.path.join(diretorio_saida, '_glue_table.sql'), 'w') as f:
+        f.write(ddl + ";\n")
+    print(f"📝 Glue DDL saved to '{diretorio_saida}/_glue_table.sql'.")
+
+    if enviar:
+        if completo:
+            enviar_para_s3(diretorio_saida)
+            registrar_tabela_glue(particoes)
+        else:
+            enviar_para_s3(diretorio_saida, arquivos=escritos, remover=substituidos)
+            registrar_particoes_glue(novas)
+
+    # Aggregate questions are rewritten to the rollup, so it has to follow the new data.
+    try:
+        from rollups import construir_rollup
+        from settings import ROLLUP_ATHENA_ENABLED
+    except (FileNotFoundError, ValueError) as e:
+        print(f"⚠️ Rollup not rebuilt ({e}); run `python rollups.py` once config.json is in place.")
+        return
+    construir_rollup(enviar_para_s3=enviar and ROLLUP_ATHENA_ENABLED)
 
 
 # --- EXECUTION ---
 if __name__ == "__main__":
-    preparar_e_enviar()
+    parser = argparse.ArgumentParser(description="Prepares the credit dataset as partitioned Parquet.")
+    parser.add_argument('entradas', nargs='*', default=[arquivo_gz_local],
+                        help="GZ files, directories or glob patterns (default: train.gz)")
+    parser.add_argument('--processos', type=int, default=None,
+                        help="worker processes, one file each (default: number of cores)")
+    parser.add_argument('--particionar-uf', action='store_true', help="also partition by uf")
+    parser.add_argument('--completo', action='store_true',
+                        help="rebuild everything instead of processing only new or changed files")
+    parser.add_argument('--s3', action='store_true', help="upload to S3 and update the Glue table")
+    args = parser.parse_args()
+    preparar_e_enviar(args.entradas, particionar_por_uf=args.particionar_uf, enviar=args.s3,
+                      processos=args.processos, completo=args.completo)
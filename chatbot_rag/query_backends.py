@@ -0,0 +1,158 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from functools import lru_cache
+
+import duckdb
+import sqlglot
+
+from athena_query import execute_athena_query, execute_athena_query_async
+from partition_pruning import COLUNA_ANO, COLUNA_MES, add_partition_predicates
+from settings import (
+    GLUE_TABLE, QUERY_BACKEND, ATHENA_FALLBACK, DATASET_PATH, DATASET_SAMPLE_PATH,
+    ROLLUP_TABLE, ROLLUP_PATH, ROLLUP_ATHENA_ENABLED, DATASET_PARTITIONED,
+)
+
+
+def _parquet_source(path):
+    """Build the DuckDB table function that reads a Parquet file or a partitioned directory."""
+    if os.path.isdir(path):
+        pattern = os.path.join(path, '**', '*.parquet')
+        return f"read_parquet('{_quote(pattern)}', hive_partitioning = true)"
+    return f"read_parquet('{_quote(path)}')"
+
+
+def _quote(value):
+    return value.replace("'", "''")
+
+
+def resolve_dataset_path(path=DATASET_PATH):
+    """`path`, or the sample shipped with the repo while pre_data.py hasn't written the dataset yet."""
+    if not os.path.exists(path) and path == DATASET_PATH and os.path.exists(DATASET_SAMPLE_PATH):
+        return DATASET_SAMPLE_PATH
+    return path
+
+
+def get_duckdb_connection(path=DATASET_PATH):
+    """
+    Open an in-process DuckDB database with the local Parquet registered as the
+    same table name used in Glue, so SQL written for Athena runs unchanged.
+    """
+    con = _open_dataset(resolve_dataset_path(path))
+    _register_rollup(con)
+    return con
+
+
+@lru_cache(maxsize=None)
+def _open_dataset(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Local dataset '{path}' not found. Run pre_data.py first.")
+    con = duckdb.connect(database=':memory:')
+    con.execute("SET TimeZone = 'UTC'")
+    source = _parquet_source(path)
+    # A single unpartitioned file (the sample) gets the partition columns derived from the
+    # date, so the partition predicates added by run_query also hold on it.
+    columns = {row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()}
+    derived = '' if COLUNA_ANO in columns else (
+        f', year(CAST(data_referencia AS TIMESTAMP)) AS {COLUNA_ANO}'
+        f', month(CAST(data_referencia AS TIMESTAMP)) AS {COLUNA_MES}'
+    )
+    # pandas writes data_referencia as a UTC timestamp; expose it as the plain
+    # `timestamp` declared in Glue so TIMESTAMP literals compare without casts.
+    con.execute(
+        f'CREATE VIEW "{GLUE_TABLE}" AS SELECT * REPLACE (CAST(data_referencia AS TIMESTAMP) AS data_referencia)'
+        f'{derived} FROM {source}'
+    )
+    return con
+
+
+_rollup_lock = threading.Lock()
+_rollup_registered = set()
+
+
+def _register_rollup(con):
+    """
+    Register the rollup view on first use after the rollup file exists, so a rollup built
+    after startup is queried too. The view reads the file on every query, so a rebuilt
+    rollup needs no new registration.
+    """
+    if id(con) in _rollup_registered or not os.path.exists(ROLLUP_PATH):
+        return
+    with _rollup_lock:
+        if id(con) not in _rollup_registered:
+            con.execute(f'CREATE OR REPLACE VIEW "{ROLLUP_TABLE}" AS SELECT * FROM {_parquet_source(ROLLUP_PATH)}')
+            _rollup_registered.add(id(con))
+
+
+def rollup_available(backend=QUERY_BACKEND):
+    """Whether the rollup built by rollups.py can be queried on the given backend."""
+    if backend == 'athena':
+        return ROLLUP_ATHENA_ENABLED
+    return os.path.exists(ROLLUP_PATH)
+
+
+def to_duckdb_sql(query):
+    """Translate Athena (Trino) SQL into the DuckDB dialect."""
+    return sqlglot.transpile(query, read='athena', write='duckdb')[0]
+
+
+def execute_duckdb_query(query, stats=None, path=DATASET_PATH):
+    """
+    Execute a query on the local Parquet dataset and return a tuple (DataFrame, Error).
+    """
+    stats = {} if stats is None else stats
+    stats['backend'] = 'duckdb'
+    start = time.perf_counter()
+    try:
+        # A cursor is an independent connection to the same database, safe to use
+        # from the thread Streamlit runs the current session on.
+        cursor = get_duckdb_connection(path).cursor()
+        try:
+            return cursor.execute(to_duckdb_sql(query)).df(), None
+        finally:
+            cursor.close()
+    except Exception as e:
+        return None, f"An error occurred while running the query locally: {e}"
+    finally:
+        stats['total_ms'] = (time.perf_counter() - start) * 1000
+
+
+QUERY_BACKENDS = {
+    'duckdb': execute_duckdb_query,
+    'athena': execute_athena_query,
+}
+
+
+async def run_query_async(query, backend=QUERY_BACKEND, fallback=ATHENA_FALLBACK, stats=None, athena_limit=None):
+    """
+    Execute a query on the configured backend and return a tuple (DataFrame, Error).
+    When the local backend fails and the fallback is enabled, the query is retried on Athena.
+    `stats`, when given, receives the latency breakdown of the backend that answered.
+    DuckDB runs in a worker thread; Athena queries are polled without holding a thread and,
+    when `athena_limit` (an asyncio.Semaphore) is given, wait for a free slot first.
+    """
+    if backend not in QUERY_BACKENDS:
+        return None, f"Unknown query backend '{backend}'. Use one of: {', '.join(QUERY_BACKENDS)}."
+    if DATASET_PARTITIONED:
+        query = add_partition_predicates(query)
+
+    async def on_athena():
+        async with athena_limit or contextlib.nullcontext():
+            return await execute_athena_query_async(query, stats=stats)
+
+    if backend == 'athena':
+        return await on_athena()
+    df, error = await asyncio.to_thread(QUERY_BACKENDS[backend], query, stats=stats)
+    if error and fallback:
+        print(f"⚠️ {error} Falling back to Athena.")
+        if stats is not None:
+            stats.clear()
+        return await on_athena()
+    return df, error
+
+
+def run_query(query, backend=QUERY_BACKEND, fallback=ATHENA_FALLBACK, stats=None):
+    """Blocking run_query_async, for callers outside the asyncio pipeline."""
+    return asyncio.run(run_query_async(query, backend, fallback, stats))
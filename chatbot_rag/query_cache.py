@@ -0,0 +1,257 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import sqlglot
+
+from settings import (
+    QUERY_CACHE_DIR, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_MAX_BYTES,
+    QUERY_CACHE_MAX_QUESTIONS, QUERY_CACHE_SIMILARITY,
+)
+
+
+def normalize_question(question):
+    """Lowercase, strip accents and punctuation, and collapse whitespace."""
+    text = unicodedata.normalize('NFKD', question.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def normalize_sql(sql):
+    """Canonical SQL text: sqlglot re-renders it, so spacing and keyword case don't matter."""
+    try:
+        return sqlglot.transpile(sql, read='athena', write='athena')[0]
+    except sqlglot.errors.SqlglotError:
+        return ' '.join(sql.replace(';', ' ').split())
+
+
+def question_literals(question):
+    """
+    Values a question filters on (numbers, UFs, months, sexo, classe, adimplentes or
+    inadimplentes), as a canonical string. Two questions only share SQL when these match:
+    "taxa em MG" and "taxa em SP" embed almost identically but need different queries.
+    """
+    from sql_templates import MESES, NOMES_UF, UFS
+
+    text = ' ' + normalize_question(question) + ' '
+    literals = {token for token in re.findall(r'\b[A-Z]{2}\b', question) if token in UFS}
+    for nome in sorted(NOMES_UF, key=len, reverse=True):
+        if f' {nome} ' in text:
+            literals.add(NOMES_UF[nome])
+            text = text.replace(f' {nome} ', ' ')
+    literals.update(re.findall(r'\d+', text))
+    literals.update(f'mes:{numero}' for nome, numero in MESES.items() if f' {nome} ' in text)
+    if re.search(r' (?:mulheres|feminino|feminina) ', text):
+        literals.add('sexo:F')
+    if re.search(r' (?:homens|masculino|masculina) ', text):
+        literals.add('sexo:M')
+    literals.update(f'classe:{letra}' for letra in re.findall(r' classe(?: social)? ([a-e])(?= )', text))
+    literals.update(re.findall(r' ((?:in)?adimplentes?)(?= )', text))
+    return '|'.join(sorted(literals))
+
+
+def _sql_key(sql):
+    return hashlib.sha256(normalize_sql(sql).encode('utf-8')).hexdigest()
+
+
+class QueryCache:
+    """
+    Persistent three-level cache for the SQL flow:
+      1. normalized question -> generated SQL,
+      2. nearest-neighbour question (embedding similarity, same literals) -> generated SQL,
+      3. normalized SQL -> result DataFrame, stored as Parquet, with the summaries written
+         for it (dropped together with the result they describe).
+    Entries expire after a TTL; results are evicted least-recently-used once the
+    Parquet files exceed the size budget.
+    """
+
+    def __init__(self, embeddings=None, directory=QUERY_CACHE_DIR, ttl=QUERY_CACHE_TTL_SECONDS,
+                 max_bytes=QUERY_CACHE_MAX_BYTES, max_questions=QUERY_CACHE_MAX_QUESTIONS,
+                 similarity=QUERY_CACHE_SIMILARITY):
+        self.embeddings = embeddings
+        self.directory = directory
+        self.results_dir = os.path.join(directory, 'results')
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_questions = max_questions
+        self.similarity = similarity
+        self.stats = {level: {'hits': 0, 'misses': 0} for level in ('question', 'semantic', 'result')}
+        self._lock = threading.Lock()
+
+        os.makedirs(self.results_dir, exist_ok=True)
+        with self._connect() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS questions (
+                    normalized TEXT PRIMARY KEY, sql TEXT NOT NULL, embedding BLOB,
+                    literals TEXT, created_at REAL NOT NULL, last_access REAL NOT NULL)
+            """)
+            # Indexes written before literals were stored: their rows never match semantically.
+            if 'literals' not in {row[1] for row in con.execute("PRAGMA table_info(questions)")}:
+                con.execute("ALTER TABLE questions ADD COLUMN literals TEXT")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    sql_key TEXT PRIMARY KEY, sql TEXT NOT NULL, size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL, last_access REAL NOT NULL)
+            """)
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    sql_key TEXT NOT NULL, normalized TEXT NOT NULL, summary TEXT NOT NULL,
+                    PRIMARY KEY (sql_key, normalized))
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the cache safe to share between
+        # the threads Streamlit runs sessions on.
+        con = sqlite3.connect(os.path.join(self.directory, 'index.sqlite3'), timeout=10)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def _count(self, level, hit):
+        with self._lock:
+            self.stats[level]['hits' if hit else 'misses'] += 1
+
+    def _result_path(self, key):
+        return os.path.join(self.results_dir, f"{key}.parquet")
+
+    # --- Levels 1 and 2: question -> SQL ---
+
+    def lookup_question(self, question):
+        """
+        Return {'sql', 'level'} for a cached question, or None. A semantic match must
+        also filter on the same literals (see question_literals).
+        """
+        now = time.time()
+        normalized = normalize_question(question)
+        with self._connect() as con:
+            row = con.execute(
+                "SELECT sql FROM questions WHERE normalized = ? AND created_at > ?",
+                (normalized, now - self.ttl),
+            ).fetchone()
+            if row:
+                con.execute("UPDATE questions SET last_access = ? WHERE normalized = ?", (now, normalized))
+                self._count('question', True)
+                return {'sql': row[0], 'level': 'question'}
+        self._count('question', False)
+
+        if self.embeddings is None:
+            return None
+        match = self._nearest_question(question, now)
+        self._count('semantic', match is not None)
+        return match
+
+    def _nearest_question(self, question, now):
+        with self._connect() as con:
+            rows = con.execute(
+                "SELECT normalized, sql, embedding FROM questions "
+                "WHERE created_at > ? AND embedding IS NOT NULL AND literals = ?",
+                (now - self.ttl, question_literals(question)),
+            ).fetchall()
+        if not rows:
+            return None
+        matrix = np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        with self._connect() as con:
+            con.execute("UPDATE questions SET last_access = ? WHERE normalized = ?", (now, rows[best][0]))
+        return {'sql': rows[best][1], 'level': 'semantic', 'score': float(scores[best])}
+
+    def put_question(self, question, sql):
+        """
+        Store the SQL generated for a question. Rewriting the same SQL keeps the original
+        created_at, so entries still expire after the TTL.
+        """
+        now = time.time()
+        embedding = None
+        if self.embeddings is not None:
+            embedding = np.asarray(self.embeddings.embed_query(question), dtype=np.float32).tobytes()
+        with self._connect() as con:
+            con.execute("DELETE FROM questions WHERE created_at <= ?", (now - self.ttl,))
+            con.execute("""
+                INSERT INTO questions (normalized, sql, embedding, literals, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (normalized) DO UPDATE SET
+                    created_at = CASE WHEN sql = excluded.sql THEN created_at ELSE excluded.created_at END,
+                    sql = excluded.sql, embedding = excluded.embedding, literals = excluded.literals,
+                    last_access = excluded.last_access
+            """, (normalize_question(question), sql, embedding, question_literals(question), now, now))
+            con.execute("""
+                DELETE FROM questions WHERE normalized NOT IN (
+                    SELECT normalized FROM questions ORDER BY last_access DESC LIMIT ?)
+            """, (self.max_questions,))
+
+    # --- Level 3: SQL -> result ---
+
+    def get_result(self, sql):
+        """Return the cached DataFrame for an equivalent SQL text, or None."""
+        now = time.time()
+        key = _sql_key(sql)
+        with self._connect() as con:
+            row = con.execute(
+                "SELECT 1 FROM results WHERE sql_key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row and os.path.exists(self._result_path(key)):
+                con.execute("UPDATE results SET last_access = ? WHERE sql_key = ?", (now, key))
+                self._count('result', True)
+                return pd.read_parquet(self._result_path(key))
+        self._count('result', False)
+        return None
+
+    def put_result(self, sql, df):
+        now = time.time()
+        key = _sql_key(sql)
+        path = self._result_path(key)
+        df.to_parquet(path, index=False)
+        with self._connect() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (key, normalize_sql(sql), os.path.getsize(path), now, now),
+            )
+            # Summaries of the previous result no longer describe the data.
+            con.execute("DELETE FROM summaries WHERE sql_key = ?", (key,))
+        self._evict_results(now)
+
+    def get_summary(self, question, sql):
+        """Return the summary written for this question over the cached result of `sql`, or None."""
+        with self._connect() as con:
+            row = con.execute("""
+                SELECT summary FROM summaries JOIN results USING (sql_key)
+                WHERE sql_key = ? AND normalized = ? AND created_at > ?
+            """, (_sql_key(sql), normalize_question(question), time.time() - self.ttl)).fetchone()
+        return row[0] if row else None
+
+    def put_summary(self, question, sql, summary):
+        """Store a summary of the cached result of `sql`; a no-op once that result is gone."""
+        with self._connect() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO summaries SELECT sql_key, ?, ? FROM results WHERE sql_key = ?",
+                (normalize_question(question), summary, _sql_key(sql)),
+            )
+
+    def _evict_results(self, now):
+        """Drop expired results, then least-recently-used ones until under the size budget."""
+        with self._connect() as con:
+            rows = con.execute("SELECT sql_key, size_bytes, created_at FROM results ORDER BY last_access DESC").fetchall()
+            total = 0
+            for key, size_bytes, created_at in rows:
+                total += size_bytes
+                if created_at <= now - self.ttl or total > self.max_bytes:
+                    con.execute("DELETE FROM results WHERE sql_key = ?", (key,))
+                    con.execute("DELETE FROM summaries WHERE sql_key = ?", (key,))
+                    if os.path.exists(self._result_path(key)):
+                        os.remove(self._result_path(key))
+                    total -= size_bytes
@@ -0,0 +1,197 @@
+import sys
+from datetime import datetime
+
+import sqlglot
+from sqlglot import exp
+
+from clients import get_aws_client
+from settings import (
+    GLUE_DATABASE, GLUE_TABLE, DATASET_PATH,
+    ROLLUP_TABLE, ROLLUP_PATH, ROLLUP_S3_BUCKET, ROLLUP_S3_PREFIX,
+)
+
+# Low-cardinality dimensions kept in the rollup; every question that only groups and
+# filters on them can be answered by re-aggregating the rollup instead of the raw table.
+ROLLUP_DIMENSIONS = ['uf', 'sexo', 'classe_social', 'inadimplente']
+
+ROLLUP_SQL = f"""
+    SELECT
+        uf, sexo, classe_social, inadimplente,
+        date_trunc('month', data_referencia) AS mes,
+        COUNT(*) AS n_clientes,
+        SUM(inadimplente) AS soma_inadimplente,
+        COUNT(inadimplente) AS n_inadimplente,
+        SUM(idade) AS soma_idade,
+        COUNT(idade) AS n_idade
+    FROM "{GLUE_TABLE}"
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+ROLLUP_DDL = f"""
+    CREATE EXTERNAL TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+        uf string, sexo string, classe_social string, inadimplente bigint, mes timestamp,
+        n_clientes bigint, soma_inadimplente bigint, n_inadimplente bigint,
+        soma_idade double, n_idade bigint
+    )
+    STORED AS PARQUET
+    LOCATION 's3://{ROLLUP_S3_BUCKET}/{ROLLUP_S3_PREFIX}'
+"""
+
+
+class _NotRollupable(Exception):
+    pass
+
+
+def _column(name):
+    return exp.column(name)
+
+
+def _sum(name):
+    return exp.Sum(this=_column(name))
+
+
+def _count(name):
+    """Re-aggregated count: a BIGINT that is 0 (not NULL) for empty groups, like COUNT."""
+    return exp.Cast(
+        this=exp.Coalesce(this=_sum(name), expressions=[exp.Literal.number(0)]),
+        to=exp.DataType.build('BIGINT'),
+    )
+
+
+def _ratio(total, count):
+    """SUM(total) / SUM(count) as a double, NULL when the group has no values."""
+    return exp.Div(
+        this=exp.Cast(this=_sum(total), to=exp.DataType.build('DOUBLE')),
+        expression=exp.Nullif(this=_sum(count), expression=exp.Literal.number(0)),
+    )
+
+
+def _measure_column(node):
+    """Return the raw column an aggregate reads (unwrapping CASTs), or None."""
+    while isinstance(node, exp.Cast):
+        node = node.this
+    return node.name if isinstance(node, exp.Column) else None
+
+
+def _rewrite_aggregate(node):
+    if isinstance(node, exp.Count):
+        if node.args.get('distinct') or isinstance(node.this, exp.Distinct):
+            raise _NotRollupable
+        if isinstance(node.this, exp.Star) or isinstance(node.this, exp.Literal):
+            return _count('n_clientes')
+        column = _measure_column(node.this)
+        if column in ('inadimplente', 'idade'):
+            return _count(f'n_{column}')
+    elif isinstance(node, exp.Avg):
+        column = _measure_column(node.this)
+        if column in ('inadimplente', 'idade'):
+            return _ratio(f'soma_{column}', f'n_{column}')
+    elif isinstance(node, exp.Sum):
+        column = _measure_column(node.this)
+        if column == 'inadimplente':
+            return exp.Cast(this=_sum('soma_inadimplente'), to=exp.DataType.build('BIGINT'))
+        if column == 'idade':
+            return _sum('soma_idade')
+    raise _NotRollupable
+
+
+def _is_month_start(node):
+    """True for TIMESTAMP/DATE literals that fall exactly on the first instant of a month."""
+    while isinstance(node, exp.Cast):
+        node = node.this
+    if not isinstance(node, exp.Literal) or not node.is_string:
+        return False
+    try:
+        value = datetime.fromisoformat(node.this)
+    except ValueError:
+        return False
+    if value.tzinfo is not None:
+        return False  # `mes` is in UTC; a month start in another offset isn't one there.
+    return (value.day, value.hour, value.minute, value.second, value.microsecond) == (1, 0, 0, 0, 0)
+
+
+def _is_data_referencia(node):
+    return isinstance(node, exp.Column) and node.name == 'data_referencia'
+
+
+def rewrite_to_rollup(sql, table=GLUE_TABLE, rollup_table=ROLLUP_TABLE):
+    """
+    Rewrite an aggregate query over the raw table into the equivalent query over the
+    rollup, or return None when the query needs something the rollup doesn't keep
+    (other columns, day-level dates, MIN/MAX, DISTINCT, joins, subqueries...).
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read='athena')
+    except sqlglot.errors.SqlglotError:
+        return None
+    if not isinstance(tree, exp.Select) or tree.args.get('distinct') or tree.args.get('joins'):
+        return None
+    tables = list(tree.find_all(exp.Table))
+    if len(tables) != 1 or tables[0].name != table or tree.find(exp.Subquery, exp.Window, exp.With):
+        return None
+    if not tree.find(exp.AggFunc):
+        return None  # Row-level queries need the raw table.
+
+    aliases = {projection.alias for projection in tree.expressions if projection.alias}
+
+    def transform(node):
+        if isinstance(node, exp.AggFunc):
+            return _rewrite_aggregate(node)
+        if isinstance(node, (exp.TimestampTrunc, exp.DateTrunc)) and _is_data_referencia(node.this):
+            if node.text('unit').upper() not in ('MONTH', 'QUARTER', 'YEAR'):
+                raise _NotRollupable
+            if node.text('unit').upper() == 'MONTH':
+                return _column('mes')
+            return node.__class__(this=_column('mes'), unit=node.args['unit'].copy())
+        if isinstance(node, (exp.Year, exp.Month, exp.Quarter)) and _is_data_referencia(node.this):
+            return node.__class__(this=_column('mes'))
+        if isinstance(node, (exp.GTE, exp.LT)) and _is_data_referencia(node.this):
+            # A month-aligned lower/upper bound selects whole months, so it is exact on `mes`.
+            if not _is_month_start(node.expression):
+                raise _NotRollupable
+            return node.__class__(this=_column('mes'), expression=node.expression.copy())
+        if isinstance(node, exp.Column) and node.name not in ROLLUP_DIMENSIONS:
+            # Output aliases may only be referenced for ordering.
+            if node.name not in aliases or not node.find_ancestor(exp.Order):
+                raise _NotRollupable
+        if isinstance(node, exp.Table):
+            return exp.to_table(rollup_table)
+        return node
+
+    try:
+        return tree.transform(transform).sql(dialect='athena')
+    except _NotRollupable:
+        return None
+
+
+def construir_rollup(enviar_para_s3=False):
+    """
+    Build the rollup from the local dataset (output of pre_data.py), write it as Parquet
+    and, optionally, upload it to S3 and register the Glue table through Athena.
+    """
+    from query_backends import get_duckdb_connection, resolve_dataset_path
+    from athena_query import execute_athena_query
+
+    print(f"🧮 Building rollup from '{resolve_dataset_path(DATASET_PATH)}'...")
+    cursor = get_duckdb_connection(DATASET_PATH).cursor()
+    cursor.execute(f"COPY ({ROLLUP_SQL}) TO '{ROLLUP_PATH}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+    linhas = cursor.execute(f"SELECT COUNT(*) FROM read_parquet('{ROLLUP_PATH}')").fetchone()[0]
+    cursor.close()
+    print(f"✅ Rollup saved to '{ROLLUP_PATH}' with {linhas} rows.")
+
+    if enviar_para_s3:
+        chave = f"{ROLLUP_S3_PREFIX}{ROLLUP_TABLE}.parquet"
+        print(f"☁️ Uploading to s3://{ROLLUP_S3_BUCKET}/{chave}...")
+        get_aws_client('s3').upload_file(ROLLUP_PATH, ROLLUP_S3_BUCKET, chave)
+        print(f"📚 Registering table '{GLUE_DATABASE}.{ROLLUP_TABLE}'...")
+        _, error = execute_athena_query(ROLLUP_DDL)
+        if error:
+            print(f"❌ ERROR: {error}")
+            return
+        print("✅ Rollup available in Athena.")
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    # Pass --s3 to upload the rollup and create the Glue table.
+    construir_rollup(enviar_para_s3='--s3' in sys.argv)
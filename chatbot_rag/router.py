@@ -0,0 +1,147 @@
+import re
+import time
+
+import numpy as np
+
+from clients import get_openai_client
+from query_cache import normalize_question
+from settings import ROUTER_MIN_MARGIN
+
+SQL = "SQL"
+DOCUMENTO = "DOCUMENTO"
+
+# Keyword rules over the normalized question (lowercase, no accents), matched at word
+# starts. A question that only matches one side is routed without looking any further.
+SQL_KEYWORDS = [
+    'taxa de inadimplencia', 'inadimplentes', 'media', 'quantos', 'quantas', 'quantidade',
+    'contagem', 'total de', 'soma', 'percentual', 'porcentagem', 'proporcao', 'distribuicao',
+    'ranking', 'maior taxa', 'menor taxa', 'por uf', 'por estado', 'por sexo', 'por genero',
+    'por classe', 'por mes', 'por ano', 'grafico', 'visualizacao', 'plot', 'desenhe', 'evolucao',
+]
+DOCUMENTO_KEYWORDS = [
+    'politica', 'criterio', 'regra', 'explique', 'descreva', 'processo', 'o que e', 'como funciona',
+    'documento', 'requisito', 'exigid', 'necessari', 'permitid', 'garantia', 'avalista', 'carencia',
+    'cobranca', 'renegocia', 'contrato', 'aprovacao', 'concessao', 'quem aprova', 'limite de credito',
+    'taxa de juros', 'prazo', 'valor minimo', 'valor maximo', 'faturamento', 'solicitar',
+    'atraso', 'posso', 'pode',
+]
+
+
+def _keyword_pattern(keywords):
+    return re.compile(r'\b(?:' + '|'.join(re.escape(keyword) for keyword in keywords) + ')')
+
+
+_SQL_PATTERN = _keyword_pattern(SQL_KEYWORDS)
+_DOCUMENTO_PATTERN = _keyword_pattern(DOCUMENTO_KEYWORDS)
+
+# Labelled examples whose embeddings form the nearest-centroid classifier.
+TRAINING_EXAMPLES = {
+    SQL: [
+        "qual a taxa de inadimplência por uf?",
+        "qual a idade média dos clientes de MG?",
+        "quantos clientes existem por classe social?",
+        "mostre um gráfico de barras da idade média por classe social",
+        "qual estado tem a maior taxa de inadimplência?",
+        "compare a inadimplência entre homens e mulheres",
+        "como evoluiu a inadimplência mês a mês?",
+        "quantos clientes inadimplentes temos em SP?",
+        "distribuição de clientes por sexo",
+        "qual a idade média dos inadimplentes?",
+        "taxa de inadimplência da classe social A",
+        "top 5 estados com mais clientes",
+    ],
+    DOCUMENTO: [
+        "quais são os critérios para aprovação de crédito?",
+        "explique a política de renegociação de dívida.",
+        "qual a idade mínima para solicitar crédito?",
+        "descreva o processo de cobrança em caso de atraso.",
+        "quais documentos são necessários para pessoa jurídica?",
+        "qual o valor máximo para capital de giro?",
+        "quais garantias podem ser exigidas?",
+        "qual o prazo de carência para investimento fixo?",
+        "quem aprova a proposta de crédito?",
+        "o que acontece com 30 dias de atraso?",
+        "é permitida a composição de renda com familiares?",
+        "qual a taxa de juros máxima cobrada?",
+    ],
+}
+
+
+def decide_tool(question):
+    """Use the LLM to decide whether the question is for SQL or for documents."""
+    prompt = f"""
+    Sua tarefa é classificar a pergunta do usuário e decidir qual ferramenta usar.
+    As ferramentas disponíveis são:
+    1. 'SQL': Para perguntas sobre dados quantitativos, agregações, médias, contagens, taxas de inadimplência, etc., que podem ser respondidas com uma consulta SQL.
+    2. 'DOCUMENTO': Para perguntas sobre políticas, regras, definições, explicações ou informações qualitativas que provavelmente estão em um documento de texto.
+
+    Exemplos:
+    - Pergunta: "qual a taxa de inadimplência por uf?" -> Ferramenta: SQL
+    - Pergunta: "quais são os critérios para aprovação de crédito?" -> Ferramenta: DOCUMENTO
+    - Pergunta: "qual a idade média dos clientes de MG?" -> Ferramenta: SQL
+    - Pergunta: "explique a política de renegociação de dívida." -> Ferramenta: DOCUMENTO
+
+    Analise a seguinte pergunta e retorne APENAS a palavra 'SQL' ou 'DOCUMENTO'.
+    Pergunta do usuário: "{question}"
+    Ferramenta:
+    """
+    response = get_openai_client().chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": prompt}], temperature=0, max_tokens=5)
+    return response.choices[0].message.content.strip()
+
+
+class QuestionRouter:
+    """
+    Local replacement for the LLM router: keyword rules first, then a nearest-centroid
+    classifier over sentence embeddings. The LLM (`fallback`) is only called when both
+    are inconclusive.
+    """
+
+    def __init__(self, embeddings=None, fallback=None, min_margin=ROUTER_MIN_MARGIN,
+                 examples=TRAINING_EXAMPLES):
+        self.embeddings = embeddings
+        self.fallback = fallback
+        self.min_margin = min_margin
+        self.centroids = {}
+        if embeddings is not None:
+            for tool, questions in examples.items():
+                vectors = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+                centroid = vectors.mean(axis=0)
+                self.centroids[tool] = centroid / np.linalg.norm(centroid)
+
+    def route_by_rules(self, question):
+        normalized = normalize_question(question)
+        sql_hits = len(_SQL_PATTERN.findall(normalized))
+        doc_hits = len(_DOCUMENTO_PATTERN.findall(normalized))
+        if sql_hits and not doc_hits:
+            return SQL
+        if doc_hits and not sql_hits:
+            return DOCUMENTO
+        return None
+
+    def route_by_centroid(self, question):
+        """Return (tool, margin) where margin is the cosine gap between the two centroids."""
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        vector /= np.linalg.norm(vector)
+        scores = {tool: float(vector @ centroid) for tool, centroid in self.centroids.items()}
+        best, second = sorted(scores, key=scores.get, reverse=True)
+        return best, scores[best] - scores[second]
+
+    def route(self, question, stats=None):
+        """
+        Return 'SQL' or 'DOCUMENTO' (or whatever the fallback answers).
+        `stats` receives the deciding stage ('regras', 'centroide' or 'llm') and its latency.
+        """
+        stats = {} if stats is None else stats
+        start = time.perf_counter()
+        tool = self.route_by_rules(question)
+        stats['stage'] = 'regras'
+        if tool is None and self.centroids:
+            tool, margin = self.route_by_centroid(question)
+            stats['stage'], stats['margin'] = 'centroide', margin
+            if margin < self.min_margin:
+                tool = None
+        if tool is None and self.fallback is not None:
+            stats['stage'] = 'llm'
+            tool = self.fallback(question)
+        stats['route_ms'] = (time.perf_counter() - start) * 1000
+        return tool
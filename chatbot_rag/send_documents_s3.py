@@ -1,40 +1,202 @@
 # Required installations:
 # pip install langchain langchain-aws pypdf2 sentence-transformers faiss-cpu chromadb
-from langchain_community.document_loaders import S3FileLoader
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from langchain_community.document_loaders import UnstructuredFileLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 
+from clients import get_aws_client
+from embedding_cache import EMBEDDING_MODEL, build_embeddings
+from hybrid_retrieval import BM25Index
+
 # --- CONFIGURATION ---
-NOME_DO_BUCKET = "chatbot-analise-dados" 
-CAMINHO_DO_ARQUIVO_NO_S3 = "documentos-rag/Taboa_PoliticaDeCredito.pdf" 
+NOME_DO_BUCKET = "chatbot-analise-dados"
+PREFIXO_DOCUMENTOS = "documentos-rag/"
+DIRETORIO_CHROMA = "./chroma_db_rag"
+MODELO_EMBEDDING = EMBEDDING_MODEL
+
+# Concurrent S3 downloads (I/O bound, threads)
+DOWNLOADS_SIMULTANEOS = 16
+# Texts per forward pass of the embedding model; 64 keeps MiniLM busy on CPU without
+# padding every batch to the longest chunk of a huge batch.
+TAMANHO_LOTE_EMBEDDING = 64
+# Chunks embedded and upserted into Chroma per call
+TAMANHO_LOTE_INDICE = 512
+# Largest share of the indexed chunks that step 4 may delete in one run; a wrong prefix or a
+# partial listing would otherwise wipe the index.
+FRACAO_MAXIMA_REMOCAO = 0.5
+
+
+def id_do_chunk(chave, pagina, texto):
+    """
+    Stable chunk ID: the same text on the same page of the same S3 object always gets
+    the same ID, so re-indexing upserts instead of adding duplicates.
+    """
+    hash_conteudo = hashlib.sha256(texto.encode('utf-8')).hexdigest()[:16]
+    return f"{chave}:{pagina}:{hash_conteudo}"
+
 
-def preparar_documentos_do_s3():
+def listar_documentos(s3_client, bucket=NOME_DO_BUCKET, prefixo=PREFIXO_DOCUMENTOS):
     """
-    Reads a PDF from S3, splits it, creates embeddings, and saves into a local Vector Store.
+    Lists every PDF under the prefix. Returns {key: ETag}.
     """
-    print(f"1. Carregando o documento de s3://chatbot-analise-dados/documentos-rag/Taboa_PoliticaDeCredito.pdf")
-    loader = S3FileLoader(
-        NOME_DO_BUCKET,
-        CAMINHO_DO_ARQUIVO_NO_S3,
-        loader_kwargs={"languages": ["por"]}
-    )
-    documentos = loader.load()
+    documentos = {}
+    for pagina in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefixo):
+        for objeto in pagina.get('Contents', []):
+            if objeto['Key'].lower().endswith('.pdf'):
+                documentos[objeto['Key']] = objeto['ETag']
+    return documentos
+
+
+def baixar_documento(s3_client, chave, destino, bucket=NOME_DO_BUCKET):
+    caminho = os.path.join(destino, chave.replace('/', '__'))
+    s3_client.download_file(bucket, chave, caminho)
+    return caminho
+
+
+def dividir_pdf(caminho, chave, etag, bucket=NOME_DO_BUCKET):
+    """
+    Worker: partitions a downloaded PDF page by page with unstructured and splits it into
+    chunks. Returns the page count and {chunk ID: (text, metadata)}; the local file is removed.
+    """
+    try:
+        paginas = UnstructuredFileLoader(caminho, mode="paged", languages=["por"]).load()
+    finally:
+        os.remove(caminho)
 
-    print("2. Dividindo o documento em pedaços (chunks)...")
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-    chunks = text_splitter.split_documents(documentos)
-    print(f"   Documento dividido em {len(chunks)} pedaços.")
+    chunks = {}
+    for chunk in text_splitter.split_documents(paginas):
+        pagina = chunk.metadata.get("page_number", 0)
+        # Only scalar metadata: Chroma rejects the lists unstructured adds in paged mode.
+        # Identical text repeated on a page collapses into a single chunk.
+        chunks[id_do_chunk(chave, pagina, chunk.page_content)] = (
+            chunk.page_content, {"source": f"s3://{bucket}/{chave}", "page_number": pagina, "etag": etag})
+    return len(paginas), chunks
+
+
+def ler_indice(vector_store):
+    """
+    Returns {source: {chunk ID: ETag}} for everything already in the index.
+    """
+    indice = {}
+    indexados = vector_store.get(include=["metadatas"])
+    for id_chunk, metadata in zip(indexados["ids"], indexados["metadatas"]):
+        metadata = metadata or {}
+        indice.setdefault(metadata.get("source"), {})[id_chunk] = metadata.get("etag")
+    return indice
+
+
+def atualizar_documento(vector_store, chunks, indexados):
+    """
+    Brings the index in line with one document: embeds and upserts only chunks that are new
+    (in batches of TAMANHO_LOTE_INDICE) and deletes the ones whose content changed or
+    disappeared. Returns (added, removed, kept) chunk counts.
+    """
+    novos = [id_chunk for id_chunk in chunks if id_chunk not in indexados]
+    removidos = [id_chunk for id_chunk in indexados if id_chunk not in chunks]
+    mantidos = [id_chunk for id_chunk in chunks if id_chunk in indexados]
+    for inicio in range(0, len(novos), TAMANHO_LOTE_INDICE):
+        lote = novos[inicio:inicio + TAMANHO_LOTE_INDICE]
+        vector_store.add_texts([chunks[id_chunk][0] for id_chunk in lote],
+                               metadatas=[chunks[id_chunk][1] for id_chunk in lote], ids=lote)
+    if removidos:
+        vector_store.delete(ids=removidos)
+    # Kept chunks get the new ETag so the next run can skip this object.
+    if mantidos:
+        vector_store._collection.update(ids=mantidos, metadatas=[chunks[id_chunk][1] for id_chunk in mantidos])
+    return len(novos), len(removidos), len(mantidos)
+
+
+def preparar_documentos_do_s3(prefixo=PREFIXO_DOCUMENTOS, processos=None,
+                              fracao_maxima_remocao=FRACAO_MAXIMA_REMOCAO):
+    """
+    Indexes every PDF under the S3 prefix into the local Vector Store, incrementally:
+    unchanged documents (same ETag) are skipped, the others are downloaded concurrently,
+    parsed in a process pool and only their new chunks are embedded. Chunks of documents
+    gone from S3 are deleted, unless the listing is empty or they exceed
+    `fracao_maxima_remocao` of the index.
+    """
+    # Shared pooled client: aws_max_pool_connections must cover DOWNLOADS_SIMULTANEOS.
+    s3_client = get_aws_client('s3')
+
+    print(f"1. Listando os documentos em s3://{NOME_DO_BUCKET}/{prefixo}...")
+    documentos = listar_documentos(s3_client, prefixo=prefixo)
+
+    print("2. Carregando o modelo de embedding e o índice atual...")
+    embeddings = build_embeddings(MODELO_EMBEDDING, encode_kwargs={"batch_size": TAMANHO_LOTE_EMBEDDING})
+    vector_store = Chroma(persist_directory=DIRETORIO_CHROMA, embedding_function=embeddings)
+    indice = ler_indice(vector_store)
+
+    fontes = {f"s3://{NOME_DO_BUCKET}/{chave}": chave for chave in documentos}
+    pendentes = [chave for fonte, chave in fontes.items()
+                 if not indice.get(fonte) or any(etag != documentos[chave] for etag in indice[fonte].values())]
+    print(f"   {len(documentos)} documentos, {len(pendentes)} novos ou alterados.")
+
+    print("3. Baixando, dividindo e indexando os documentos alterados...")
+    inicio = time.perf_counter()
+    total_paginas, total_chunks, adicionados, removidos = 0, 0, 0, 0
+    with tempfile.TemporaryDirectory() as destino, \
+            ThreadPoolExecutor(max_workers=DOWNLOADS_SIMULTANEOS) as downloads, \
+            ProcessPoolExecutor(max_workers=processos) as parsers:
+        baixando = {downloads.submit(baixar_documento, s3_client, chave, destino): chave for chave in pendentes}
+        dividindo = {}
+        for futuro in as_completed(baixando):
+            chave = baixando[futuro]
+            dividindo[parsers.submit(dividir_pdf, futuro.result(), chave, documentos[chave])] = chave
+        for futuro in as_completed(dividindo):
+            chave = dividindo[futuro]
+            paginas, chunks = futuro.result()
+            novos, apagados, _ = atualizar_documento(
+                vector_store, chunks, indice.get(f"s3://{NOME_DO_BUCKET}/{chave}", {}))
+            total_paginas, total_chunks = total_paginas + paginas, total_chunks + len(chunks)
+            adicionados, removidos = adicionados + novos, removidos + apagados
+            print(f"   ✔ {chave}: {paginas} páginas, {novos} pedaços novos, {apagados} removidos")
+    duracao = max(time.perf_counter() - inicio, 1e-9)
+
+    print("4. Removendo pedaços de documentos que não fazem mais parte do corpus...")
+    ausentes = [id_chunk for fonte, ids in indice.items() if fonte not in fontes for id_chunk in ids]
+    total_indexado = sum(len(ids) for ids in indice.values())
+    if ausentes and not documentos:
+        print(f"   ⚠️ Nenhum documento listado em s3://{NOME_DO_BUCKET}/{prefixo}; "
+              f"{len(ausentes)} pedaços mantidos.")
+        ausentes = []
+    elif ausentes and len(ausentes) > fracao_maxima_remocao * total_indexado:
+        print(f"   ⚠️ {len(ausentes)} de {total_indexado} pedaços sairiam do índice "
+              f"(limite {fracao_maxima_remocao:.0%}); remoção ignorada. "
+              f"Use --fracao-maxima-remocao 1 para confirmar.")
+        ausentes = []
+    elif ausentes:
+        vector_store.delete(ids=ausentes)
+    print(f"   {len(ausentes)} pedaços removidos.")
 
-    print("3. Carregando o modelo de embedding...")
-    model_name = "sentence-transformers/all-MiniLM-L6-v2"
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    print("5. Reconstruindo o índice BM25 da busca híbrida...")
+    bm25 = BM25Index.from_vector_store(vector_store)
+    bm25.save()
+    print(f"   {len(bm25.ids)} pedaços, {len(bm25.postings)} termos.")
 
-    print("4. Criando o Vector Store com ChromaDB e salvando localmente...")
-    vector_store = Chroma.from_documents(chunks, embeddings, persist_directory="./chroma_db_rag")
-    
-    print("✅ Documentos do S3 processados e salvos com sucesso na pasta local 'chroma_db_rag'!")
+    print(f"✅ Vector Store atualizado na pasta local '{DIRETORIO_CHROMA}': {adicionados} pedaços novos, "
+          f"{removidos + len(ausentes)} removidos.")
+    print(f"⏱️ {total_paginas} páginas e {total_chunks} pedaços em {duracao:.1f}s "
+          f"({total_paginas / duracao:,.1f} páginas/s, {total_chunks / duracao:,.1f} pedaços/s).")
+    if hasattr(embeddings, 'hit_rate'):
+        print(f"🧠 Cache de embeddings: {embeddings.stats['hits']} acertos, {embeddings.stats['misses']} falhas "
+              f"({embeddings.hit_rate:.0%}).")
 
 # --- EXECUTION ---
 if __name__ == '__main__':
-    preparar_documentos_do_s3()
+    parser = argparse.ArgumentParser(description="Indexes the PDFs of an S3 prefix into the local Chroma store.")
+    parser.add_argument('--prefixo', default=PREFIXO_DOCUMENTOS)
+    parser.add_argument('--processos', type=int, default=None,
+                        help="parser processes (default: number of cores)")
+    parser.add_argument('--fracao-maxima-remocao', type=float, default=FRACAO_MAXIMA_REMOCAO,
+                        help="largest share of the index that documents gone from S3 may remove")
+    args = parser.parse_args()
+    preparar_documentos_do_s3(prefixo=args.prefixo, processos=args.processos,
+                              fracao_maxima_remocao=args.fracao_maxima_remocao)
@@ -0,0 +1,122 @@
+import json
+
+
+# --- CONFIGURATION ---
+try:
+    with open('config.json', 'r') as f:
+        config = json.load(f)
+    OPENAI_API_KEY = config.get('openai_api_key')
+    if not OPENAI_API_KEY:
+        raise ValueError("The 'openai_api_key' key was not found in config.json")
+except FileNotFoundError:
+    raise FileNotFoundError("The configuration file 'config.json' was not found. Please create the file.")
+
+
+AWS_REGION = "sa-east-1"
+GLUE_DATABASE = "chatbot_db"
+GLUE_TABLE = "dataset"
+S3_OUTPUT_LOCATION = "s3://chatbot-analise-dados/athena_results/"
+
+# Query backend: "duckdb" answers locally from the Parquet produced by pre_data.py,
+# "athena" sends every query to AWS Athena.
+QUERY_BACKEND = config.get('query_backend', 'duckdb')
+ATHENA_FALLBACK = config.get('athena_fallback', True)
+DATASET_PATH = config.get('dataset_path', 'dataset')
+# Sample shipped with the repo, queried locally until pre_data.py has written DATASET_PATH.
+DATASET_SAMPLE_PATH = config.get('dataset_sample_path', 'temp_dataset.parquet')
+
+# Athena polling: exponential backoff from tens of milliseconds, capped, with a deadline
+# after which the query is cancelled.
+ATHENA_POLL_INITIAL_SECONDS = config.get('athena_poll_initial_seconds', 0.05)
+ATHENA_POLL_MAX_SECONDS = config.get('athena_poll_max_seconds', 1.0)
+ATHENA_QUERY_TIMEOUT_SECONDS = config.get('athena_query_timeout_seconds', 60)
+
+# How Athena results are read: "csv" downloads the result object Athena writes to
+# S3_OUTPUT_LOCATION in one request, "paginate" pages through get_query_results.
+ATHENA_RESULTS_READER = config.get('athena_results_reader', 'csv')
+
+# Athena cost controls: queries run in ATHENA_WORKGROUP; recent identical read-only queries reuse their
+# result (local SQL -> QueryExecutionId index and Athena's ResultReuseConfiguration, 0 disables, max 10080);
+# queries are cancelled past the scan budget (0 disables) and a bare SELECT * gets a LIMIT.
+ATHENA_WORKGROUP = config.get('athena_workgroup', 'primary')
+ATHENA_RESULT_REUSE_MINUTES = config.get('athena_result_reuse_minutes', 60)
+ATHENA_SCAN_BUDGET_BYTES = config.get('athena_scan_budget_bytes', 1024 ** 3)
+ATHENA_SELECT_STAR_LIMIT = config.get('athena_select_star_limit', 1000)
+
+# Shared AWS (Athena/S3) and OpenAI clients: pooled keep-alive connections, timeouts and retries.
+# "adaptive" retries throttling with backoff and rate-limits the client side; "standard" only retries.
+AWS_MAX_POOL_CONNECTIONS = config.get('aws_max_pool_connections', 32)
+AWS_RETRY_MODE = config.get('aws_retry_mode', 'adaptive')
+AWS_MAX_ATTEMPTS = config.get('aws_max_attempts', 5)
+AWS_CONNECT_TIMEOUT_SECONDS = config.get('aws_connect_timeout_seconds', 5)
+AWS_READ_TIMEOUT_SECONDS = config.get('aws_read_timeout_seconds', 60)
+OPENAI_MAX_CONNECTIONS = config.get('openai_max_connections', 20)
+OPENAI_MAX_RETRIES = config.get('openai_max_retries', 3)
+OPENAI_TIMEOUT_SECONDS = config.get('openai_timeout_seconds', 60)
+
+# Request pipeline (pipeline.py): one asyncio loop for every session, with global limits on
+# concurrent Athena queries and OpenAI calls and a timeout (seconds) per stage.
+PIPELINE_ATHENA_CONCURRENCY = config.get('pipeline_athena_concurrency', 5)
+PIPELINE_OPENAI_CONCURRENCY = config.get('pipeline_openai_concurrency', 8)
+PIPELINE_WORKER_THREADS = config.get('pipeline_worker_threads', 32)
+PIPELINE_STAGE_TIMEOUTS = {
+    'route': 15, 'sql': 30, 'sql_retry': 30, 'query': ATHENA_QUERY_TIMEOUT_SECONDS + 30, 'summary': 60, 'chart': 60, 'rag': 60,
+    **config.get('pipeline_stage_timeouts', {}),
+}
+
+# Query cache: question -> SQL (exact and nearest-neighbour) and SQL -> result Parquet.
+QUERY_CACHE_ENABLED = config.get('query_cache_enabled', True)
+QUERY_CACHE_DIR = config.get('query_cache_dir', './query_cache')
+QUERY_CACHE_TTL_SECONDS = config.get('query_cache_ttl_seconds', 24 * 60 * 60)
+QUERY_CACHE_MAX_BYTES = config.get('query_cache_max_bytes', 256 * 1024 * 1024)
+QUERY_CACHE_MAX_QUESTIONS = config.get('query_cache_max_questions', 5000)
+QUERY_CACHE_SIMILARITY = config.get('query_cache_similarity', 0.92)
+
+# Local router: minimum cosine gap between the SQL and DOCUMENTO centroids to trust the
+# classifier; below it the question goes to the LLM router.
+ROUTER_MIN_MARGIN = config.get('router_min_margin', 0.04)
+
+# Deterministic NL-to-SQL templates for the common aggregate questions.
+SQL_TEMPLATES_ENABLED = config.get('sql_templates_enabled', True)
+
+# SQL pre-flight (sql_preflight.py): LIMIT added to non-aggregate queries that have none.
+SQL_PREFLIGHT_DEFAULT_LIMIT = config.get('sql_preflight_default_limit', 1000)
+
+# Pre-aggregated rollup of `dataset` by uf, sexo, classe_social, inadimplente and month,
+# built by rollups.py. Matching aggregate queries are rewritten to read it instead.
+ROLLUP_TABLE = config.get('rollup_table', 'dataset_rollup')
+ROLLUP_PATH = config.get('rollup_path', 'dataset_rollup.parquet')
+ROLLUP_S3_BUCKET = config.get('rollup_s3_bucket', 'chatbot-analise-dados')
+ROLLUP_S3_PREFIX = config.get('rollup_s3_prefix', 'dados_rollup/')
+# Set once `python rollups.py --s3` has registered the rollup table in Glue.
+ROLLUP_ATHENA_ENABLED = config.get('rollup_athena_enabled', False)
+
+# Set when `dataset` is the year/month-partitioned layout written by pre_data.py, so date
+# filters are pushed down as predicates on ano_referencia/mes_referencia. Only turn it on once
+# `pre_data.py --s3` has written and registered the partitioned table: the predicates fail
+# on a table without those columns.
+DATASET_PARTITIONED = config.get('dataset_partitioned', False)
+
+# Persistent embedding cache shared by indexing (send_documents_s3.py) and the app
+EMBEDDING_CACHE_ENABLED = config.get('embedding_cache_enabled', True)
+EMBEDDING_CACHE_PATH = config.get('embedding_cache_path', './embedding_cache/embeddings.sqlite3')
+EMBEDDING_CACHE_MAX_ENTRIES = config.get('embedding_cache_max_entries', 200_000)
+
+# Embedding model runtime: 'torch' (sentence-transformers) or 'onnx' (int8 ONNX Runtime, no torch import)
+EMBEDDING_BACKEND = config.get('embedding_backend', 'torch')
+EMBEDDING_ONNX_DIR = config.get('embedding_onnx_dir', './modelos/all-MiniLM-L6-v2-onnx-int8')
+
+# RAG retrieval: 'hybrid' fuses BM25 (built by send_documents_s3.py) with vector search; 'vector' is Chroma only
+RETRIEVAL_MODE = config.get('retrieval_mode', 'hybrid')
+RETRIEVAL_K = config.get('retrieval_k', 3)
+RETRIEVAL_CANDIDATES = config.get('retrieval_candidates', 20)
+BM25_INDEX_PATH = config.get('bm25_index_path', './chroma_db_rag/bm25_index.json')
+# Optional CPU cross-encoder re-ranking of the fused candidates, cut off at the latency budget
+RERANK_ENABLED = config.get('rerank_enabled', False)
+RERANK_MODEL = config.get('rerank_model', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1')
+RERANK_CANDIDATES = config.get('rerank_candidates', 10)
+RERANK_BUDGET_MS = config.get('rerank_budget_ms', 150)
+
+# Prompt budgets (tokens): RAG context and DataFrames sent to the summary/chart prompts are compressed to fit
+RAG_CONTEXT_TOKENS = config.get('rag_context_tokens', 1500)
+DATAFRAME_CONTEXT_TOKENS = config.get('dataframe_context_tokens', 2000)
@@ -0,0 +1,69 @@
+import sqlglot
+from sqlglot import exp
+from sqlglot.optimizer.qualify import qualify
+
+from partition_pruning import COLUNA_ANO, COLUNA_MES
+from settings import GLUE_TABLE, SQL_PREFLIGHT_DEFAULT_LIMIT
+
+# Columns of the Glue table (see generate_sql_with_llm and pre_data.py), with the partition columns.
+DATASET_SCHEMA = {
+    'data_referencia': 'timestamp',
+    'inadimplente': 'bigint',
+    'sexo': 'varchar',
+    'idade': 'double',
+    'flag_obito': 'varchar',
+    'uf': 'varchar',
+    'classe_social': 'varchar',
+    COLUNA_ANO: 'int',
+    COLUNA_MES: 'int',
+}
+
+
+def _parse_error(error):
+    """First message of a sqlglot ParseError, without the highlighted query it embeds."""
+    details = getattr(error, 'errors', None)
+    if details:
+        first = details[0]
+        return f"{first.get('description')} (line {first.get('line')}, column {first.get('col')})"
+    return str(error).splitlines()[0]
+
+
+def _is_aggregate(select):
+    return bool(select.args.get('group')) or any(
+        isinstance(projection.unalias(), exp.AggFunc) or projection.find(exp.AggFunc)
+        for projection in select.expressions
+    )
+
+
+def preflight(sql, table=GLUE_TABLE, schema=DATASET_SCHEMA, default_limit=SQL_PREFLIGHT_DEFAULT_LIMIT):
+    """
+    Validate and tighten a generated query before it reaches a backend. Returns a tuple
+    (SQL, Error): the query must parse as a single read-only statement over `table` using
+    only known columns; non-aggregate queries without LIMIT get `default_limit`.
+    Partition predicates are added later by run_query, after the rollup rewrite (the rollup
+    only accepts filters on its dimensions).
+    """
+    try:
+        statements = sqlglot.parse(sql, read='athena')
+    except sqlglot.errors.ParseError as e:
+        return None, f"Invalid SQL: {_parse_error(e)}"
+    statements = [statement for statement in statements if statement is not None]
+    if len(statements) != 1:
+        return None, "Expected exactly one SQL statement."
+    tree = statements[0]
+    if not isinstance(tree, exp.Query):
+        return None, "Only SELECT queries are allowed."
+
+    ctes = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    unknown = sorted({t.name for t in tree.find_all(exp.Table) if t.name not in ctes and t.name != table})
+    if unknown:
+        return None, f"Unknown table {', '.join(unknown)}. The only table is \"{table}\"."
+    try:
+        qualify(tree.copy(), schema={table: schema}, dialect='athena', validate_qualify_columns=True)
+    except sqlglot.errors.OptimizeError as e:
+        return None, f"{e}. Available columns: {', '.join(schema)}."
+
+    if (default_limit and isinstance(tree, exp.Select) and not tree.args.get('limit')
+            and not _is_aggregate(tree)):
+        sql = tree.limit(default_limit).sql(dialect='athena')
+    return sql, None
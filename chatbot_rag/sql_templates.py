@@ -0,0 +1,174 @@
+import re
+
+from query_cache import normalize_question
+from settings import GLUE_TABLE
+
+# Deterministic compiler for the common aggregate questions over the `dataset` table.
+# A question is only compiled when every word in it is understood; anything else
+# returns None and goes to generate_sql_with_llm.
+
+# (phrase regex, SQL expression, alias). The first matching metric wins.
+METRICS = [
+    (r'(?:quantos|quantas|quantidade de|numero de|total de|soma de|contagem de) inadimplentes',
+     'SUM(inadimplente)', 'total_inadimplentes'),
+    (r'(?:taxa|percentual|porcentagem|proporcao|indice) de inadimplen(?:cia|tes)|inadimplencia',
+     'AVG(CAST(inadimplente AS DOUBLE))', 'taxa_inadimplencia'),
+    (r'idade media|medias? d[ae]s? idades?',
+     'AVG(idade)', 'idade_media'),
+    (r'(?:quantos|quantas|quantidade de|numero de|total de|contagem de) (?:clientes|registros|pessoas|linhas)|quantos|quantas|quantidade|contagem',
+     'COUNT(*)', 'total_clientes'),
+]
+
+# Dimension words -> (SELECT expression, output column).
+DIMENSIONS = {
+    'uf': ('uf', 'uf'),
+    'ufs': ('uf', 'uf'),
+    'estado': ('uf', 'uf'),
+    'estados': ('uf', 'uf'),
+    'sexo': ('sexo', 'sexo'),
+    'genero': ('sexo', 'sexo'),
+    'classe social': ('classe_social', 'classe_social'),
+    'classes sociais': ('classe_social', 'classe_social'),
+    'classe': ('classe_social', 'classe_social'),
+    'mes': ("date_trunc('month', data_referencia)", 'mes'),
+    'ano': ('year(data_referencia)', 'ano'),
+}
+_DIMENSION_WORDS = '|'.join(sorted(DIMENSIONS, key=len, reverse=True))
+
+UFS = {
+    'AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA',
+    'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO',
+}
+NOMES_UF = {
+    'acre': 'AC', 'alagoas': 'AL', 'amazonas': 'AM', 'amapa': 'AP', 'bahia': 'BA', 'ceara': 'CE',
+    'distrito federal': 'DF', 'espirito santo': 'ES', 'goias': 'GO', 'maranhao': 'MA',
+    'minas gerais': 'MG', 'mato grosso do sul': 'MS', 'mato grosso': 'MT', 'para': 'PA',
+    'paraiba': 'PB', 'pernambuco': 'PE', 'piaui': 'PI', 'parana': 'PR', 'rio de janeiro': 'RJ',
+    'rio grande do norte': 'RN', 'rondonia': 'RO', 'roraima': 'RR', 'rio grande do sul': 'RS',
+    'santa catarina': 'SC', 'sergipe': 'SE', 'sao paulo': 'SP', 'tocantins': 'TO',
+}
+MESES = {
+    'janeiro': 1, 'fevereiro': 2, 'marco': 3, 'abril': 4, 'maio': 5, 'junho': 6, 'julho': 7,
+    'agosto': 8, 'setembro': 9, 'outubro': 10, 'novembro': 11, 'dezembro': 12,
+}
+
+# Words that carry no meaning for the query once the slots above are extracted.
+FILLER = set("""
+    qual quais a o as os e de do da dos das em no na nos nas para por com entre sobre ao aos
+    um uma me mostre mostrar mostra exiba exibir gere gerar faca liste listar calcule calcular
+    ver veja grafico graficos barras barra linha linhas pizza visualizacao plot plote plotar desenhe
+    clientes cliente pessoas registros base dados dataset tabela tem temos tinha existem ha foi sao
+    geral cada valor valores separado separados agrupado agrupados dividido divididos segundo
+    compare comparar comparacao pela pelo ranking ordem ordenado ordenados decrescente crescente evolucao longo tempo ao mensal mensalmente
+    maior menor mais menos top
+""".split())
+
+
+def _month_range(ano, mes):
+    inicio = f"{ano:04d}-{mes:02d}-01"
+    fim = f"{ano + (mes == 12):04d}-{mes % 12 + 1:02d}-01"
+    return (f"data_referencia >= TIMESTAMP '{inicio} 00:00:00' "
+            f"AND data_referencia < TIMESTAMP '{fim} 00:00:00'")
+
+
+def parse_question(question):
+    """
+    Extract the intent and slots of an aggregate question.
+    Returns a dict (metric, dimensions, filters, order, limit) or None when the question
+    has any part the templates don't cover.
+    """
+    text = ' ' + normalize_question(question) + ' '
+    slots = {'dimensions': [], 'filters': [], 'order': None, 'limit': None}
+
+    def consume(pattern):
+        nonlocal text
+        match = re.search(r'(?<= )(?:' + pattern + r')(?= )', text)
+        if match:
+            text = text[:match.start()] + ' ' + text[match.end():]
+        return match
+
+    for pattern, expression, alias in METRICS:
+        if consume(pattern):
+            slots['metric'] = (expression, alias)
+            break
+    else:
+        return None
+
+    # "por uf", "por uf e sexo", "qual estado ...", "entre as classes sociais", "mes a mes"
+    while match := consume(rf'(?:por|qual|quais|entre|ranking d[oa]s) (?:a |o |as |os )?({_DIMENSION_WORDS})(?: e (?:por )?({_DIMENSION_WORDS}))?'):
+        for word in match.groups():
+            if word and DIMENSIONS[word] not in slots['dimensions']:
+                slots['dimensions'].append(DIMENSIONS[word])
+    if consume(r'mes a mes|mensal|mensalmente|ao longo do tempo') and DIMENSIONS['mes'] not in slots['dimensions']:
+        slots['dimensions'].append(DIMENSIONS['mes'])
+
+    # Filters
+    if consume(r'(?:do sexo )?(?:mulheres|feminino|feminina)'):
+        slots['filters'].append("sexo = 'F'")
+    elif consume(r'(?:do sexo )?(?:homens|masculino|masculina)'):
+        slots['filters'].append("sexo = 'M'")
+    if match := consume(r'classe(?: social)? ([a-e])'):
+        slots['filters'].append(f"classe_social = '{match.group(1).upper()}'")
+    if slots['metric'][1] != 'taxa_inadimplencia':
+        if consume(r'adimplentes|em dia'):
+            slots['filters'].append('inadimplente = 0')
+        elif consume(r'inadimplentes'):
+            slots['filters'].append('inadimplente = 1')
+
+    ufs = [token for token in re.findall(r'\b[A-Z]{2}\b', question) if token in UFS]
+    for nome in sorted(NOMES_UF, key=len, reverse=True):
+        if consume(rf'(?:de|do|da|em|no|na) {nome}'):
+            ufs.append(NOMES_UF[nome])
+    for uf in ufs:
+        consume(uf.lower())
+    if len(ufs) == 1:
+        slots['filters'].append(f"uf = '{ufs[0]}'")
+    elif ufs:
+        slots['filters'].append('uf IN (' + ', '.join(f"'{uf}'" for uf in dict.fromkeys(ufs)) + ')')
+
+    if match := consume(rf"({'|'.join(MESES)}) de (20\d\d)"):
+        slots['filters'].append(_month_range(int(match.group(2)), MESES[match.group(1)]))
+    elif match := consume(r'(?:em|de|no ano de) (20\d\d)'):
+        slots['filters'].append(f"year(data_referencia) = {match.group(1)}")
+
+    # Ranking
+    if match := consume(r'top (\d+)'):
+        slots['order'], slots['limit'] = 'DESC', int(match.group(1))
+    elif consume(r'maior|mais'):
+        slots['order'], slots['limit'] = 'DESC', 1
+    elif consume(r'menor|menos'):
+        slots['order'], slots['limit'] = 'ASC', 1
+
+    if any(word not in FILLER for word in text.split()):
+        return None
+    if slots['limit'] and not slots['dimensions']:
+        return None  # "the highest ..." without a dimension to rank.
+    return slots
+
+
+def compile_sql(slots, table=GLUE_TABLE):
+    """Render parsed slots as Athena SQL in the style generate_sql_with_llm produces."""
+    metric_expression, metric_alias = slots['metric']
+    select = [f"{expression} AS {alias}" if expression != alias else alias
+              for expression, alias in slots['dimensions']]
+    select.append(f"{metric_expression} AS {metric_alias}")
+    sql = f'SELECT {", ".join(select)} FROM "{table}"'
+    if slots['filters']:
+        sql += ' WHERE ' + ' AND '.join(slots['filters'])
+    if slots['dimensions']:
+        sql += ' GROUP BY ' + ', '.join(str(i) for i in range(1, len(slots['dimensions']) + 1))
+        if slots['order']:
+            sql += f" ORDER BY {metric_alias} {slots['order']}"
+        elif any(alias in ('mes', 'ano') for _, alias in slots['dimensions']):
+            sql += ' ORDER BY ' + ', '.join(str(i) for i in range(1, len(slots['dimensions']) + 1))
+        else:
+            sql += f' ORDER BY {metric_alias} DESC'
+    if slots['limit']:
+        sql += f" LIMIT {slots['limit']}"
+    return sql
+
+
+def question_to_sql(question):
+    """Compile a question straight into SQL, or return None if no template covers it."""
+    slots = parse_question(question)
+    return compile_sql(slots) if slots else None
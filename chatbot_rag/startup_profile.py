@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+PROFILE_PATH = 'startup_profile.json'
+
+# Heavy modules the app may import, in the order the flows need them.
+APP_IMPORTS = [
+    'streamlit', 'pandas', 'openai', 'numpy', 'sqlglot', 'duckdb', 'boto3', 'plotly.express',
+    'langchain_community.vectorstores', 'langchain_community.embeddings', 'sentence_transformers',
+    'onnxruntime',
+]
+
+
+def _process_age_seconds():
+    """Seconds since this process started (Linux), so events include interpreter and server boot."""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf('SC_CLK_TCK'), 0.0)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+PROCESS_START = time.perf_counter() - _process_age_seconds()
+
+# Milliseconds since process start of each startup milestone, first occurrence only.
+events = {}
+_lock = threading.Lock()
+
+
+def mark(event):
+    """Record the first time `event` happens in this process and persist the profile."""
+    with _lock:
+        if event in events:
+            return
+        events[event] = round((time.perf_counter() - PROCESS_START) * 1000, 1)
+        snapshot = dict(events)
+    print(f"[startup] {event}: {snapshot[event]:.0f} ms")
+    with open(PROFILE_PATH, 'w') as f:
+        json.dump(snapshot, f, indent=2)
+
+
+def import_time_ms(module):
+    """
+    Cumulative import time of `module` (with its dependencies) in a fresh interpreter,
+    from `python -X importtime`. Returns None if the module is not installed.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    for line in reversed(result.stderr.splitlines()):
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000
+    return None
+
+
+# --- EXECUTION ---
+if __name__ == "__main__":
+    print("📦 Import time per module (fresh interpreter, including dependencies):")
+    for module in APP_IMPORTS:
+        elapsed = import_time_ms(module)
+        print(f"   {module:<36} {'not installed' if elapsed is None else f'{elapsed:8.0f} ms'}")
+
+    if os.path.exists(PROFILE_PATH):
+        with open(PROFILE_PATH) as f:
+            print(f"\n⏱️ Last app startup (ms since process start), from '{PROFILE_PATH}':")
+            for event, elapsed in json.load(f).items():
+                print(f"   {event:<36} {elapsed:8.0f} ms")
+    else:
+        print(f"\nNo '{PROFILE_PATH}' yet: start the app and ask a question to record it.")
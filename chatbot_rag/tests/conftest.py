@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules are flat scripts that import each other and read config.json from the
+# working directory, like `streamlit run chatbot_app.py` does from chatbot_rag/.
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(APP_DIR)
+sys.path.insert(0, APP_DIR)
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from chart_planner import parse_chart_spec, plan_chart
+
+
+def test_measure_named_in_question():
+    df = pd.DataFrame({'uf': ['SP', 'RJ'], 'taxa': [0.1, 0.2], 'total': [10, 20]})
+    spec = plan_chart("gráfico do total por uf", df)
+    assert (spec['kind'], spec['x'], spec['y']) == ('bar', 'uf', 'total')
+    assert plan_chart("gráfico por uf", df)['y'] == 'taxa'
+
+
+def test_ano_and_mes_become_one_period():
+    df = pd.DataFrame({'ano': [2017, 2017, 2018], 'mes': [11, 12, 1], 'taxa': [0.1, 0.2, 0.3]})
+    spec = plan_chart("gráfico da taxa mês a mês", df)
+    assert (spec['kind'], spec['x'], spec['y']) == ('line', 'periodo', 'taxa')
+
+
+def test_repeated_time_values_go_to_llm():
+    # 20 UFs are too many for a color legend, so each year would get 20 points.
+    df = pd.DataFrame({'ano': [2017] * 20, 'uf': [f'U{i}' for i in range(20)], 'total': range(20)})
+    assert plan_chart("gráfico do total por ano", df) is None
+
+
+def test_category_and_pie():
+    df = pd.DataFrame({'sexo': ['M', 'F'], 'total': [3, 4]})
+    assert plan_chart("gráfico de pizza por sexo", df)['kind'] == 'pie'
+    df = pd.DataFrame({'inadimplente': [0, 1], 'n': [10, 2]})
+    assert plan_chart("gráfico dos inadimplentes", df)['x'] == 'inadimplente'
+
+
+def test_parse_chart_spec_validates_columns():
+    df = pd.DataFrame({'uf': ['SP'], 'taxa': [0.1]})
+    spec = parse_chart_spec('```json\n{"kind": "bar", "x": "uf", "y": "taxa", "color": null, "title": "T"}\n```', df)
+    assert (spec['kind'], spec['x'], spec['y'], spec['rule']) == ('bar', 'uf', 'taxa', 'LLM')
+    assert parse_chart_spec('{"kind": "bar", "x": "estado", "y": "taxa"}', df) is None
+    assert parse_chart_spec('{"kind": "3d", "x": "uf", "y": "taxa"}', df) is None
+    assert parse_chart_spec('import os', df) is None
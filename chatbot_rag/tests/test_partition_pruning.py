@@ -0,0 +1,44 @@
+import pytest
+
+from partition_pruning import add_partition_predicates
+
+
+def predicates(sql):
+    """The text after WHERE in the rewritten query."""
+    rewritten = add_partition_predicates(sql)
+    return rewritten[rewritten.index(' WHERE ') + 7:]
+
+
+@pytest.mark.parametrize('where, expected', [
+    ("data_referencia >= TIMESTAMP '2017-03-01 00:00:00' AND data_referencia < TIMESTAMP '2017-06-01 00:00:00'",
+     'ano_referencia = 2017 AND mes_referencia BETWEEN 3 AND 5)'),
+    ("data_referencia >= TIMESTAMP '2017-06-01 00:00:00' AND data_referencia < TIMESTAMP '2017-07-01 00:00:00'",
+     'ano_referencia = 2017 AND mes_referencia = 6)'),
+    ("data_referencia BETWEEN TIMESTAMP '2016-11-01 00:00:00' AND TIMESTAMP '2017-02-01 00:00:00'",
+     'ano_referencia >= 2016 AND ano_referencia <= 2017)'),
+    ('year(data_referencia) = 2017', 'ano_referencia = 2017'),
+    ('2017 < year(data_referencia)', 'ano_referencia >= 2018'),
+    ('month(data_referencia) = 6', 'mes_referencia = 6'),
+    ("data_referencia < TIMESTAMP '2017-01-01 00:00:00'", 'ano_referencia <= 2016'),
+])
+def test_adds_partition_predicates(where, expected):
+    assert predicates(f'SELECT COUNT(*) FROM dataset WHERE {where}').endswith(expected)
+
+
+def test_offset_literal_is_bounded_in_utc():
+    # 2017-01-01 00:00 at +03:00 is 2016-12-31 21:00 UTC.
+    sql = "SELECT COUNT(*) FROM dataset WHERE data_referencia >= TIMESTAMP '2017-01-01 00:00:00+03:00'"
+    assert predicates(sql).endswith('ano_referencia >= 2016')
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT COUNT(*) FROM dataset WHERE uf = 'SP'",
+    'SELECT COUNT(*) FROM dataset',
+    'SELECT COUNT(*) FROM dataset WHERE ano_referencia = 2017 AND year(data_referencia) = 2017',
+    "SELECT COUNT(*) FROM outra WHERE data_referencia >= TIMESTAMP '2017-06-01 00:00:00'",
+    "SELECT COUNT(*) FROM dataset WHERE data_referencia >= TIMESTAMP '2017-06-01 00:00:00' "
+    "OR uf = 'SP'",
+    'SELECT COUNT(*) FROM dataset WHERE',
+])
+def test_leaves_query_unchanged(sql):
+    assert add_partition_predicates(sql) == sql
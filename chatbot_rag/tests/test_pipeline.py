@@ -0,0 +1,22 @@
+import time
+
+from pipeline import Orchestrator
+
+
+def slow_tokens():
+    yield "Metade"
+    time.sleep(1)
+    yield " do resumo"
+
+
+def test_stream_timeout_is_reported_in_stats():
+    stats = {}
+    tokens = list(Orchestrator(timeouts={'summary': 0.2}).stream('summary', slow_tokens, stats=stats))
+    assert tokens == ["Metade"]
+    assert "'summary'" in stats['timed_out']
+
+
+def test_stream_without_timeout():
+    stats = {}
+    assert ''.join(Orchestrator().stream('summary', lambda: iter(["a", "b"]), stats=stats)) == "ab"
+    assert 'timed_out' not in stats
@@ -0,0 +1,61 @@
+import time
+
+import pandas as pd
+import pytest
+
+from query_cache import QueryCache, question_literals
+
+
+class ConstantEmbeddings:
+    """Every question embeds to the same vector, so only the literals can tell them apart."""
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return QueryCache(embeddings=ConstantEmbeddings(), directory=str(tmp_path))
+
+
+def test_literals_of_question():
+    assert question_literals("Qual a taxa de inadimplência em MG em 2017?") == '2017|MG'
+    assert question_literals("taxa no Mato Grosso do Sul") == 'MS'
+    assert question_literals("quantos homens da classe b?") == 'classe:b|sexo:M'
+    assert question_literals("idade média por uf") == ''
+
+
+def test_semantic_hit_needs_same_literals(cache):
+    sql = "SELECT AVG(idade) FROM dataset WHERE uf = 'MG'"
+    cache.put_question("Qual a idade média em MG?", sql)
+    assert cache.lookup_question("Me diga a idade média em MG")['level'] == 'semantic'
+    assert cache.lookup_question("Qual a idade média em SP?") is None
+    assert cache.lookup_question("Qual a idade média em MG em 2018?") is None
+
+
+def test_rewriting_same_sql_keeps_created_at(cache):
+    cache.put_question("idade média por uf", "SELECT 1")
+    with cache._connect() as con:
+        first = con.execute("SELECT created_at FROM questions").fetchone()[0]
+    time.sleep(0.01)
+    cache.put_question("idade média por uf", "SELECT 1")
+    with cache._connect() as con:
+        assert con.execute("SELECT created_at FROM questions").fetchone()[0] == first
+    cache.put_question("idade média por uf", "SELECT 2")
+    with cache._connect() as con:
+        assert con.execute("SELECT created_at FROM questions").fetchone()[0] > first
+
+
+def test_summary_goes_with_its_result(cache):
+    sql = 'SELECT uf, COUNT(*) AS total FROM "dataset" GROUP BY uf'
+    question = "quantos clientes por uf"
+    cache.put_summary(question, sql, "sem resultado ainda")
+    assert cache.get_summary(question, sql) is None
+
+    cache.put_result(sql, pd.DataFrame({'uf': ['SP'], 'total': [1]}))
+    cache.put_summary(question, sql, "SP tem 1 cliente.")
+    assert cache.get_summary(question, sql) == "SP tem 1 cliente."
+    assert cache.get_summary("outra pergunta", sql) is None
+
+    cache.put_result(sql, pd.DataFrame({'uf': ['SP'], 'total': [2]}))
+    assert cache.get_summary(question, sql) is None
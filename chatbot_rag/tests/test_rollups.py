@@ -0,0 +1,44 @@
+import pytest
+
+from rollups import rewrite_to_rollup
+
+
+@pytest.mark.parametrize('sql', [
+    'SELECT uf, COUNT(*) AS total FROM "dataset" GROUP BY uf ORDER BY total DESC',
+    'SELECT sexo, AVG(CAST(inadimplente AS DOUBLE)) AS taxa FROM "dataset" GROUP BY sexo',
+    "SELECT classe_social, AVG(idade) FROM dataset WHERE uf = 'SP' GROUP BY classe_social",
+    "SELECT date_trunc('month', data_referencia) AS mes, SUM(inadimplente) FROM dataset GROUP BY 1 ORDER BY 1",
+    'SELECT year(data_referencia) AS ano, COUNT(*) FROM dataset GROUP BY 1',
+    "SELECT uf, COUNT(*) FROM dataset WHERE data_referencia >= TIMESTAMP '2017-06-01 00:00:00' "
+    "AND data_referencia < TIMESTAMP '2017-07-01 00:00:00' GROUP BY uf",
+])
+def test_rewrites_to_rollup(sql):
+    rewritten = rewrite_to_rollup(sql)
+    assert rewritten is not None
+    assert 'dataset_rollup' in rewritten
+    assert 'data_referencia' not in rewritten
+
+
+def test_rewrites_measures():
+    rewritten = rewrite_to_rollup('SELECT uf, COUNT(*), AVG(idade), SUM(inadimplente) FROM dataset GROUP BY uf')
+    assert 'SUM(n_clientes)' in rewritten
+    assert 'SUM(soma_idade)' in rewritten
+    assert 'SUM(n_idade)' in rewritten
+    assert 'SUM(soma_inadimplente)' in rewritten
+
+
+@pytest.mark.parametrize('sql', [
+    'SELECT uf, idade FROM dataset',                                          # row level
+    'SELECT uf, MAX(idade) FROM dataset GROUP BY uf',                         # MIN/MAX not kept
+    'SELECT COUNT(DISTINCT uf) FROM dataset',
+    "SELECT uf, COUNT(*) FROM dataset WHERE flag_obito = 'S' GROUP BY uf",    # not a dimension
+    "SELECT date_trunc('day', data_referencia), COUNT(*) FROM dataset GROUP BY 1",
+    "SELECT COUNT(*) FROM dataset WHERE data_referencia >= TIMESTAMP '2017-06-15 00:00:00'",
+    "SELECT COUNT(*) FROM dataset WHERE data_referencia >= TIMESTAMP '2017-06-01 00:00:00+03:00'",
+    "SELECT COUNT(*) FROM dataset WHERE ano_referencia = 2017",               # partition column
+    'SELECT uf, COUNT(*) FROM (SELECT * FROM dataset) AS t GROUP BY uf',
+    'SELECT COUNT(*) FROM outra_tabela',
+    'SELECT uf, COUNT(*) FROM dataset WHERE',                                 # invalid
+])
+def test_keeps_raw_table(sql):
+    assert rewrite_to_rollup(sql) is None
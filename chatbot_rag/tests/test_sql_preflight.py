@@ -0,0 +1,66 @@
+from rollups import rewrite_to_rollup
+from sql_preflight import preflight
+
+
+def test_accepts_aggregate_unchanged():
+    sql = 'SELECT uf, COUNT(*) AS total FROM "dataset" GROUP BY uf'
+    checked, error = preflight(sql)
+    assert error is None
+    assert 'LIMIT' not in checked
+
+
+def test_adds_limit_to_row_level_query():
+    checked, error = preflight("SELECT uf, idade FROM dataset WHERE sexo = 'M'", default_limit=50)
+    assert error is None
+    assert checked.endswith('LIMIT 50')
+
+
+def test_keeps_existing_limit():
+    checked, error = preflight('SELECT idade FROM dataset LIMIT 10', default_limit=50)
+    assert error is None
+    assert checked.endswith('LIMIT 10')
+
+
+def test_rejects_invalid_sql():
+    checked, error = preflight('SELECT uf FROM dataset WHERE')
+    assert checked is None
+    assert error.startswith('Invalid SQL')
+
+
+def test_rejects_several_statements():
+    assert preflight('SELECT 1 FROM dataset; SELECT 2 FROM dataset')[1] == "Expected exactly one SQL statement."
+
+
+def test_rejects_writes():
+    assert preflight('DROP TABLE dataset')[1] == "Only SELECT queries are allowed."
+
+
+def test_rejects_unknown_table():
+    assert 'Unknown table clientes' in preflight('SELECT COUNT(*) FROM clientes')[1]
+
+
+def test_rejects_unknown_column():
+    error = preflight('SELECT renda FROM dataset')[1]
+    assert 'renda' in error
+    assert 'Available columns' in error
+
+
+def test_accepts_ctes_over_the_table():
+    sql = 'WITH t AS (SELECT uf, idade FROM dataset) SELECT uf, AVG(idade) FROM t GROUP BY uf'
+    assert preflight(sql)[1] is None
+
+
+def test_date_bounded_aggregate_still_hits_rollup():
+    sql = ("SELECT uf, AVG(CAST(inadimplente AS DOUBLE)) AS taxa FROM dataset "
+           "WHERE data_referencia >= TIMESTAMP '2017-01-01 00:00:00' "
+           "AND data_referencia < TIMESTAMP '2017-07-01 00:00:00' GROUP BY uf")
+    checked, error = preflight(sql)
+    assert error is None
+    assert 'ano_referencia' not in checked
+    assert 'dataset_rollup' in rewrite_to_rollup(checked)
+
+
+def test_year_filtered_aggregate_still_hits_rollup():
+    checked, error = preflight('SELECT uf, COUNT(*) FROM dataset WHERE year(data_referencia) = 2017 GROUP BY uf')
+    assert error is None
+    assert 'dataset_rollup' in rewrite_to_rollup(checked)
@@ -0,0 +1,42 @@
+import pytest
+
+from sql_templates import question_to_sql
+
+
+@pytest.mark.parametrize('question, sql', [
+    ("Qual a taxa de inadimplência por UF?",
+     'SELECT uf, AVG(CAST(inadimplente AS DOUBLE)) AS taxa_inadimplencia FROM "dataset" '
+     'GROUP BY 1 ORDER BY taxa_inadimplencia DESC'),
+    ("quantos clientes inadimplentes temos em SP?",
+     "SELECT COUNT(*) AS total_clientes FROM \"dataset\" WHERE inadimplente = 1 AND uf = 'SP'"),
+    ("idade média dos homens da classe B por estado em 2017",
+     "SELECT uf, AVG(idade) AS idade_media FROM \"dataset\" WHERE sexo = 'M' AND classe_social = 'B' "
+     "AND year(data_referencia) = 2017 GROUP BY 1 ORDER BY idade_media DESC"),
+    ("taxa de inadimplência em junho de 2017",
+     'SELECT AVG(CAST(inadimplente AS DOUBLE)) AS taxa_inadimplencia FROM "dataset" '
+     "WHERE data_referencia >= TIMESTAMP '2017-06-01 00:00:00' AND data_referencia < TIMESTAMP '2017-07-01 00:00:00'"),
+    ("taxa de inadimplência em dezembro de 2017",
+     'SELECT AVG(CAST(inadimplente AS DOUBLE)) AS taxa_inadimplencia FROM "dataset" '
+     "WHERE data_referencia >= TIMESTAMP '2017-12-01 00:00:00' AND data_referencia < TIMESTAMP '2018-01-01 00:00:00'"),
+    ("qual a idade média mês a mês em Minas Gerais?",
+     "SELECT date_trunc('month', data_referencia) AS mes, AVG(idade) AS idade_media FROM \"dataset\" "
+     "WHERE uf = 'MG' GROUP BY 1 ORDER BY 1"),
+    ("qual estado tem a maior taxa de inadimplência?",
+     'SELECT uf, AVG(CAST(inadimplente AS DOUBLE)) AS taxa_inadimplencia FROM "dataset" '
+     'GROUP BY 1 ORDER BY taxa_inadimplencia DESC LIMIT 1'),
+    ("quantidade de clientes em Mato Grosso do Sul",
+     "SELECT COUNT(*) AS total_clientes FROM \"dataset\" WHERE uf = 'MS'"),
+])
+def test_compiles_question(question, sql):
+    assert question_to_sql(question) == sql
+
+
+@pytest.mark.parametrize('question', [
+    "quais são os critérios de aprovação de crédito?",     # no metric
+    "explique a taxa de inadimplência por uf",               # unknown word
+    "qual a maior taxa de inadimplência?",                   # ranking without a dimension
+    "qual a idade máxima dos clientes?",                     # MAX is not templated
+    "taxa de inadimplência por faixa de renda",              # unknown dimension
+])
+def test_leaves_question_to_llm(question):
+    assert question_to_sql(question) is None
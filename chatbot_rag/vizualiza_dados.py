@@ -1,32 +1,53 @@
+import time
+
 import pandas as pd
 
-nome_do_arquivo = r'train.gz' 
+nome_do_arquivo = r'train.gz'
+
+# Linhas lidas por vez: a memória usada depende disto, não do tamanho do arquivo
+linhas_por_chunk = 250_000
 
-print(f"Tentando ler o arquivo '{nome_do_arquivo}'...")
+print(f"Tentando ler o arquivo '{nome_do_arquivo}' em blocos de {linhas_por_chunk} linhas...")
 
 try:
-    
-    try:
-        df = pd.read_csv(nome_do_arquivo, compression='gzip', sep=',')
-    except Exception:
-        # Tenta a sintaxe mais nova se a antiga falhar
-        df = pd.read_csv(nome_do_arquivo, compression='gzip', sep=',', on_bad_lines='warn')
-
-    print("\n✅ Arquivo lido com sucesso! Aqui estão as primeiras 5 linhas:")
-    # .head() mostra as primeiras linhas de forma organizada
-    print(df.head())
-
-    print("\n----------------------------------------------------------")
-    print("\n🧾 Informações Gerais sobre o DataFrame (colunas, tipos, etc.):")
-    # .info() dá um resumo excelente das colunas, contagem de nulos e tipos de dados
-    df.info(verbose=True, show_counts=True)
-    
-    print("\n----------------------------------------------------------")
-    print(f"\n📄 O DataFrame tem {df.shape[0]} linhas e {df.shape[1]} colunas.")
+
+    # Com chunksize, as linhas ruins só aparecem durante a leitura dos blocos, então
+    # on_bad_lines precisa estar já na abertura do leitor
+    leitor = pd.read_csv(nome_do_arquivo, compression='gzip', sep=',', on_bad_lines='warn',
+                         chunksize=linhas_por_chunk)
+
+    inicio = time.perf_counter()
+    total_linhas, nao_nulos, tipos = 0, None, None
+    with leitor:
+        for chunk in leitor:
+            if nao_nulos is None:
+                print("\n✅ Arquivo aberto com sucesso! Aqui estão as primeiras 5 linhas:")
+                # .head() mostra as primeiras linhas de forma organizada
+                print(chunk.head())
+                nao_nulos = chunk.notna().sum()
+                tipos = chunk.dtypes
+            else:
+                nao_nulos += chunk.notna().sum()
+            total_linhas += len(chunk)
+    duracao = max(time.perf_counter() - inicio, 1e-9)
+
+    if tipos is None:
+        print(f"\n⚠️ O arquivo '{nome_do_arquivo}' não tem nenhuma linha de dados.")
+    else:
+        print("\n----------------------------------------------------------")
+        print("\n🧾 Informações Gerais sobre o DataFrame (colunas, tipos, etc.):")
+        # Resumo equivalente ao .info(), acumulado bloco a bloco
+        print(pd.DataFrame({'não nulos': nao_nulos, 'tipo (1º bloco)': tipos}))
+
+        print("\n----------------------------------------------------------")
+        print(f"\n📄 O arquivo tem {total_linhas} linhas e {len(tipos)} colunas.")
+        print(f"⏱️ Lido em {duracao:.1f}s ({total_linhas / duracao:,.0f} linhas/s).")
 
 
 except FileNotFoundError:
     print(f"❌ ERRO: O arquivo '{nome_do_arquivo}' não foi encontrado no mesmo diretório do script.")
+except pd.errors.EmptyDataError:
+    print(f"⚠️ O arquivo '{nome_do_arquivo}' está vazio (nem cabeçalho).")
 except Exception as e:
     print(f"❌ ERRO ao tentar ler o arquivo: {e}")
     print("Dica: Verifique se o separador é mesmo uma vírgula (sep=','). Se for ponto e vírgula, troque para sep=';'.")